@@ -0,0 +1,61 @@
+# gunicorn.conf.py
+"""
+Конфигурация gunicorn для продакшена:
+
+    gunicorn -c gunicorn.conf.py online_store_project.asgi:application
+
+Воркеры - uvicorn (ASGI), поэтому async-представления каталога и корзины
+не занимают поток на время ожидания БД. Все параметры можно
+переопределить переменными окружения GUNICORN_*.
+
+Перезапуск без простоя: kill -HUP <master> - новые воркеры
+поднимаются, старые дорабатывают текущие запросы (graceful_timeout).
+С preload_app код загружается в мастере, поэтому для выкладки нового
+кода нужен USR2 (новый мастер) и затем QUIT старому мастеру.
+"""
+
+import multiprocessing
+import os
+
+
+def _env(name, default):
+    return os.environ.get(f'GUNICORN_{name}', default)
+
+
+bind = _env('BIND', '0.0.0.0:8000')
+
+# Воркеров по умолчанию - 2 * CPU + 1: часть всегда ждет БД
+workers = int(_env('WORKERS', multiprocessing.cpu_count() * 2 + 1))
+worker_class = 'uvicorn_worker.UvicornWorker'
+
+# Режим разработки: перезапуск воркеров при изменении кода.
+# Несовместим с preload_app - код тогда грузится в каждом воркере
+reload = _env('RELOAD', '0') == '1'
+
+# Django загружается в мастере до fork: воркеры делят его память
+# (copy-on-write) и стартуют быстрее
+preload_app = _env('PRELOAD', '1') == '1' and not reload
+
+# Запрос дольше timeout секунд - воркер перезапускается
+timeout = int(_env('TIMEOUT', 30))
+# Сколько секунд воркер дорабатывает запросы при перезапуске/остановке
+graceful_timeout = int(_env('GRACEFUL_TIMEOUT', 30))
+# Keep-alive за балансировщиком: чуть дольше его простоя,
+# чтобы соединение не закрывалось посреди запроса
+keepalive = int(_env('KEEPALIVE', 5))
+
+# Воркер перезапускается после max_requests запросов (со случайным
+# разбросом, чтобы не все сразу) - защита от роста памяти
+max_requests = int(_env('MAX_REQUESTS', 2000))
+max_requests_jitter = int(_env('MAX_REQUESTS_JITTER', 200))
+
+accesslog = _env('ACCESSLOG', '-')
+errorlog = '-'
+loglevel = _env('LOGLEVEL', 'info')
+
+
+def post_fork(server, worker):
+    # Соединения с БД, открытые в мастере при загрузке, воркерам не годятся
+    if server.cfg.preload_app :
+        from django.db import connections
+        connections.close_all()
@@ -23,9 +23,10 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 SECRET_KEY = 'django-insecure-l$36dso057s(gfakkl4j41*j8fg0^&v-4ywk58@4cv!s1w^z7('
 
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = True
+# В продакшене: DJANGO_DEBUG=0 и список хостов в DJANGO_ALLOWED_HOSTS
+DEBUG = os.environ.get('DJANGO_DEBUG', '1') == '1'
 
-ALLOWED_HOSTS = []
+ALLOWED_HOSTS = [host for host in os.environ.get('DJANGO_ALLOWED_HOSTS', '').split(',') if host]
 
 
 # Application definition
@@ -41,10 +42,19 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    # Полнотекстовый поиск PostgreSQL (store/search.py)
+    'django.contrib.postgres',
 ]
 
 MIDDLEWARE = [
+    # Профилирование запросов (первым - чтобы учесть и остальные middleware);
+    # работает только при PROFILING_SAMPLE_RATE > 0
+    'store.profiling.ProfilingMiddleware',
+    # Read-your-writes при чтении с реплики; без реплики не работает
+    'store.routers.ReplicaPinMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    # Статика из STATIC_ROOT (сжатая, с хэшем в имени) - без отдельного веб-сервера
+    'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -57,7 +67,8 @@ ROOT_URLCONF = 'online_store_project.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates + замер времени рендеринга для профилировщика
+        'BACKEND': 'store.profiling.ProfilingTemplates',
         'DIRS': [BASE_DIR / 'templates'],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -65,6 +76,8 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                # Итоги корзины для значка в шапке
+                'store.context_processors.cart_summary',
             ],
         },
     },
@@ -78,7 +91,8 @@ WSGI_APPLICATION = 'online_store_project.wsgi.application'
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql_psycopg2',
+        # psycopg 3, если он установлен (нужен для пула соединений), иначе psycopg2
+        'ENGINE': 'django.db.backends.postgresql',
         # 'NAME' берется из переменной окружения POSTGRES_DB,
         # если ее нет, используется 'online_store_db'
         'NAME': os.environ.get('POSTGRES_DB', 'online_store_db'),
@@ -88,9 +102,42 @@ DATABASES = {
         # если ее нет, используется 'localhost' (для локальной работы)
         'HOST': os.environ.get('POSTGRES_HOST', 'localhost'),
         'PORT': os.environ.get('POSTGRES_PORT', '5432'),
+        # Постоянные соединения: сколько секунд соединение живет между
+        # запросами (0 - новое соединение на каждый запрос).
+        # Перед повторным использованием соединение проверяется
+        'CONN_MAX_AGE': int(os.environ.get('POSTGRES_CONN_MAX_AGE', '60')),
+        'CONN_HEALTH_CHECKS': True,
     }
 }
 
+# Реплика для чтения (store/routers.py): включается переменной
+# POSTGRES_REPLICA_HOST, остальные параметры - как у основной БД
+if os.environ.get('POSTGRES_REPLICA_HOST'):
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'HOST': os.environ['POSTGRES_REPLICA_HOST'],
+        'PORT': os.environ.get('POSTGRES_REPLICA_PORT', DATABASES['default']['PORT']),
+        # В тестах реплика смотрит в ту же тестовую БД
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_ROUTERS = ['store.routers.ReplicaRouter']
+
+# Пул соединений psycopg 3 (POSTGRES_POOL=1). Нужен прежде всего под ASGI,
+# где постоянные соединения не переиспользуются между запросами.
+# С пулом CONN_MAX_AGE должен быть 0 - соединения держит сам пул
+if os.environ.get('POSTGRES_POOL', '0') == '1':
+    for database in DATABASES.values():
+        database['CONN_MAX_AGE'] = 0
+        database['OPTIONS'] = {
+            'pool': {
+                'min_size': int(os.environ.get('POSTGRES_POOL_MIN_SIZE', '2')),
+                'max_size': int(os.environ.get('POSTGRES_POOL_MAX_SIZE', '10')),
+                # Сколько секунд запрос ждет свободное соединение
+                'timeout': float(os.environ.get('POSTGRES_POOL_TIMEOUT', '10')),
+            },
+        }
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -132,6 +179,20 @@ STATIC_URL = 'static/'
 # (CSS, JS) ИЗ ВСЕХ ПРИЛОЖЕНИЙ ДЛЯ РАБОТЫ
 STATIC_ROOT = 'static/'
 
+# collectstatic сохраняет файлы с хэшем содержимого в имени и их
+# gzip-версии; WhiteNoise отдает их с кэшированием "навсегда"
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'whitenoise.storage.CompressedManifestStaticFilesStorage',
+    },
+}
+# Файл, которого нет в манифесте (collectstatic не запускался, например
+# в тестах), отдается под исходным именем вместо ошибки
+WHITENOISE_MANIFEST_STRICT = False
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -147,3 +208,134 @@ LOGIN_REDIRECT_URL = 'users:profile'
 # URL-адрес для перенаправления после выхода
 LOGOUT_REDIRECT_URL = 'store:product_list'
 # URL-адрес для перенаправления после успешного входа
+
+# Пагинация каталога: размер страницы по умолчанию
+# и максимальный размер, который можно запросить через ?page_size=
+CATALOG_PAGE_SIZE = 20
+CATALOG_MAX_PAGE_SIZE = 100
+
+# Кэш карточек товаров (store/product_cache.py).
+# Алиас - любой кэш из CACHES (см. CACHE_URL ниже).
+PRODUCT_CACHE_ALIAS = 'default'
+# Сколько секунд карточка живет в кэше без изменений товара
+PRODUCT_CACHE_TIMEOUT = 15 * 60
+# Допустимое "устаревание" остатка в секундах (0 - всегда свежий из БД)
+PRODUCT_STOCK_MAX_AGE = 0
+
+# Количество заказов на странице истории в личном кабинете
+ORDER_HISTORY_PAGE_SIZE = 10
+
+# Корзина анонимного посетителя (подписанная cookie, см. store/anonymous_cart.py):
+# срок жизни в секундах и максимальное число позиций (cookie ограничена ~4 КБ)
+CART_COOKIE_AGE = 30 * 24 * 60 * 60
+CART_COOKIE_MAX_ITEMS = 50
+
+
+# Профилирование запросов (store/profiling.py).
+# Доля профилируемых запросов от 0 до 1; 0 - профилирование выключено
+PROFILING_SAMPLE_RATE = float(os.environ.get('PROFILING_SAMPLE_RATE', '0'))
+# Кэш для общей гистограммы по представлениям
+PROFILING_CACHE_ALIAS = 'default'
+# Запросы дольше этого порога (мс) пишутся в лог 'store.profiling'
+PROFILING_SLOW_REQUEST_MS = 500
+# Сколько самых медленных SQL-запросов показывать в логе
+PROFILING_SLOW_QUERIES = 5
+
+# Сколько секунд после записи пользователь читает только с основной БД
+REPLICA_PIN_SECONDS = 10
+
+# Миниатюры изображений товаров (store/thumbnails.py):
+# ширины копий в пикселях для srcset и их форматы (WebP и JPEG для старых браузеров)
+THUMBNAIL_WIDTHS = (160, 320, 640, 1280)
+THUMBNAIL_FORMATS = ('webp', 'jpeg')
+THUMBNAIL_QUALITY = 80
+# Папка копий внутри MEDIA_ROOT
+THUMBNAIL_DIR = 'thumbs'
+# Строить копии сразу после загрузки изображения; иначе - при первом запросе
+THUMBNAIL_ON_UPLOAD = True
+
+# HTTP-кэширование страниц каталога (store/conditional.py): сколько секунд
+# общий кэш (CDN, nginx) может отдавать страницу анонимным посетителям
+# без обращения к сайту, и сколько еще - отдавать устаревшую, обновляя ее в фоне
+CATALOG_CACHE_MAX_AGE = 60
+CATALOG_STALE_WHILE_REVALIDATE = 300
+
+# Резервирование товара корзинами (store/holds.py): на сколько секунд
+# позиция корзины резервирует товар после последнего добавления,
+# и сколько истекших резервов снимать за одну транзакцию (reap_holds)
+STOCK_HOLD_TTL = 15 * 60
+STOCK_HOLD_REAP_BATCH = 500
+
+# Почта: по умолчанию письма печатаются в лог (консоль) контейнера
+EMAIL_BACKEND = os.environ.get('EMAIL_BACKEND', 'django.core.mail.backends.console.EmailBackend')
+DEFAULT_FROM_EMAIL = os.environ.get('DEFAULT_FROM_EMAIL', 'shop@localhost')
+
+# Фоновые задачи (store/jobs.py, команда run_workers)
+# Число потоков (или процессов) воркеров
+JOB_WORKERS = 4
+# Сколько задач воркер забирает за раз
+JOB_BATCH_SIZE = 5
+# Пауза (с) между опросами пустой очереди
+JOB_POLL_INTERVAL = 1
+# Попыток на задачу; пауза перед повтором - JOB_RETRY_BACKOFF * 2^(попытка - 1) секунд
+JOB_MAX_ATTEMPTS = 5
+JOB_RETRY_BACKOFF = 10
+# Задача, выполняемая дольше (с), считается зависшей и возвращается в очередь
+JOB_TIMEOUT = 300
+# Сколько дней хранить выполненные задачи (None - всегда) и сколько
+# удалять одним DELETE
+JOB_RETENTION_DAYS = 7
+JOB_PURGE_BATCH_SIZE = 1000
+
+# Уведомление о заканчивающихся товарах: порог остатка и получатели
+LOW_STOCK_THRESHOLD = 3
+LOW_STOCK_RECIPIENTS = [email for email in os.environ.get('LOW_STOCK_RECIPIENTS', '').split(',') if email]
+
+# Админка (store/admin.py): с какого числа записей списки показывают
+# оценку PostgreSQL вместо точного COUNT(*), и границы фильтра по цене
+ADMIN_ESTIMATED_COUNT_THRESHOLD = 100_000
+ADMIN_PRICE_RANGES = (500, 1000, 5000, 10000)
+
+# Кэши (store/caching.py). CACHE_URL - адрес общего Redis
+# (redis://redis:6379/0): кэш 'shared' общий для всех процессов и серверов,
+# а 'default' - он же с LRU в памяти процесса перед ним (L1).
+# Без CACHE_URL оба - локальный кэш процесса, как раньше.
+# fakeredis://... - Redis в памяти процесса (пакет fakeredis): для тестов
+# и бенчмарков без сервера Redis.
+CACHE_URL = os.environ.get('CACHE_URL', '')
+# Размер L1 (записей; 0 - без L1) и сколько секунд запись L1
+# может расходиться с изменениями из других процессов
+CACHE_L1_MAX_ENTRIES = int(os.environ.get('CACHE_L1_MAX_ENTRIES', '1000'))
+CACHE_L1_TIMEOUT = float(os.environ.get('CACHE_L1_TIMEOUT', '5'))
+
+if CACHE_URL.startswith('fakeredis://') :
+    import fakeredis
+
+    _SHARED_CACHE = {
+        'BACKEND' : 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION' : CACHE_URL.replace('fakeredis://', 'redis://', 1),
+        'OPTIONS' : {'connection_class' : fakeredis.FakeConnection},
+    }
+elif CACHE_URL :
+    _SHARED_CACHE = {'BACKEND' : 'django.core.cache.backends.redis.RedisCache', 'LOCATION' : CACHE_URL}
+else :
+    _SHARED_CACHE = {'BACKEND' : 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION' : 'shared'}
+
+CACHES = {
+    'shared' : _SHARED_CACHE,
+    'default' : {
+        'BACKEND' : 'store.caching.TieredCache',
+        'LOCATION' : 'shared',
+        'OPTIONS' : {'MAX_ENTRIES' : CACHE_L1_MAX_ENTRIES, 'L1_TIMEOUT' : CACHE_L1_TIMEOUT},
+    } if CACHE_URL and CACHE_L1_MAX_ENTRIES else _SHARED_CACHE,
+}
+
+# Версия каталога в ключах кэша (store/caching.py)
+CATALOG_CACHE_ALIAS = 'default'
+
+# Сессии: с общим кэшем - из кэша, с записью и в БД (cached_db), без запроса
+# к django_session на каждый запрос. Кэш сессий - 'shared', без L1: выход
+# из аккаунта должен сразу действовать во всех процессах. Локальный кэш
+# процесса для сессий не годится по той же причине - тогда только БД
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db' if CACHE_URL else 'django.contrib.sessions.backends.db'
+SESSION_CACHE_ALIAS = 'shared'
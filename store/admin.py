@@ -1,7 +1,65 @@
 # store/admin.py
 
-from django.contrib import admin
-from .models import Category, Product, Cart, CartItem, Order, OrderItem
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.contrib import admin, messages
+from django.contrib.admin.helpers import ACTION_CHECKBOX_NAME
+from django.core.exceptions import PermissionDenied
+from django.shortcuts import redirect
+from django.template.response import TemplateResponse
+from django.urls import path
+from . import bulk, carts
+from .forms import MoveCategoryForm, RepriceForm, StockUploadForm
+from .pagination import EstimatedCountPaginator
+from .search import search_query
+from .models import Category, Product, Cart, CartItem, Order, OrderItem, Job
+
+class PriceRangeFilter(admin.SimpleListFilter):
+    """
+    Фильтр по диапазонам цены (границы - ADMIN_PRICE_RANGES) вместо
+    стандартного по полю: тот на каждой странице выбирает все различные
+    цены (SELECT DISTINCT по всей таблице) и выводит их списком.
+    """
+    title = 'цена'
+    parameter_name = 'price_range'
+
+    def lookups(self, request, model_admin):
+        bounds = [None, *settings.ADMIN_PRICE_RANGES, None]
+        lookups = []
+        for low, high in zip(bounds, bounds[1:]) :
+            if low is None :
+                label = f'до {high}'
+            elif high is None :
+                label = f'от {low}'
+            else :
+                label = f'{low} - {high}'
+            lookups.append((f'{low or ""}-{high or ""}', label))
+        return lookups
+
+    def queryset(self, request, queryset):
+        if not self.value() :
+            return queryset
+        low, _, high = self.value().partition('-')
+        try :
+            if low :
+                queryset = queryset.filter(price__gte=Decimal(low))
+            if high :
+                queryset = queryset.filter(price__lt=Decimal(high))
+        except InvalidOperation :
+            return queryset
+        return queryset
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """
+    Список большой таблицы: число записей - оценкой PostgreSQL
+    (EstimatedCountPaginator), без второго COUNT(*) всей таблицы
+    ради "N из M" при фильтрации.
+    """
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
 
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
@@ -9,11 +67,108 @@ class CategoryAdmin(admin.ModelAdmin):
     search_fields = ('name',)
 
 @admin.register(Product)
-class ProductAdmin(admin.ModelAdmin):
+class ProductAdmin(LargeTableAdmin):
     list_display = ('name', 'category', 'price', 'stock')
-    list_filter = ('category', 'price')
+    # Категория - JOIN в том же запросе, а не запрос на каждую строку
+    list_select_related = ('category',)
+    list_filter = ('category', PriceRangeFilter)
     search_fields = ('name', 'description')
     ordering = ('name',)
+    actions = ('reprice_products', 'move_to_category')
+
+    def _bulk_page(self, request, title, form, result, **context):
+        # Промежуточная страница массовой операции (store/bulk.py):
+        # форма, кнопки "Предпросмотр" и "Применить" и таблица "было -> стало"
+        return TemplateResponse(request, 'admin/store/product/bulk_action.html', {
+            **self.admin_site.each_context(request),
+            'title' : title,
+            'opts' : self.model._meta,
+            'form' : form,
+            'result' : result,
+            **context,
+        })
+
+    def _bulk_action(self, request, queryset, form_class, title, operation):
+        """
+        Общий ход действия: первый вызов показывает форму, "Предпросмотр"
+        выполняет операцию с dry_run, "Применить" - по-настоящему
+        и возвращает к списку товаров.
+        """
+        step = request.POST.get('bulk_step')
+        form = form_class(request.POST if step else None)
+        result = None
+        if step and form.is_valid() :
+            try :
+                result = operation(queryset, form.cleaned_data, dry_run=step != 'apply')
+            except bulk.BulkError as e :
+                form.add_error(None, str(e))
+            else :
+                if step == 'apply' :
+                    self.message_user(request, f'{title}: изменено товаров: {result.count}.', messages.SUCCESS)
+                    return None
+        return self._bulk_page(
+            request, title, form, result,
+            action=request.POST['action'],
+            selected=request.POST.getlist(ACTION_CHECKBOX_NAME),
+            select_across=request.POST.get('select_across', '0'),
+            product_count=queryset.count(),
+        )
+
+    @admin.action(description='Изменить цены на процент', permissions=['change'])
+    def reprice_products(self, request, queryset):
+        return self._bulk_action(
+            request, queryset, RepriceForm, 'Изменение цен',
+            lambda products, data, dry_run : bulk.reprice(products, data['percent'], dry_run),
+        )
+
+    @admin.action(description='Перенести в другую категорию', permissions=['change'])
+    def move_to_category(self, request, queryset):
+        return self._bulk_action(
+            request, queryset, MoveCategoryForm, 'Перенос в категорию',
+            lambda products, data, dry_run : bulk.move_to_category(products, data['category'], dry_run),
+        )
+
+    def get_urls(self):
+        urls = [
+            path(
+                'stock-upload/',
+                self.admin_site.admin_view(self.stock_upload_view),
+                name='store_product_stock_upload',
+            ),
+        ]
+        return urls + super().get_urls()
+
+    def stock_upload_view(self, request):
+        """
+        Остатки из CSV: "Предпросмотр" показывает изменения, "Применить"
+        записывает их. Браузер не отправляет файл повторно, поэтому
+        для применения файл выбирается еще раз.
+        """
+        if not self.has_change_permission(request) :
+            raise PermissionDenied
+        step = request.POST.get('bulk_step')
+        form = StockUploadForm(request.POST or None, request.FILES or None)
+        result = None
+        if step and form.is_valid() :
+            try :
+                key, values = bulk.read_stock_upload(form.cleaned_data['csv_file'])
+                result = bulk.update_stock(key, values, form.cleaned_data['increment'], dry_run=step != 'apply')
+            except (bulk.BulkError, UnicodeDecodeError) as e :
+                form.add_error('csv_file', str(e) if isinstance(e, bulk.BulkError) else 'Файл должен быть в UTF-8.')
+            else :
+                if step == 'apply' :
+                    self.message_user(request, f'Остатки обновлены: изменено товаров: {result.count}.', messages.SUCCESS)
+                    for product in result.unknown[:bulk.PREVIEW_LIMIT] :
+                        self.message_user(request, f'Товар не найден: {product}', messages.WARNING)
+                    return redirect('admin:store_product_changelist')
+        return self._bulk_page(request, 'Остатки из CSV', form, result, upload=True)
+
+    def get_search_results(self, request, queryset, search_term):
+        # Вместо ILIKE '%...%' по name/description (полный просмотр таблицы)
+        # ищем по search_vector с GIN-индексом
+        if not search_term.strip():
+            return queryset, False
+        return queryset.filter(search_vector=search_query(search_term)), False
 
 # Мы используем TabularInline, чтобы позиции заказа
 # можно было редактировать прямо со страницы Заказа.
@@ -23,8 +178,9 @@ class OrderItemInline(admin.TabularInline):
     extra = 0  # Не показывать пустые формы по умолчанию
 
 @admin.register(Order)
-class OrderAdmin(admin.ModelAdmin):
+class OrderAdmin(LargeTableAdmin):
     list_display = ('id', 'user', 'status', 'created_at', 'full_name')
+    list_select_related = ('user',)
     list_filter = ('status', 'created_at')
     search_fields = ('id', 'user__username', 'full_name', 'phone')
     inlines = [OrderItemInline]  # Включаем позиции заказа
@@ -37,7 +193,22 @@ class CartItemInline(admin.TabularInline):
     extra = 0
 
 @admin.register(Cart)
-class CartAdmin(admin.ModelAdmin):
-    list_display = ('user', 'created_at')
+class CartAdmin(LargeTableAdmin):
+    list_display = ('user', 'item_count', 'total', 'created_at')
+    list_select_related = ('user',)
     search_fields = ('user__username',)
-    inlines = [CartItemInline]
\ No newline at end of file
+    readonly_fields = ('item_count', 'total')
+    inlines = [CartItemInline]
+
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        # Позиции правились напрямую - пересчитываем итоги корзины
+        carts.recalculate(Cart.objects.filter(pk=form.instance.pk))
+
+
+# Очередь фоновых задач (store/jobs.py) - для просмотра ошибок
+@admin.register(Job)
+class JobAdmin(LargeTableAdmin):
+    list_display = ('id', 'name', 'status', 'attempts', 'run_at', 'finished_at')
+    list_filter = ('status', 'name')
+    readonly_fields = ('attempts', 'started_at', 'finished_at', 'last_error', 'created_at')
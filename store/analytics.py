@@ -0,0 +1,169 @@
+# store/analytics.py
+"""
+Отчеты о продажах и остатках по заказам (Order / OrderItem).
+
+Отчеты читают не историю заказов, а дневную сводку DailySales - одна
+строка на (день, товар): продано штук и выручка, SUM(price * quantity)
+по позициям, посчитанная в БД. Отмененные заказы не учитываются.
+
+Сводка пополняется инкрементально (rollup): пересчитываются только
+дни начиная с последнего уже свернутого - он мог быть неполным,
+например сегодняшний. Пополняет ее manage.py analytics (--rollup -
+только сводка, для запуска по расписанию); страница отчета ее только
+читает и не пишет в БД. Отчет читает готовые строки за период
+и не сканирует store_orderitem заново. Если заказы прошлых дней
+изменились (отмена задним числом), дни пересчитывает
+manage.py analytics --since ДАТА (или --rebuild - всю историю).
+
+Оборачиваемость запаса - продано за период / средний запас. Истории
+остатков нет, поэтому средний запас оценивается как среднее между
+остатком на начало периода (текущий + проданное) и текущим: без
+учета поступлений за период.
+"""
+
+import datetime
+from itertools import islice
+
+from django.db import transaction
+from django.db.models import DecimalField, ExpressionWrapper, F, FloatField, Max, Sum
+from django.db.models.functions import Cast, NullIf, TruncDate
+from django.utils import timezone
+
+from .models import DailySales, OrderItem
+
+LINE_REVENUE = ExpressionWrapper(
+    F('price') * F('quantity'),
+    output_field=DecimalField(max_digits=14, decimal_places=2),
+)
+
+# Сколько строк сводки записывается одним INSERT
+ROLLUP_BATCH_SIZE = 1000
+
+# Поля сводки, которые суммируются в отчетах
+TOTALS = {'units' : Sum('units'), 'revenue' : Sum('revenue')}
+
+
+def _start_of(day):
+    return timezone.make_aware(datetime.datetime.combine(day, datetime.time.min))
+
+
+def daily_sales(since=None):
+    """
+    Продажи по дням и товарам прямо по позициям заказов (с дня 'since'),
+    агрегированные в БД: day, product_id, category_id, units, revenue.
+    """
+    items = OrderItem.objects.exclude(order__status='cancelled')
+    if since is not None :
+        items = items.filter(order__created_at__gte=_start_of(since))
+    return (
+        items
+        .annotate(day=TruncDate('order__created_at'))
+        .values('day', 'product_id', category_id=F('product__category_id'))
+        .annotate(units=Sum('quantity'), revenue=Sum(LINE_REVENUE))
+        .order_by()
+    )
+
+
+def last_day():
+    """
+    Последний день, уже свернутый в сводку (None - сводка пуста).
+    """
+    return DailySales.objects.aggregate(last=Max('date'))['last']
+
+
+@transaction.atomic
+def rollup(since=None, full=False):
+    """
+    Пересчитывает сводку с дня 'since' (по умолчанию - с последнего
+    свернутого дня; full=True - всю историю). Возвращает число
+    записанных строк.
+    """
+    if full :
+        since = None
+    elif since is None :
+        since = last_day()
+
+    stale = DailySales.objects.all()
+    if since is not None :
+        stale = stale.filter(date__gte=since)
+    # Удаление убирает строки отмененных с тех пор заказов;
+    # ON CONFLICT - на случай параллельного пересчета тех же дней
+    stale.delete()
+    # Пакетами: bulk_create собрал бы в список все строки разом
+    rows = daily_sales(since).iterator(chunk_size=ROLLUP_BATCH_SIZE)
+    count = 0
+    while batch := [
+        DailySales(
+            date=row['day'],
+            product_id=row['product_id'],
+            category_id=row['category_id'],
+            units=row['units'],
+            revenue=row['revenue'],
+        )
+        for row in islice(rows, ROLLUP_BATCH_SIZE)
+    ] :
+        DailySales.objects.bulk_create(
+            batch,
+            update_conflicts=True,
+            unique_fields=['date', 'product'],
+            update_fields=['category', 'units', 'revenue'],
+        )
+        count += len(batch)
+    return count
+
+
+def _period(start, end):
+    return DailySales.objects.filter(date__gte=start, date__lte=end).order_by()
+
+
+def totals(start, end):
+    """
+    Продано штук и выручка за период (дни включительно).
+    """
+    return _period(start, end).aggregate(**TOTALS)
+
+
+def by_day(start, end):
+    return _period(start, end).values('date').annotate(**TOTALS).order_by('date')
+
+
+def by_category(start, end):
+    return (
+        _period(start, end)
+        .values('category_id', name=F('category__name'))
+        .annotate(**TOTALS)
+        .order_by('-revenue')
+    )
+
+
+def by_product(start, end, limit=None):
+    """
+    Товары по выручке за период с оборачиваемостью запаса (turnover).
+    """
+    # F('units') - уже посчитанная сумма по товару
+    units = Cast(F('units'), FloatField())
+    rows = (
+        _period(start, end)
+        .values('product_id', name=F('product__name'), stock=F('product__stock'))
+        .annotate(**TOTALS)
+        .annotate(turnover=ExpressionWrapper(
+            units / NullIf(Cast(F('product__stock'), FloatField()) + units / 2, 0),
+            output_field=FloatField(),
+        ))
+        .order_by('-revenue', 'product_id')
+    )
+    return rows[:limit] if limit else rows
+
+
+def report(start, end, limit=20):
+    """
+    Все разделы отчета за период - для команды analytics и страницы персонала.
+    """
+    return {
+        'start' : start,
+        'end' : end,
+        'totals' : totals(start, end),
+        'days' : list(by_day(start, end)),
+        'categories' : list(by_category(start, end)),
+        'products' : list(by_product(start, end, limit)),
+    }
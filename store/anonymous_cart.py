@@ -0,0 +1,66 @@
+# store/anonymous_cart.py
+"""
+Корзина анонимного посетителя.
+
+Хранится в подписанной cookie в компактном виде "id:кол-во|id:кол-во",
+поэтому добавление в корзину без входа не пишет в БД вообще.
+При входе (users.views) корзина одним bulk-запросом переносится
+в модель Cart (store.carts.merge_items), а cookie удаляется.
+"""
+
+from django.conf import settings
+
+from . import carts
+
+COOKIE_NAME = 'cart'
+SALT = 'store.anonymous_cart'
+
+
+def load(request):
+    """
+    Содержимое корзины: словарь {id товара: количество}.
+    Подделанная или битая cookie считается пустой корзиной.
+    """
+    raw = request.get_signed_cookie(COOKIE_NAME, default='', salt=SALT)
+    items = {}
+    for part in filter(None, raw.split('|')) :
+        try :
+            product_id, quantity = map(int, part.split(':'))
+        except ValueError :
+            return {}
+        if quantity > 0 :
+            items[product_id] = quantity
+    return items
+
+
+def save(response, items):
+    """
+    Записывает корзину в cookie ответа (пустую - удаляет).
+    """
+    if not items :
+        clear(response)
+        return
+    response.set_signed_cookie(
+        COOKIE_NAME,
+        '|'.join(f'{product_id}:{quantity}' for product_id, quantity in items.items()),
+        salt=SALT,
+        max_age=settings.CART_COOKIE_AGE,
+        httponly=True,
+        samesite='Lax',
+    )
+
+
+def clear(response):
+    response.delete_cookie(COOKIE_NAME, samesite='Lax')
+
+
+def merge_on_login(request, response):
+    """
+    Переносит корзину из cookie в корзину вошедшего пользователя.
+    Вызывается из представлений входа и регистрации.
+    """
+    items = load(request)
+    if items :
+        carts.merge_items(request.user, items)
+        clear(response)
+    return response
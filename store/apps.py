@@ -5,3 +5,8 @@ class StoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'store'
     verbose_name = 'Управление магазином'
+
+    def ready(self):
+        # Подключаем обработчики сигналов (сброс кэша карточек товаров)
+        # и регистрируем обработчики фоновых задач (store/jobs.py)
+        from . import notifications, signals  # noqa: F401
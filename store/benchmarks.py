@@ -0,0 +1,134 @@
+# store/benchmarks.py
+"""
+Общие утилиты для команд-бенчмарков (bench_*).
+
+Бенчмарки никогда не трогают рабочую базу: данные генерируются
+во временной тестовой БД, которая удаляется после замера.
+"""
+
+import statistics
+import time
+from contextlib import contextmanager
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import AnonymousUser
+from django.db import connection
+from django.test import RequestFactory
+
+from . import facets
+from .models import Category, Product
+
+
+@contextmanager
+def benchmark_database(verbosity=0):
+    """
+    Создает временную тестовую БД (как это делает 'manage.py test'),
+    применяет миграции и удаляет ее по выходу из блока.
+    """
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(
+        verbosity=verbosity, autoclobber=True, serialize=False
+    )
+    try :
+        yield
+    finally :
+        connection.creation.destroy_test_db(old_name, verbosity=verbosity)
+
+
+def seed_catalog(products, categories=50, stock=100, batch_size=5000, describe=None):
+    """
+    Заполняет каталог 'products' товарами в 'categories' категориях.
+    Названия товаров дополнены нулями, чтобы порядок по имени
+    совпадал с порядком генерации. 'describe(i)' задает описание товара.
+    """
+    Category.objects.bulk_create(
+        Category(name=f'Категория {i:04d}') for i in range(categories)
+    )
+    category_ids = list(Category.objects.values_list('id', flat=True))
+
+    batch = []
+    for i in range(products):
+        batch.append(Product(
+            name=f'Товар {i:08d}',
+            description=describe(i) if describe else f'Описание товара {i}',
+            price=Decimal(100 + i % 900),
+            stock=stock,
+            category_id=category_ids[i % len(category_ids)],
+        ))
+        if len(batch) >= batch_size :
+            Product.objects.bulk_create(batch)
+            batch = []
+    if batch :
+        Product.objects.bulk_create(batch)
+    # bulk_create не шлет сигналы - сводки категорий для фильтров каталога
+    facets.refresh()
+
+
+def seed_users(count, prefix='shopper'):
+    """
+    Создает 'count' покупателей без пароля (входят через force_login).
+    """
+    User = get_user_model()
+    User.objects.bulk_create(
+        User(username=f'{prefix}{i:05d}', password=make_password(None)) for i in range(count)
+    )
+    return list(User.objects.filter(username__startswith=prefix).order_by('username'))
+
+
+def make_request(path, data=None, user=None):
+    """
+    GET-запрос для прямого вызова view в обход сетевого стека.
+    """
+    request = RequestFactory().get(path, data or {})
+    request.user = user or AnonymousUser()
+
+    async def auser():
+        return request.user
+
+    # Как AuthenticationMiddleware - для async-представлений
+    request.auser = auser
+    return request
+
+
+def measure(func, repeat=50, warmup=3):
+    """
+    Вызывает 'func' 'repeat' раз и возвращает статистику времени в мс.
+    """
+    for _ in range(warmup):
+        func()
+
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - started) * 1000)
+
+    return summarize(timings)
+
+
+def summarize(timings):
+    """
+    min/p50/p95/p99/max по списку замеров.
+    """
+    timings = sorted(timings)
+    return {
+        'min' : timings[0],
+        'p50' : statistics.median(timings),
+        'p95' : timings[min(len(timings) - 1, int(len(timings) * 0.95))],
+        'p99' : timings[min(len(timings) - 1, int(len(timings) * 0.99))],
+        'max' : timings[-1],
+    }
+
+
+def format_timings(label, stats):
+    """
+    Строка отчета для вывода в консоль.
+    """
+    return (
+        f'{label:<40} '
+        f'min {stats["min"]:8.2f} мс  '
+        f'p50 {stats["p50"]:8.2f} мс  '
+        f'p95 {stats["p95"]:8.2f} мс'
+    )
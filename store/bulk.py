@@ -0,0 +1,188 @@
+# store/bulk.py
+"""
+Массовые изменения товаров: цены на процент, остатки из CSV,
+перенос в другую категорию. Используются действиями админки
+(store/admin.py) и командой bulk_products.
+
+Каждая операция - одна транзакция из одного UPDATE по множеству
+строк: новое значение считает сама БД (цена) или берет из массивов,
+переданных параметрами (остатки из файла), без загрузки товаров
+в Python и save() по одному. Поэтому переоценка 100 000 товаров -
+один UPDATE, а не 100 000.
+
+С dry_run=True операция ничего не меняет и только возвращает
+предпросмотр: сколько товаров изменится и первые из них "было -> стало".
+
+UPDATE не шлет сигналы, поэтому операции сами делают то, что
+для save() делают обработчики в store/signals.py: сбрасывают кэш
+карточек (новой версией каталога), пересчитывают сводки категорий и итоги корзин
+и сдвигают updated_at (ETag каталога).
+"""
+
+import csv
+import io
+from collections import namedtuple
+from decimal import Decimal
+
+from django.db import connection, transaction
+from django.db.models import DecimalField, ExpressionWrapper, F, Value
+from django.db.models.functions import Now, Round
+
+from . import carts, facets, product_cache
+from .models import Cart, Product
+
+PREVIEW_LIMIT = 50
+
+Change = namedtuple('Change', 'pk name old new')
+
+
+class Result:
+    """
+    Итог операции: число измененных (или изменяемых при dry_run) товаров
+    и первые PREVIEW_LIMIT изменений.
+    """
+
+    def __init__(self, count, preview, dry_run, unknown=()):
+        self.count = count
+        self.preview = preview
+        self.dry_run = dry_run
+        # Строки файла, для которых не нашлось товара
+        self.unknown = list(unknown)
+
+
+class BulkError(ValueError):
+    """
+    Некорректные параметры операции или строки файла.
+    """
+
+
+def _after_update(product_ids, category_ids, prices_changed=False):
+    """
+    То, что для save() делают сигналы, - один раз на всю операцию.
+    """
+    transaction.on_commit(product_cache.invalidate_all)
+    facets.refresh(category_ids)
+    if prices_changed :
+        carts.recalculate(Cart.objects.filter(items__product__in=product_ids))
+
+
+def _preview(changed, old, new):
+    rows = changed.order_by('name').values_list('pk', 'name', old, new)[:PREVIEW_LIMIT]
+    return [Change(*row) for row in rows]
+
+
+@transaction.atomic
+def reprice(products, percent, dry_run=False):
+    """
+    Меняет цены товаров QuerySet 'products' на 'percent' процентов
+    (отрицательный - скидка), с округлением до копеек.
+    """
+    percent = Decimal(percent)
+    if percent <= -100 :
+        raise BulkError('Цена не может уменьшиться на 100% и больше.')
+    new_price = Round(
+        ExpressionWrapper(
+            F('price') * Value(1 + percent / 100),
+            output_field=DecimalField(max_digits=10, decimal_places=2),
+        ),
+        2,
+    )
+    changed = products.annotate(new_price=new_price).exclude(new_price=F('price'))
+    preview = _preview(changed, 'price', 'new_price')
+    if dry_run :
+        return Result(changed.count(), preview, dry_run)
+
+    # Блокируем изменяемые строки и запоминаем их - для кэша, сводок и корзин
+    rows = list(changed.select_for_update(of=('self',)).values_list('pk', 'category_id'))
+    product_ids = [pk for pk, _ in rows]
+    changed.update(price=new_price, updated_at=Now())
+    _after_update(product_ids, {category_id for _, category_id in rows}, prices_changed=True)
+    return Result(len(rows), preview, dry_run)
+
+
+@transaction.atomic
+def move_to_category(products, category, dry_run=False):
+    """
+    Переносит товары QuerySet 'products' в категорию 'category'.
+    """
+    # Новая (еще не созданная - только при dry_run) категория: меняются все
+    changed = products.exclude(category=category) if category.pk else products
+    changed = changed.annotate(new_category=Value(category.name))
+    preview = _preview(changed, 'category__name', 'new_category')
+    if dry_run :
+        return Result(changed.count(), preview, dry_run)
+
+    rows = list(changed.select_for_update(of=('self',)).values_list('pk', 'category_id'))
+    product_ids = [pk for pk, _ in rows]
+    changed.update(category=category, updated_at=Now())
+    _after_update(product_ids, {category.pk, *(category_id for _, category_id in rows)})
+    return Result(len(rows), preview, dry_run)
+
+
+def read_stock_csv(fp):
+    """
+    Разбирает CSV с остатками: колонка 'stock' и колонка товара -
+    'id' или 'name'. Возвращает (ключевая колонка, {id или название: число}).
+    """
+    reader = csv.DictReader(fp)
+    fields = reader.fieldnames or []
+    key = 'id' if 'id' in fields else 'name' if 'name' in fields else None
+    if key is None or 'stock' not in fields :
+        raise BulkError("В файле нужны колонки 'stock' и 'id' или 'name'.")
+    values = {}
+    for row in reader :
+        try :
+            product = int(row[key]) if key == 'id' else row[key].strip()
+            values[product] = int(row['stock'])
+        except (TypeError, ValueError, AttributeError) :
+            raise BulkError(f'Строка {reader.line_num}: некорректные данные {dict(row)}.')
+    return key, values
+
+
+def read_stock_upload(uploaded):
+    """
+    read_stock_csv для загруженного файла (UploadedFile) в UTF-8.
+    """
+    return read_stock_csv(io.TextIOWrapper(uploaded, encoding='utf-8-sig', newline=''))
+
+
+@transaction.atomic
+def update_stock(key, values, increment=False, dry_run=False):
+    """
+    Устанавливает (или с increment=True - увеличивает, при отрицательном
+    числе - уменьшает, не ниже нуля) остатки товаров по результату
+    read_stock_csv. Все остатки записывает один UPDATE ... FROM unnest():
+    пары (id, остаток) передаются двумя массивами-параметрами.
+    """
+    if not increment and any(value < 0 for value in values.values()) :
+        raise BulkError('Остаток не может быть отрицательным.')
+    products = Product.objects.filter(**{f'{key}__in' : values}).order_by('pk')
+    if not dry_run :
+        products = products.select_for_update()
+    rows = list(products.values_list('pk', 'name', key, 'stock', 'category_id'))
+    found = {row[2] for row in rows}
+    unknown = [product for product in values if product not in found]
+
+    changes, categories = [], set()
+    for pk, name, product, stock, category_id in rows :
+        new = max(stock + values[product], 0) if increment else values[product]
+        if new != stock :
+            changes.append(Change(pk, name, stock, new))
+            categories.add(category_id)
+    preview = sorted(changes, key=lambda change : change.name)[:PREVIEW_LIMIT]
+    if dry_run or not changes :
+        return Result(len(changes), preview, dry_run, unknown)
+
+    # Строки товаров заблокированы выше - новые значения точные
+    with connection.cursor() as cursor :
+        cursor.execute(
+            f'''
+            UPDATE {Product._meta.db_table} AS product
+            SET stock = new.stock, updated_at = now()
+            FROM unnest(%s::bigint[], %s::integer[]) AS new(id, stock)
+            WHERE product.id = new.id
+            ''',
+            [[c.pk for c in changes], [c.new for c in changes]],
+        )
+    _after_update([c.pk for c in changes], categories)
+    return Result(len(changes), preview, dry_run, unknown)
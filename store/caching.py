@@ -0,0 +1,213 @@
+# store/caching.py
+"""
+Двухуровневый кэш и версия каталога.
+
+TieredCache - бэкенд кэша Django (см. CACHES в settings.py): перед общим
+кэшем L2 (Redis, общий для всех процессов и серверов) стоит LRU
+в памяти процесса - L1. Повторное чтение того же ключа обходится
+без сетевого запроса к Redis.
+
+L1 каждого процесса не знает о записях других процессов, поэтому
+его записи живут не дольше L1_TIMEOUT секунд: столько процесс может
+видеть значение, уже измененное или удаленное в другом процессе.
+Собственные изменения процесс видит сразу. Счетчики (incr/decr)
+в L1 не хранятся и всегда идут в L2.
+
+Версия каталога - число в общем кэше. Оно передается как version=
+в ключи кэшированных данных каталога (см. store/product_cache.py).
+Массовые изменения (импорт, store/bulk.py, правка категории) не
+удаляют тысячи ключей по одному, а увеличивают версию: старые ключи
+перестают читаться и вытесняются сами по истечении срока.
+"""
+
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+CATALOG_VERSION_KEY = 'store:catalog:version'
+
+# L1 общий для всех потоков процесса (экземпляры бэкенда - у каждого
+# потока свои, как и у LocMemCache): LOCATION -> (записи, блокировка)
+_local_stores = {}
+_local_stores_lock = threading.Lock()
+
+_MISSING = object()
+
+
+class TieredCache(BaseCache):
+    """
+    L1 (LRU в памяти процесса) перед кэшем L2 - алиасом из CACHES,
+    указанным в LOCATION. OPTIONS: MAX_ENTRIES - размер L1,
+    L1_TIMEOUT - сколько секунд запись L1 используется без L2.
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._shared_alias = location
+        self._l1_timeout = options.get('L1_TIMEOUT', 5)
+        with _local_stores_lock :
+            self._entries, self._lock = _local_stores.setdefault(location, (OrderedDict(), threading.Lock()))
+
+    @property
+    def shared(self):
+        return caches[self._shared_alias]
+
+    def _l1_get(self, key):
+        with self._lock :
+            entry = self._entries.get(key)
+            if entry is None :
+                return _MISSING
+            expires_at, pickled = entry
+            if expires_at <= time.monotonic() :
+                del self._entries[key]
+                return _MISSING
+            self._entries.move_to_end(key)
+        return pickle.loads(pickled)
+
+    def _l1_set(self, key, value, timeout):
+        # Копия через pickle, как в LocMemCache: потоки не делят
+        # один и тот же объект и не меняют его друг у друга
+        if timeout is not None and timeout <= 0 :
+            self._l1_delete(key)
+            return
+        ttl = self._l1_timeout if timeout is None else min(timeout, self._l1_timeout)
+        pickled = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        with self._lock :
+            self._entries[key] = (time.monotonic() + ttl, pickled)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_entries :
+                self._entries.popitem(last=False)
+
+    def _l1_delete(self, key):
+        with self._lock :
+            self._entries.pop(key, None)
+
+    def _timeout(self, timeout):
+        return self.default_timeout if timeout is DEFAULT_TIMEOUT else timeout
+
+    def get(self, key, default=None, version=None):
+        local_key = self.make_and_validate_key(key, version=version)
+        value = self._l1_get(local_key)
+        if value is not _MISSING :
+            return value
+        value = self.shared.get(key, _MISSING, version=version)
+        if value is _MISSING :
+            return default
+        self._l1_set(local_key, value, None)
+        return value
+
+    def get_many(self, keys, version=None):
+        found, missing = {}, []
+        for key in keys :
+            value = self._l1_get(self.make_and_validate_key(key, version=version))
+            if value is _MISSING :
+                missing.append(key)
+            else :
+                found[key] = value
+        if missing :
+            shared = self.shared.get_many(missing, version=version)
+            for key, value in shared.items() :
+                self._l1_set(self.make_key(key, version=version), value, None)
+            found.update(shared)
+        return found
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        local_key = self.make_and_validate_key(key, version=version)
+        timeout = self._timeout(timeout)
+        self.shared.set(key, value, timeout, version=version)
+        self._l1_set(local_key, value, timeout)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        timeout = self._timeout(timeout)
+        failed = self.shared.set_many(data, timeout, version=version)
+        for key, value in data.items() :
+            if key not in failed :
+                self._l1_set(self.make_and_validate_key(key, version=version), value, timeout)
+        return failed
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        local_key = self.make_and_validate_key(key, version=version)
+        timeout = self._timeout(timeout)
+        if self.shared.add(key, value, timeout, version=version) :
+            self._l1_set(local_key, value, timeout)
+            return True
+        # В L2 уже есть значение - возможно, не то, что в L1
+        self._l1_delete(local_key)
+        return False
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        return self.shared.touch(key, self._timeout(timeout), version=version)
+
+    def incr(self, key, delta=1, version=None):
+        self._l1_delete(self.make_and_validate_key(key, version=version))
+        return self.shared.incr(key, delta, version=version)
+
+    def has_key(self, key, version=None):
+        if self._l1_get(self.make_and_validate_key(key, version=version)) is not _MISSING :
+            return True
+        return self.shared.has_key(key, version=version)
+
+    def delete(self, key, version=None):
+        self._l1_delete(self.make_and_validate_key(key, version=version))
+        return self.shared.delete(key, version=version)
+
+    def delete_many(self, keys, version=None):
+        keys = list(keys)
+        for key in keys :
+            self._l1_delete(self.make_and_validate_key(key, version=version))
+        self.shared.delete_many(keys, version=version)
+
+    def clear(self):
+        with self._lock :
+            self._entries.clear()
+        self.shared.clear()
+
+
+def _cache():
+    return caches[settings.CATALOG_CACHE_ALIAS]
+
+
+def _initial_version():
+    # Версия вытеснена из кэша или еще не создана. Начинаем не с 1,
+    # а с текущего времени: иначе снова стали бы читаться ключи,
+    # записанные когда-то под той же версией
+    return int(time.time() * 1000)
+
+
+def catalog_version():
+    """
+    Текущая версия каталога для version= ключей кэша.
+    """
+    cache = _cache()
+    version = cache.get(CATALOG_VERSION_KEY)
+    if version is None :
+        cache.add(CATALOG_VERSION_KEY, _initial_version(), timeout=None)
+        version = cache.get(CATALOG_VERSION_KEY)
+    return version
+
+
+async def acatalog_version():
+    cache = _cache()
+    version = await cache.aget(CATALOG_VERSION_KEY)
+    if version is None :
+        await cache.aadd(CATALOG_VERSION_KEY, _initial_version(), timeout=None)
+        version = await cache.aget(CATALOG_VERSION_KEY)
+    return version
+
+
+def bump_catalog_version():
+    """
+    Новая версия каталога: все данные каталога в кэше устаревают разом.
+    """
+    cache = _cache()
+    try :
+        return cache.incr(CATALOG_VERSION_KEY)
+    except ValueError :
+        cache.add(CATALOG_VERSION_KEY, _initial_version(), timeout=None)
+        return cache.incr(CATALOG_VERSION_KEY)
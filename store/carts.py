@@ -0,0 +1,201 @@
+# store/carts.py
+"""
+Работа с корзиной и ее денормализованными итогами.
+
+Cart.total и Cart.item_count хранят сумму и количество товаров
+в корзине, чтобы значок корзины в шапке не обращался к CartItem.
+Все изменения позиций корзины идут через функции этого модуля,
+а смену цен товаров отслеживают сигналы (store/signals.py).
+Они же держат резервы товара позициями (store/holds.py).
+"""
+
+from django.db import transaction
+from django.db.models import DecimalField, ExpressionWrapper, F, OuterRef, Subquery, Sum, Value, Window
+from django.db.models.functions import Coalesce
+
+from . import holds
+from .models import Cart, CartItem, Product
+
+EMPTY_CART = {'total' : 0, 'item_count' : 0}
+
+LINE_TOTAL = ExpressionWrapper(
+    F('product__price') * F('quantity'),
+    output_field=DecimalField(max_digits=12, decimal_places=2),
+)
+
+
+def cart_lines(user):
+    """
+    Позиции корзины пользователя одним запросом: товар, сумма позиции
+    (line_total) и сумма всей корзины (cart_total, оконная функция).
+    """
+    return (
+        CartItem.objects.filter(cart__user=user)
+        .select_related('product')
+        .defer('product__description', 'product__search_vector')
+        .annotate(
+            line_total=LINE_TOTAL,
+            cart_total=Window(Sum(LINE_TOTAL), output_field=LINE_TOTAL.output_field),
+        )
+        .order_by('product__name')
+    )
+
+
+def _anonymous_products(items):
+    return Product.objects.filter(pk__in=items).only('id', 'name', 'price').order_by('name')
+
+
+def _anonymous_lines(products, items):
+    lines = []
+    for product in products :
+        line = CartItem(product=product, quantity=items[product.pk])
+        line.line_total = product.price * line.quantity
+        lines.append(line)
+    return lines
+
+
+def anonymous_cart_lines(items):
+    """
+    То же, что cart_lines, для корзины из cookie ({id товара: количество}):
+    несохраненные CartItem с line_total, товары - одним запросом.
+    """
+    return _anonymous_lines(_anonymous_products(items), items)
+
+
+async def aanonymous_cart_lines(items):
+    return _anonymous_lines([product async for product in _anonymous_products(items)], items)
+
+
+async def asummary(user):
+    """
+    Итоги корзины пользователя для шапки (см. context_processors.cart_summary)
+    - для async-представлений, где ленивое чтение из шаблона невозможно.
+    """
+    summary = await Cart.objects.filter(user=user).values('total', 'item_count').afirst()
+    return summary or EMPTY_CART
+
+
+@transaction.atomic
+def merge_items(user, items):
+    """
+    Добавляет товары {id товара: количество} в корзину пользователя
+    одним INSERT ... ON CONFLICT (cart, product) DO UPDATE.
+    Количество складывается с уже лежащим в корзине и ограничивается
+    свободным остатком; вся позиция получает новый резерв.
+    Удаленные и закончившиеся товары пропускаются.
+    """
+    cart, created = Cart.objects.get_or_create(user=user)
+    existing = {} if created else {
+        product_id : (quantity, held_until is not None)
+        for product_id, quantity, held_until in cart.items.select_for_update()
+        .filter(product_id__in=items).values_list('product_id', 'quantity', 'held_until')
+    }
+    # Товары блокируются в порядке pk - как при оформлении заказа
+    stock = Product.objects.select_for_update().filter(pk__in=items).order_by('pk').values_list('pk', 'stock', 'reserved')
+
+    lines, reserved = [], {}
+    for product_id, on_stock, on_hold in stock :
+        in_cart, held = existing.get(product_id, (0, False))
+        own = in_cart if held else 0
+        # Свой резерв позиции входит в reserved - он тоже доступен ей
+        quantity = min(in_cart + items[product_id], on_stock - on_hold + own)
+        if quantity <= 0 :
+            continue
+        lines.append(CartItem(cart=cart, product_id=product_id, quantity=quantity, held_until=holds.expiry()))
+        reserved[product_id] = quantity - own
+
+    CartItem.objects.bulk_create(
+        lines,
+        update_conflicts=True,
+        unique_fields=['cart', 'product'],
+        update_fields=['quantity', 'held_until'],
+    )
+    holds.add(reserved)
+    recalculate(Cart.objects.filter(pk=cart.pk))
+    return cart
+
+
+@transaction.atomic
+def add_item(cart, product, quantity):
+    """
+    Увеличивает количество товара в корзине на 'quantity', резервирует
+    всю позицию заново на STOCK_HOLD_TTL и сдвигает итоги корзины.
+    Бросает holds.NotEnoughStock, если свободного остатка не хватает.
+    """
+    line = (
+        CartItem.objects.select_for_update()
+        .filter(cart=cart, product=product)
+        .values_list('pk', 'quantity', 'held_until')
+        .first()
+    )
+    # Истекший и снятый резерв позиции нужно взять заново целиком
+    needed = quantity if line is None or line[2] is not None else line[1] + quantity
+    holds.reserve(product.pk, needed)
+
+    if line is None :
+        CartItem.objects.create(cart=cart, product=product, quantity=quantity, held_until=holds.expiry())
+    else :
+        CartItem.objects.filter(pk=line[0]).update(quantity=F('quantity') + quantity, held_until=holds.expiry())
+    Cart.objects.filter(pk=cart.pk).update(
+        total=F('total') + product.price * quantity,
+        item_count=F('item_count') + quantity,
+    )
+
+
+@transaction.atomic
+def remove_item(cart, product_id):
+    """
+    Убирает товар из корзины и снимает его резерв.
+    Возвращает True, если товар там был.
+    """
+    line = (
+        CartItem.objects.select_for_update()
+        .filter(cart=cart, product_id=product_id)
+        .values_list('pk', 'quantity', 'held_until')
+        .first()
+    )
+    if line is None :
+        return False
+    CartItem.objects.filter(pk=line[0]).delete()
+    if line[2] is not None :
+        holds.release({product_id : line[1]})
+    recalculate(Cart.objects.filter(pk=cart.pk))
+    return True
+
+
+def release_cart(cart):
+    """
+    Снимает все резервы корзины (перед ее удалением).
+    """
+    released = {}
+    for product_id, quantity in cart.items.filter(held_until__isnull=False).values_list('product_id', 'quantity') :
+        released[product_id] = quantity
+    holds.release(released)
+
+
+def clear(cart):
+    """
+    Очищает корзину (после оформления заказа: резервы позиций
+    к этому моменту уже превращены в списание остатков).
+    """
+    cart.items.all().delete()
+    Cart.objects.filter(pk=cart.pk).update(total=0, item_count=0)
+
+
+def recalculate(carts):
+    """
+    Пересчитывает итоги корзин из QuerySet 'carts' одним UPDATE.
+    Нужен там, где позиции или цены меняются в обход add_item.
+    """
+    lines = CartItem.objects.filter(cart=OuterRef('pk')).values('cart')
+    return carts.update(
+        total=Coalesce(
+            Subquery(lines.annotate(s=Sum(LINE_TOTAL)).values('s')),
+            Value(0),
+            output_field=DecimalField(max_digits=12, decimal_places=2),
+        ),
+        item_count=Coalesce(
+            Subquery(lines.annotate(s=Sum('quantity')).values('s')),
+            Value(0),
+        ),
+    )
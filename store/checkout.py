@@ -0,0 +1,148 @@
+# store/checkout.py
+"""
+Оформление заказа из корзины.
+
+Весь путь оформления - фиксированное число запросов, независимо
+от количества позиций в корзине:
+
+1. позиции корзины (строки блокируются, чтобы двойная отправка
+   формы не создала два заказа, а reap_holds не снял их резервы);
+2. товары корзины - одним SELECT ... FOR UPDATE в порядке pk, поэтому
+   параллельные заказы с пересекающимися товарами не взаимоблокируются;
+3. INSERT заказа;
+4. списание остатков и резервов одним условным UPDATE;
+5. bulk_create позиций заказа;
+6. очистка корзины и ее итогов.
+
+Позиции с резервом (store/holds.py) списываются без проверки
+свободного остатка - он уже проверен при резервировании. Позиции,
+чей резерв истек и снят, проверяются по свободному остатку
+stock - reserved, как при добавлении в корзину.
+
+Если какие-то товары закончились, добавляется еще один UPDATE
+сводок их категорий (store/facets.py).
+
+Письмо покупателю и уведомление о заканчивающихся товарах ставятся
+в очередь фоновых задач (store/jobs.py) уже после коммита: транзакция
+держит блокировки товаров только на время перечисленных запросов.
+"""
+
+from collections import Counter
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, PositiveIntegerField, Value, When
+from django.db.models.functions import Greatest, Now
+
+from . import carts, facets, jobs
+from .models import Product, OrderItem
+
+
+class CheckoutError(Exception):
+    """
+    Базовое исключение оформления заказа.
+    Транзакция к моменту его получения уже откачена.
+    """
+
+
+class EmptyCart(CheckoutError):
+    """
+    В корзине нет ни одной позиции.
+    """
+
+
+class OutOfStock(CheckoutError):
+    """
+    Одного из товаров на складе меньше, чем в корзине.
+    """
+
+    def __init__(self, product):
+        super().__init__(f"Товара '{product.name}' не хватает на складе.")
+        self.product = product
+
+
+@transaction.atomic
+def place_order(order, cart):
+    """
+    Сохраняет 'order' (несохраненный экземпляр Order с заполненными
+    полями доставки), переносит в него позиции 'cart', списывает
+    остатки (резервы позиций превращаются в списание) и очищает
+    корзину.
+    Возвращает сохраненный заказ.
+    """
+    quantities, held = {}, {}
+    for product_id, quantity, held_until in cart.items.select_for_update().values_list('product_id', 'quantity', 'held_until') :
+        quantities[product_id] = quantity
+        if held_until is not None :
+            held[product_id] = quantity
+    if not quantities :
+        raise EmptyCart("Ваша корзина пуста.")
+
+    products = list(
+        Product.objects.select_for_update()
+        .filter(pk__in=quantities)
+        .order_by('pk')
+        .only('id', 'name', 'price', 'stock', 'reserved', 'category_id')
+    )
+    for product in products :
+        # Без резерва позиции доступен только свободный остаток
+        available = product.stock if product.pk in held else product.stock - product.reserved
+        if quantities[product.pk] > available :
+            raise OutOfStock(product)
+
+    order.save()
+
+    # Одно списание на все позиции: stock = stock - CASE id WHEN ... END,
+    # reserved - за вычетом резервов позиций.
+    # Условие stock >= нужного количества страхует от ухода в минус
+    # даже на бэкендах без SELECT ... FOR UPDATE.
+    needed = Case(
+        *(When(pk=pk, then=Value(quantity)) for pk, quantity in quantities.items()),
+        output_field=PositiveIntegerField(),
+    )
+    changes = {'stock' : F('stock') - needed, 'updated_at' : Now()}
+    if held :
+        released = Case(
+            *(When(pk=pk, then=Value(quantity)) for pk, quantity in held.items()),
+            default=Value(0),
+            output_field=PositiveIntegerField(),
+        )
+        changes['reserved'] = Greatest(F('reserved') - released, Value(0))
+    updated = (
+        Product.objects
+        .filter(pk__in=quantities, stock__gte=needed)
+        .update(**changes)
+    )
+    if updated != len(products) :
+        # Кто-то успел списать остатки между проверкой и UPDATE
+        short = Product.objects.filter(pk__in=quantities, stock__lt=needed).first()
+        raise OutOfStock(short or products[0])
+
+    # Закончившиеся товары больше не считаются "в наличии" в фильтрах каталога
+    facets.sold_out(Counter(
+        product.category_id for product in products if product.stock == quantities[product.pk]
+    ))
+
+    # Уведомление - только о товарах, остаток которых этим заказом
+    # опустился до порога (а не о каждом заказе уже заканчивающегося товара)
+    threshold = settings.LOW_STOCK_THRESHOLD
+    low_stock = [
+        product.pk for product in products
+        if product.stock - quantities[product.pk] <= threshold < product.stock
+    ]
+    if low_stock :
+        jobs.enqueue('low_stock', product_ids=low_stock)
+    jobs.enqueue('order_confirmation', order_id=order.pk)
+
+    OrderItem.objects.bulk_create(
+        OrderItem(
+            order=order,
+            product=product,
+            price=product.price,
+            quantity=quantities[product.pk],
+        )
+        for product in products
+    )
+
+    carts.clear(cart)
+    return order
@@ -0,0 +1,103 @@
+# store/conditional.py
+"""
+Условные GET-запросы (ETag / Last-Modified) и Cache-Control
+для страниц каталога.
+
+Представление сначала дешево вычисляет версию страницы (время изменения
+товаров и категорий, сводки категорий), затем not_modified() сравнивает
+ее с If-None-Match / If-Modified-Since - и при совпадении возвращается
+304 без запроса товаров и без рендеринга шаблона.
+
+В ETag входит и состояние посетителя, которое видно на странице:
+пользователь и итоги его корзины в шапке, cookie анонимной корзины,
+cookie CSRF (токен формы "в корзину" должен ей соответствовать).
+ETag слабый (W/): токен CSRF в разметке меняется от рендеринга
+к рендерингу, но смысл страницы - нет.
+
+Last-Modified не учитывает посетителя, поэтому отдается только
+страницам без его данных (is_shareable): по If-Modified-Since
+проверяются в основном поисковые роботы.
+
+Cache-Control: страницы без персональных данных (анонимный посетитель
+без корзины) разрешено кэшировать общим кэшам (CDN, nginx) на
+CATALOG_CACHE_MAX_AGE секунд; остальные - только браузеру, с
+обязательной проверкой через ETag.
+"""
+
+import hashlib
+
+from django.conf import settings
+from django.http import HttpResponseNotModified
+from django.middleware.csrf import get_token
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+
+from . import anonymous_cart
+
+
+def make_etag(*parts):
+    """
+    Слабый ETag из частей версии страницы.
+    """
+    digest = hashlib.sha1(repr(parts).encode()).hexdigest()[:20]
+    return f'W/"{digest}"'
+
+
+def visitor_state(request, context, csrf=False):
+    """
+    Часть версии страницы, зависящая от посетителя. Для вошедшего
+    пользователя итоги корзины уже загружены в context (_load_header).
+    """
+    if request.user.is_authenticated :
+        summary = context.get('cart_summary') or {}
+        state = ('user', request.user.pk, request.user.username, summary.get('total'), summary.get('item_count'))
+    else :
+        state = ('anonymous', request.COOKIES.get(anonymous_cart.COOKIE_NAME, ''))
+    if csrf :
+        # Секрет CSRF из cookie; если cookie еще нет - новый,
+        # его поставит этот же ответ (и страница, и 304)
+        get_token(request)
+        state += (request.META.get('CSRF_COOKIE', ''),)
+    return state
+
+
+def is_shareable(request):
+    """
+    Страницу можно отдать общему кэшу: посетитель анонимный и без корзины.
+    """
+    return not request.user.is_authenticated and anonymous_cart.COOKIE_NAME not in request.COOKIES
+
+
+def _timestamp(last_modified):
+    return int(last_modified.timestamp()) if last_modified else None
+
+
+def not_modified(request, etag, last_modified, public=False):
+    """
+    304 Not Modified, если у клиента актуальная версия страницы, иначе None.
+    """
+    response = get_conditional_response(request, etag=etag, last_modified=_timestamp(last_modified))
+    if isinstance(response, HttpResponseNotModified) :
+        return set_headers(response, etag, last_modified, public)
+    return None
+
+
+def set_headers(response, etag, last_modified, public=False):
+    """
+    ETag, Last-Modified и Cache-Control ответа.
+    public - страница без данных посетителя и без формы с CSRF-токеном.
+    """
+    response.headers['ETag'] = etag
+    if last_modified :
+        response.headers['Last-Modified'] = http_date(_timestamp(last_modified))
+    if public :
+        patch_cache_control(
+            response,
+            public=True,
+            max_age=settings.CATALOG_CACHE_MAX_AGE,
+            stale_while_revalidate=settings.CATALOG_STALE_WHILE_REVALIDATE,
+        )
+    else :
+        # Браузер хранит страницу, но перед показом сверяет ETag (дешевый 304)
+        patch_cache_control(response, private=True, no_cache=True)
+    return response
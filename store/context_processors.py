@@ -0,0 +1,26 @@
+# store/context_processors.py
+
+from django.utils.functional import SimpleLazyObject
+
+from . import anonymous_cart
+from .carts import EMPTY_CART
+from .models import Cart
+
+
+def cart_summary(request):
+    """
+    Итоги корзины для шапки сайта.
+    Читаются денормализованные поля Cart (без обращения к CartItem)
+    и только если шаблон действительно их использует.
+    Для анонимного посетителя - только количество из cookie, без БД.
+    """
+    user = getattr(request, 'user', None)
+    if user is None or not user.is_authenticated :
+        items = anonymous_cart.load(request)
+        return {'cart_summary' : {'total' : None, 'item_count' : sum(items.values())}}
+
+    def load():
+        summary = Cart.objects.filter(user=user).values('total', 'item_count').first()
+        return summary or EMPTY_CART
+
+    return {'cart_summary' : SimpleLazyObject(load)}
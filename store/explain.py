@@ -0,0 +1,70 @@
+# store/explain.py
+"""
+Планы запросов PostgreSQL (EXPLAIN ANALYZE) для команды explain_views.
+
+Из плана нас интересует, как читаются таблицы: какой индекс выбран,
+не появился ли Seq Scan или лишняя сортировка. Эти узлы сводятся
+в короткий список строк, который удобно сравнивать между запусками.
+"""
+
+import json
+
+from django.db import connection
+
+# Узлы без таблицы, которые все равно стоит видеть в сводке:
+# сортировка в памяти или на диске обычно означает, что индекс не подошел
+REPORTED_NODES = ('Sort', 'Incremental Sort', 'Hash Join', 'Nested Loop', 'Merge Join')
+
+
+def explain(sql, analyze=True):
+    """
+    План запроса 'sql' в формате JSON (корневой узел и время выполнения).
+    EXPLAIN ANALYZE действительно выполняет запрос, поэтому
+    передавать сюда можно только SELECT.
+    """
+    options = 'ANALYZE, BUFFERS, FORMAT JSON' if analyze else 'FORMAT JSON'
+    with connection.cursor() as cursor :
+        cursor.execute(f'EXPLAIN ({options}) {sql}')
+        result = cursor.fetchone()[0]
+    if isinstance(result, str) :
+        result = json.loads(result)
+    return result[0]
+
+
+def iter_nodes(node):
+    """
+    Узлы плана сверху вниз.
+    """
+    yield node
+    for child in node.get('Plans', ()) :
+        yield from iter_nodes(child)
+
+
+def describe_node(node):
+    """
+    "Index Scan using store_product_name_key on store_product" и т.п.
+    """
+    text = node['Node Type']
+    if 'Index Name' in node :
+        text += f' using {node["Index Name"]}'
+    if 'Relation Name' in node :
+        text += f' on {node["Relation Name"]}'
+    return text
+
+
+def summarize(plan):
+    """
+    Сводка плана: список узлов чтения таблиц и "подозрительных" узлов.
+    """
+    return [
+        describe_node(node)
+        for node in iter_nodes(plan['Plan'])
+        if 'Relation Name' in node or node['Node Type'] in REPORTED_NODES
+    ]
+
+
+def seq_scans(summary):
+    """
+    Таблицы, которые читаются полным сканированием.
+    """
+    return [line.split(' on ', 1)[1] for line in summary if line.startswith('Seq Scan on ')]
@@ -0,0 +1,88 @@
+# store/exporting.py
+"""
+Потоковая выгрузка остатков (используется командой export_product_residue).
+
+Строки читаются из БД кусками через QuerySet.iterator() (на PostgreSQL -
+серверный курсор) и сразу же пишутся в вывод, поэтому потребление памяти
+ограничено размером одного куска и не растет с размером каталога.
+"""
+
+import csv
+import io
+import json
+
+from .models import Product
+
+FIELDS = ('name', 'stock')
+FORMATS = ('json', 'jsonl', 'csv')
+
+
+def residue_rows(category=None, low_stock=None, changed_since=None):
+    """
+    QuerySet строк (name, stock) с учетом фильтров:
+    category - название категории, low_stock - остаток не больше порога,
+    changed_since - товары, измененные не раньше указанного момента.
+    """
+    queryset = Product.objects.order_by('name')
+    if category is not None :
+        queryset = queryset.filter(category__name=category)
+    if low_stock is not None :
+        queryset = queryset.filter(stock__lte=low_stock)
+    if changed_since is not None :
+        queryset = queryset.filter(updated_at__gte=changed_since)
+    return queryset.values_list(*FIELDS)
+
+
+def _encode_jsonl(rows):
+    return ''.join(
+        json.dumps(dict(zip(FIELDS, row)), ensure_ascii=False) + '\n'
+        for row in rows
+    )
+
+
+def _encode_csv(rows):
+    buffer = io.StringIO()
+    csv.writer(buffer, lineterminator='\n').writerows(rows)
+    return buffer.getvalue()
+
+
+def _encode_json(rows):
+    return ','.join(
+        json.dumps(dict(zip(FIELDS, row)), ensure_ascii=False, separators=(',', ':'))
+        for row in rows
+    )
+
+
+def export_rows(rows, fmt, write, chunk_size=2000):
+    """
+    Пишет строки 'rows' в формате 'fmt' через функцию 'write'.
+    Каждый кусок из 'chunk_size' строк кодируется и пишется одним вызовом.
+    Возвращает количество выгруженных строк.
+    """
+    encode = {'json' : _encode_json, 'jsonl' : _encode_jsonl, 'csv' : _encode_csv}[fmt]
+
+    if fmt == 'csv' :
+        write(_encode_csv([FIELDS]))
+    elif fmt == 'json' :
+        write('[')
+
+    total = 0
+    chunk = []
+
+    def flush():
+        # В JSON-массиве куски разделяются запятой
+        prefix = ',' if fmt == 'json' and total > len(chunk) else ''
+        write(prefix + encode(chunk))
+        chunk.clear()
+
+    for row in rows.iterator(chunk_size=chunk_size) :
+        chunk.append(row)
+        total += 1
+        if len(chunk) >= chunk_size :
+            flush()
+    if chunk :
+        flush()
+
+    if fmt == 'json' :
+        write(']\n')
+    return total
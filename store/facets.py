@@ -0,0 +1,128 @@
+# store/facets.py
+"""
+Сводки категорий (CategoryFacet) для фильтров каталога.
+
+Число товаров, число товаров в наличии и диапазон цен каждой категории
+хранятся готовыми, поэтому фильтры каталога читают одну строку на
+категорию и не считают COUNT(*) по store_product на каждой странице.
+
+Сводки обновляются:
+* product_changed(old, new) - сигналами Product в транзакции сохранения
+  или удаления товара: счетчики меняются на разницу, диапазон цен
+  расширяется новой ценой. Товары категории перечитываются, только
+  если ушедшая цена была границей диапазона;
+* refresh(ids) - пересчет категорий целиком по их товарам (через индекс
+  по category_id): после импорта (load_goods) и массовых операций
+  (store/bulk.py), а без аргументов - для всех (rebuild_facets);
+* sold_out(counts) - при оформлении заказа, когда товары закончились:
+  только счетчик в наличии, без чтения товаров.
+
+Расхождения (например, после UPDATE в обход этих функций)
+исправляет полный пересчет: manage.py rebuild_facets.
+"""
+
+from django.db.models import Case, Count, F, Max, Min, Q, Subquery, Value, When
+from django.db.models.functions import Coalesce, Greatest, Least
+
+from .models import Category, CategoryFacet, Product
+
+FIELDS = ['product_count', 'in_stock_count', 'min_price', 'max_price']
+
+
+def refresh(category_ids=None):
+    """
+    Пересчитывает сводки категорий 'category_ids' (по умолчанию - всех)
+    одним агрегирующим запросом и одним INSERT ... ON CONFLICT.
+    Возвращает число обновленных сводок.
+    """
+    categories = Category.objects.order_by()
+    if category_ids is not None :
+        category_ids = {pk for pk in category_ids if pk is not None}
+        if not category_ids :
+            return 0
+        categories = categories.filter(pk__in=category_ids)
+    rows = categories.values('pk').annotate(
+        product_count=Count('products'),
+        in_stock_count=Count('products', filter=Q(products__stock__gt=0)),
+        min_price=Min('products__price'),
+        max_price=Max('products__price'),
+    )
+    facets = CategoryFacet.objects.bulk_create(
+        [CategoryFacet(category_id=row.pop('pk'), **row) for row in rows],
+        update_conflicts=True,
+        unique_fields=['category'],
+        update_fields=FIELDS,
+    )
+    return len(facets)
+
+
+def _shrink_price_range(category_id, price):
+    # Цена ушла из категории: если она была границей диапазона,
+    # границы перечитываются по товарам категории, иначе UPDATE
+    # не находит строку и товары не читаются
+    prices = Product.objects.filter(category_id=category_id).values('price')
+    CategoryFacet.objects.filter(Q(min_price=price) | Q(max_price=price), pk=category_id).update(
+        min_price=Subquery(prices.order_by('price')[:1]),
+        max_price=Subquery(prices.order_by('-price')[:1]),
+    )
+
+
+def product_changed(old, new):
+    """
+    Применяет к сводкам изменение одного товара. old и new - (id категории,
+    в наличии ли, цена) до и после сохранения; old - None для нового
+    товара, new - None для удаленного. Одна-две строки CategoryFacet
+    меняются одним UPDATE каждая; сводка, которой еще нет,
+    пересчитывается через refresh().
+    """
+    if old == new :
+        return
+    for category_id in {state[0] for state in (old, new) if state is not None} :
+        product_delta = in_stock_delta = 0
+        fields = {}
+        if old is not None and old[0] == category_id :
+            product_delta -= 1
+            in_stock_delta -= old[1]
+        if new is not None and new[0] == category_id :
+            product_delta += 1
+            in_stock_delta += new[1]
+            price = Value(new[2], output_field=CategoryFacet._meta.get_field('min_price'))
+            fields['min_price'] = Least(Coalesce('min_price', price), price)
+            fields['max_price'] = Greatest(Coalesce('max_price', price), price)
+        fields['product_count'] = Greatest(F('product_count') + product_delta, Value(0))
+        fields['in_stock_count'] = Greatest(F('in_stock_count') + in_stock_delta, Value(0))
+        if not CategoryFacet.objects.filter(pk=category_id).update(**fields) :
+            refresh({category_id})
+            continue
+        if old is None or old[0] != category_id :
+            continue
+        if new is None or new[0] != category_id or new[2] != old[2] :
+            _shrink_price_range(category_id, old[2])
+
+
+def sold_out(counts):
+    """
+    Уменьшает in_stock_count: counts - {id категории: сколько товаров
+    категории закончилось}. Одним UPDATE; не уходит ниже нуля,
+    даже если сводка отстала.
+    """
+    counts = {pk : n for pk, n in counts.items() if n}
+    if not counts :
+        return
+    decrement = Case(*(When(pk=pk, then=Value(n)) for pk, n in counts.items()))
+    CategoryFacet.objects.filter(pk__in=counts).update(
+        in_stock_count=Greatest(F('in_stock_count') - decrement, Value(0))
+    )
+
+
+def catalog_facets():
+    """
+    Сводки непустых категорий для фильтров каталога, по названию категории.
+    """
+    return (
+        CategoryFacet.objects
+        .filter(product_count__gt=0)
+        .select_related('category')
+        .only('category__name', 'category__updated_at', *FIELDS)
+        .order_by('category__name')
+    )
@@ -1,5 +1,5 @@
 from django import forms
-from .models import Order
+from .models import Category, Order
 
 
 class AddToCartForm(forms.Form):
@@ -28,4 +28,99 @@ class OrderForm(forms.ModelForm):
             'full_name': forms.TextInput(attrs={'class': 'form-control'}),
             'address': forms.TextInput(attrs={'class': 'form-control'}),
             'phone': forms.TextInput(attrs={'class': 'form-control'}),
-        }
\ No newline at end of file
+        }
+
+
+class ProductSearchForm(forms.Form):
+    """
+    Форма поиска по каталогу (GET-параметры q, category, page).
+    """
+    q = forms.CharField(
+        max_length=200,
+        label='Поиск',
+        widget=forms.TextInput(attrs={'class': 'form-control', 'type': 'search'})
+    )
+    category = forms.ModelChoiceField(
+        queryset=Category.objects.only('id', 'name'),
+        required=False,
+        label='Категория',
+        empty_label='Все категории'
+    )
+    page = forms.IntegerField(min_value=1, required=False, widget=forms.HiddenInput)
+
+
+class CatalogFilterForm(forms.Form):
+    """
+    Фильтры каталога (GET-параметры category, min_price, max_price, in_stock).
+    Категория - просто id: список категорий для выбора берется
+    из сводок (store/facets.py), а не отдельным запросом к Category.
+    """
+    category = forms.IntegerField(min_value=1, required=False, widget=forms.HiddenInput)
+    min_price = forms.DecimalField(
+        min_value=0,
+        max_digits=10,
+        decimal_places=2,
+        required=False,
+        label='Цена от',
+        widget=forms.NumberInput(attrs={'class': 'form-control', 'step': 'any'})
+    )
+    max_price = forms.DecimalField(
+        min_value=0,
+        max_digits=10,
+        decimal_places=2,
+        required=False,
+        label='до',
+        widget=forms.NumberInput(attrs={'class': 'form-control', 'step': 'any'})
+    )
+    in_stock = forms.BooleanField(required=False, widget=forms.HiddenInput)
+
+
+class AnalyticsForm(forms.Form):
+    """
+    Период отчета о продажах (GET-параметры start и end, дни включительно).
+    """
+    start = forms.DateField(
+        required=False,
+        label='С',
+        widget=forms.DateInput(attrs={'class': 'form-control', 'type': 'date'})
+    )
+    end = forms.DateField(
+        required=False,
+        label='по',
+        widget=forms.DateInput(attrs={'class': 'form-control', 'type': 'date'})
+    )
+
+    def clean(self):
+        cleaned_data = super().clean()
+        start, end = cleaned_data.get('start'), cleaned_data.get('end')
+        if start and end and start > end :
+            raise forms.ValidationError('Начало периода позже его конца.')
+        return cleaned_data
+
+
+class RepriceForm(forms.Form):
+    """
+    Изменение цен выбранных товаров на процент (действие админки).
+    """
+    percent = forms.DecimalField(
+        max_digits=6,
+        decimal_places=2,
+        min_value=-99.99,
+        label='Изменить цены на, %',
+        help_text='Отрицательное число - скидка.'
+    )
+
+
+class MoveCategoryForm(forms.Form):
+    """
+    Перенос выбранных товаров в другую категорию (действие админки).
+    """
+    category = forms.ModelChoiceField(queryset=Category.objects.order_by('name'), label='Новая категория')
+
+
+class StockUploadForm(forms.Form):
+    """
+    Загрузка остатков из CSV (колонки id или name и stock).
+    """
+    csv_file = forms.FileField(label='CSV-файл')
+    increment = forms.BooleanField(required=False, label='Прибавить к остатку, а не заменить')
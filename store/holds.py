@@ -0,0 +1,148 @@
+# store/holds.py
+"""
+Резервирование товара корзинами.
+
+Позиция корзины вошедшего пользователя держит резерв своего количества
+на STOCK_HOLD_TTL секунд (CartItem.held_until). Сумма резервов товара
+хранится счетчиком Product.reserved, свободный остаток - stock - reserved.
+Счетчик меняется только атомарными UPDATE:
+
+* reserve() - "reserved += n, если свободно не меньше n": одним
+  условным UPDATE, без SELECT и без блокировки на время проверки;
+* release() - при удалении позиции и снятии истекших резервов;
+* оформление заказа (store/checkout.py) превращает резерв в списание:
+  stock -= n, reserved -= n - без повторной проверки остатков.
+
+Истекшие резервы снимает reap() пакетами (команда reap_holds),
+пропуская позиции, которые прямо сейчас оформляются в заказ.
+Порядок блокировок везде один: позиции корзины, затем товары.
+
+Корзина анонимного посетителя живет в cookie и ничего не резервирует;
+резервы появляются при переносе ее в Cart после входа (merge_items).
+
+Инвариант: reserved = сумма quantity позиций с held_until IS NOT NULL.
+Правки в обход этого модуля (например, позиций в админке) исправляет
+rebuild() - reap_holds --rebuild.
+"""
+
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+
+from .models import CartItem, Product
+
+
+class NotEnoughStock(Exception):
+    """
+    Свободного остатка меньше, чем нужно зарезервировать.
+    """
+
+    def __init__(self, available):
+        super().__init__(f"Свободный остаток: {available}.")
+        self.available = available
+
+
+def expiry():
+    """
+    Срок нового (или продленного) резерва.
+    """
+    return timezone.now() + timedelta(seconds=settings.STOCK_HOLD_TTL)
+
+
+def reserve(product_id, quantity):
+    """
+    Резервирует 'quantity' единиц товара или бросает NotEnoughStock.
+    """
+    if quantity <= 0 :
+        return
+    updated = (
+        Product.objects
+        .filter(pk=product_id, stock__gte=F('reserved') + quantity)
+        .update(reserved=F('reserved') + quantity)
+    )
+    if not updated :
+        available = Product.objects.filter(pk=product_id).values_list('stock', 'reserved').first()
+        raise NotEnoughStock(max(available[0] - available[1], 0) if available else 0)
+
+
+def _by_product(quantities):
+    return Case(
+        *(When(pk=pk, then=Value(quantity)) for pk, quantity in quantities.items()),
+        default=Value(0),
+        output_field=IntegerField(),
+    )
+
+
+def add(quantities):
+    """
+    Увеличивает резервы {id товара: количество} одним UPDATE без
+    проверки остатка: вызывающий уже проверил его под блокировкой
+    строк товаров (SELECT ... FOR UPDATE).
+    """
+    quantities = {pk : n for pk, n in quantities.items() if n}
+    if quantities :
+        Product.objects.filter(pk__in=quantities).update(reserved=F('reserved') + _by_product(quantities))
+
+
+def release(quantities):
+    """
+    Снимает резервы {id товара: количество} одним UPDATE.
+    Счетчик не уходит ниже нуля, даже если он разошелся с позициями.
+    """
+    quantities = {pk : n for pk, n in quantities.items() if n}
+    if quantities :
+        Product.objects.filter(pk__in=quantities).update(
+            reserved=Greatest(F('reserved') - _by_product(quantities), Value(0))
+        )
+
+
+def reap(batch_size=None, now=None):
+    """
+    Снимает истекшие резервы пакетами по batch_size позиций,
+    каждый пакет - своя короткая транзакция. Позиции остаются
+    в корзине без резерва. Возвращает число снятых резервов.
+    """
+    batch_size = batch_size or settings.STOCK_HOLD_REAP_BATCH
+    now = now or timezone.now()
+    reaped = 0
+    while True :
+        with transaction.atomic() :
+            # SKIP LOCKED: позиции, которые сейчас оформляются в заказ
+            # (или снимаются другим процессом), пропускаем
+            expired = list(
+                CartItem.objects.select_for_update(skip_locked=True)
+                .filter(held_until__lt=now)
+                .order_by('held_until')
+                .values_list('pk', 'product_id', 'quantity')[:batch_size]
+            )
+            if not expired :
+                return reaped
+            released = Counter()
+            for _, product_id, quantity in expired :
+                released[product_id] += quantity
+            CartItem.objects.filter(pk__in=[pk for pk, _, _ in expired]).update(held_until=None)
+            release(released)
+        reaped += len(expired)
+        if len(expired) < batch_size :
+            return reaped
+
+
+def rebuild(product_ids=None):
+    """
+    Пересчитывает Product.reserved по позициям с резервом.
+    Возвращает число товаров, у которых счетчик изменился.
+    """
+    held = (
+        CartItem.objects.filter(product=OuterRef('pk'), held_until__isnull=False)
+        .order_by().values('product').annotate(total=Sum('quantity')).values('total')
+    )
+    actual = Coalesce(Subquery(held), Value(0))
+    products = Product.objects.all()
+    if product_ids is not None :
+        products = products.filter(pk__in=product_ids)
+    return products.annotate(actual=actual).exclude(reserved=F('actual')).update(reserved=actual)
@@ -0,0 +1,210 @@
+# store/importing.py
+"""
+Потоковый импорт товаров (используется командой load_goods).
+
+Файл читается кусками, поэтому память не зависит от его размера.
+Поддерживаются два формата:
+- JSON Lines: по одному JSON-объекту на строку;
+- JSON-массив: [{...}, {...}, ...] - разбирается поэлементно.
+"""
+
+import json
+
+from django.db import transaction
+
+from . import carts, product_cache
+from .models import Cart, Category, Product
+
+DEFAULT_CATEGORY = 'Без категории'
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = ' \t\r\n'
+
+
+def detect_format(fp):
+    """
+    Определяет формат по первому значащему символу:
+    '[' - JSON-массив, иначе - JSON Lines. Позиция в файле не меняется.
+    """
+    position = fp.tell()
+    while True :
+        char = fp.read(1)
+        if not char or char not in _WHITESPACE :
+            break
+    fp.seek(position)
+    return 'json' if char == '[' else 'jsonl'
+
+
+def iter_json_lines(fp):
+    """
+    Записи из файла формата JSON Lines. Пустые строки пропускаются.
+    """
+    for line_number, line in enumerate(fp, start=1):
+        line = line.strip()
+        if not line :
+            continue
+        try :
+            yield json.loads(line)
+        except json.JSONDecodeError as e :
+            raise json.JSONDecodeError(f'Строка {line_number}: {e.msg}', e.doc, e.pos)
+
+
+def iter_json_array(fp, chunk_size=64 * 1024):
+    """
+    Элементы JSON-массива верхнего уровня, без загрузки файла целиком.
+    """
+    buffer = ''
+    position = 0
+    eof = False
+
+    def fill():
+        nonlocal buffer, position, eof
+        chunk = fp.read(chunk_size)
+        if not chunk :
+            eof = True
+        buffer = buffer[position:] + chunk
+        position = 0
+
+    def skip_whitespace():
+        nonlocal position
+        while True :
+            while position < len(buffer) and buffer[position] in _WHITESPACE :
+                position += 1
+            if position < len(buffer) or eof :
+                return
+            fill()
+
+    skip_whitespace()
+    if buffer[position:position + 1] != '[' :
+        raise json.JSONDecodeError('Ожидался JSON-массив', buffer, position)
+    position += 1
+
+    expect_value = True
+    while True :
+        skip_whitespace()
+        if position >= len(buffer) :
+            raise json.JSONDecodeError('Неожиданный конец файла', buffer, position)
+        char = buffer[position]
+
+        if char == ']' :
+            return
+        if not expect_value :
+            if char != ',' :
+                raise json.JSONDecodeError("Ожидалась ',' или ']'", buffer, position)
+            position += 1
+            expect_value = True
+            continue
+
+        while True :
+            try :
+                value, end = _decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError :
+                if eof :
+                    raise
+                fill()
+                continue
+            # Значение считается целым, только если за ним в буфере виден
+            # разделитель: иначе число вроде "3.25" могло быть обрезано
+            # до "3." - тогда дочитываем и разбираем заново
+            after = end
+            while after < len(buffer) and buffer[after] in _WHITESPACE :
+                after += 1
+            if not eof and (after == len(buffer) or buffer[after] not in ',]') :
+                fill()
+                continue
+            break
+        position = end
+        expect_value = False
+        yield value
+
+
+def iter_records(fp, fmt='auto'):
+    """
+    Записи файла 'fp' в формате 'json', 'jsonl' или 'auto'.
+    """
+    if fmt == 'auto' :
+        fmt = detect_format(fp)
+    if fmt == 'json' :
+        return iter_json_array(fp)
+    return iter_json_lines(fp)
+
+
+class ProductImporter:
+    """
+    Пакетная запись товаров.
+
+    Категории разрешаются через словарь название -> id, который
+    загружается один раз и дополняется новыми категориями по ходу импорта.
+    Товары пишутся одним INSERT ... ON CONFLICT (name) DO UPDATE на пакет.
+    В touched_categories копятся категории, товары которых менялись:
+    их сводки (store/facets.py) пересчитываются один раз после импорта.
+    """
+
+    update_fields = ['description', 'price', 'stock', 'category', 'updated_at']
+
+    def __init__(self):
+        self.category_ids = dict(Category.objects.values_list('name', 'id'))
+        self.touched_categories = set()
+
+    def _resolve_categories(self, names):
+        missing = [name for name in names if name not in self.category_ids]
+        if not missing :
+            return
+        # ON CONFLICT (name): категорию мог только что создать параллельный
+        # импорт - тогда DO UPDATE вернет id уже существующей строки
+        created = Category.objects.bulk_create(
+            (Category(name=name) for name in missing),
+            update_conflicts=True,
+            unique_fields=['name'],
+            update_fields=['name'],
+        )
+        if all(category.pk for category in created) :
+            self.category_ids.update((c.name, c.pk) for c in created)
+        else :
+            # Бэкенд не вернул id из bulk_create - дочитываем их
+            self.category_ids.update(
+                Category.objects.filter(name__in=missing).values_list('name', 'id')
+            )
+
+    @transaction.atomic
+    def write_batch(self, records):
+        """
+        Записывает пакет записей одной транзакцией.
+        Возвращает пару (создано, обновлено).
+        """
+        # Повтор названия внутри пакета: побеждает последняя запись
+        # (ON CONFLICT не может обновить одну строку дважды за запрос)
+        by_name = {}
+        for record in records :
+            by_name[record['name']] = record
+
+        self._resolve_categories(
+            {record.get('category') or DEFAULT_CATEGORY for record in by_name.values()}
+        )
+        # Прежние категории обновляемых товаров - их сводки тоже изменятся
+        old_categories = list(Product.objects.filter(name__in=by_name).values_list('category_id', flat=True))
+        existing = len(old_categories)
+
+        products = Product.objects.bulk_create(
+            [
+                Product(
+                    name=name,
+                    description=record.get('description', ''),
+                    price=record['price'],
+                    stock=record['stock'],
+                    category_id=self.category_ids[record.get('category') or DEFAULT_CATEGORY],
+                )
+                for name, record in by_name.items()
+            ],
+            update_conflicts=True,
+            unique_fields=['name'],
+            update_fields=self.update_fields,
+        )
+        # bulk_create не шлет post_save - сбрасываем кэш карточек сами,
+        # новой версией каталога вместо удаления ключа каждого товара
+        product_cache.invalidate_all()
+        # Цены могли измениться - пересчитываем итоги корзин с этими товарами
+        carts.recalculate(Cart.objects.filter(items__product__name__in=by_name))
+        self.touched_categories.update(old_categories)
+        self.touched_categories.update(product.category_id for product in products)
+        return len(by_name) - existing, existing
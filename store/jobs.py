@@ -0,0 +1,173 @@
+# store/jobs.py
+"""
+Очередь фоновых задач в таблице store_job - без внешнего брокера.
+
+Представление ставит задачу (enqueue) и сразу отвечает; письма,
+уведомления и прочая медленная работа выполняются воркерами команды
+run_workers и не удлиняют транзакцию оформления заказа.
+
+* enqueue() пишет задачу после коммита текущей транзакции
+  (transaction.on_commit): откаченный заказ писем не рассылает,
+  а воркер никогда не увидит задачу раньше данных, на которые она ссылается;
+* claim() забирает готовые задачи SELECT ... FOR UPDATE SKIP LOCKED -
+  воркеры не ждут друг друга и не берут одну задачу дважды;
+* run() выполняет задачу вне транзакции; после ошибки задача возвращается
+  в очередь с паузой JOB_RETRY_BACKOFF * 2^(попытка - 1), после
+  max_attempts попыток - остается со статусом failed;
+* requeue_stale() возвращает в очередь задачи, зависшие в running дольше
+  JOB_TIMEOUT (воркер упал) - поэтому обработчики должны выдерживать
+  повторный запуск;
+* purge() удаляет выполненные задачи старше JOB_RETENTION_DAYS дней -
+  иначе таблица очереди росла бы без предела.
+
+Обработчики регистрируются декоратором @handler('имя')
+(см. store/notifications.py), параметры задачи - JSON.
+"""
+
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger('store.jobs')
+
+HANDLERS = {}
+
+
+def handler(name):
+    """
+    Регистрирует функцию как обработчик задач 'name'.
+    """
+    def decorator(func):
+        HANDLERS[name] = func
+        return func
+    return decorator
+
+
+def enqueue(name, **payload):
+    """
+    Ставит задачу 'name' с параметрами 'payload' в очередь после
+    коммита текущей транзакции (вне транзакции - сразу).
+    """
+    transaction.on_commit(
+        lambda : Job.objects.create(name=name, payload=payload, max_attempts=settings.JOB_MAX_ATTEMPTS)
+    )
+
+
+def backoff(attempt):
+    """
+    Пауза перед повтором после неудачной попытки номер 'attempt'.
+    """
+    return timedelta(seconds=settings.JOB_RETRY_BACKOFF * 2 ** (attempt - 1))
+
+
+def claim(limit=1):
+    """
+    Забирает до 'limit' готовых задач и помечает их выполняемыми.
+    """
+    now = timezone.now()
+    with transaction.atomic() :
+        jobs = list(
+            Job.objects.select_for_update(skip_locked=True)
+            .filter(status=Job.QUEUED, run_at__lte=now)
+            .order_by('run_at')[:limit]
+        )
+        if jobs :
+            Job.objects.filter(pk__in=[job.pk for job in jobs]).update(
+                status=Job.RUNNING, attempts=F('attempts') + 1, started_at=now
+            )
+    for job in jobs :
+        job.status, job.attempts, job.started_at = Job.RUNNING, job.attempts + 1, now
+    return jobs
+
+
+def run(job):
+    """
+    Выполняет забранную задачу и записывает результат.
+    Возвращает True, если задача выполнена.
+    """
+    func = HANDLERS.get(job.name)
+    try :
+        if func is None :
+            raise LookupError(f"Нет обработчика задачи '{job.name}'.")
+        func(**job.payload)
+    except Exception as e :
+        now = timezone.now()
+        if func is None or job.attempts >= job.max_attempts :
+            changes = {'status' : Job.FAILED, 'finished_at' : now}
+            logger.exception('Задача %s не выполнена', job)
+        else :
+            changes = {'status' : Job.QUEUED, 'run_at' : now + backoff(job.attempts)}
+            logger.warning('Задача %s: ошибка, повтор в %s', job, changes['run_at'], exc_info=True)
+        Job.objects.filter(pk=job.pk).update(last_error=f'{type(e).__name__}: {e}', **changes)
+        return False
+    Job.objects.filter(pk=job.pk).update(status=Job.DONE, finished_at=timezone.now(), last_error='')
+    return True
+
+
+def requeue_stale():
+    """
+    Возвращает в очередь задачи, выполняемые дольше JOB_TIMEOUT.
+    Возвращает их число.
+    """
+    deadline = timezone.now() - timedelta(seconds=settings.JOB_TIMEOUT)
+    return Job.objects.filter(status=Job.RUNNING, started_at__lt=deadline).update(status=Job.QUEUED)
+
+
+def purge(batch_size=None):
+    """
+    Удаляет выполненные задачи, завершенные больше JOB_RETENTION_DAYS
+    дней назад, пакетами по JOB_PURGE_BATCH_SIZE - каждый пакет отдельным
+    коротким DELETE. Возвращает число удаленных задач.
+    """
+    if settings.JOB_RETENTION_DAYS is None :
+        return 0
+    cutoff = timezone.now() - timedelta(days=settings.JOB_RETENTION_DAYS)
+    old = Job.objects.filter(status=Job.DONE, finished_at__lt=cutoff).order_by('finished_at')
+    batch_size = batch_size or settings.JOB_PURGE_BATCH_SIZE
+    total = 0
+    while ids := list(old.values_list('pk', flat=True)[:batch_size]) :
+        total += Job.objects.filter(pk__in=ids).delete()[0]
+    return total
+
+
+def work_once(batch_size=None):
+    """
+    Забирает и выполняет одну пачку задач. Возвращает их число.
+    """
+    jobs = claim(batch_size or settings.JOB_BATCH_SIZE)
+    for job in jobs :
+        run(job)
+    return len(jobs)
+
+
+def work(stop, batch_size=None, poll_interval=None, once=False):
+    """
+    Цикл воркера: выполняет задачи, пока не установлен 'stop'
+    (threading.Event или multiprocessing.Event). Пустая очередь
+    опрашивается раз в poll_interval секунд; с once=True цикл
+    завершается, когда готовых задач не осталось.
+    Возвращает (выполнено, с ошибкой) - задачи этого воркера.
+    """
+    poll_interval = settings.JOB_POLL_INTERVAL if poll_interval is None else poll_interval
+    done = failed = 0
+    while not stop.is_set() :
+        batch = claim(batch_size or settings.JOB_BATCH_SIZE)
+        if not batch :
+            if once :
+                break
+            # Пока очередь пуста - сбрасываем оборванное или старое соединение
+            close_old_connections()
+            stop.wait(poll_interval)
+            continue
+        for job in batch :
+            if run(job) :
+                done += 1
+            else :
+                failed += 1
+    return done, failed
@@ -0,0 +1,271 @@
+# store/loadtest.py
+"""
+Нагрузочный прогон витрины для команды bench_storefront.
+
+Каждый имитируемый покупатель - отдельный поток со своим test Client
+(свои cookie и сессия), поэтому запросы проходят весь стек Django:
+URL-маршруты store.urls, middleware, шаблоны. Сетевой слой не участвует -
+замеряется именно приложение и БД.
+
+Сценарии (FLOWS):
+* browse - анонимный просмотр: каталог, следующая страница, карточка, поиск;
+* add_to_cart - вошедший покупатель кладет товар в корзину и открывает ее;
+* create_order - покупатель кладет товар в корзину и оформляет заказ.
+
+http_load - обстрел запущенного HTTP-сервера (runserver, uvicorn)
+по настоящей сети, для сравнения WSGI и ASGI (bench_asgi).
+wsgi_load - многопоточный прогон через WSGIHandler в этом же процессе
+(bench_db_connections).
+"""
+
+import asyncio
+import random
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from queue import Empty, Queue
+from wsgiref.util import setup_testing_defaults
+
+from django.core.handlers.wsgi import WSGIHandler
+from django.db import connection, connections
+from django.test import Client
+from django.urls import reverse
+
+from .benchmarks import summarize
+from .pagination import encode_cursor
+
+ORDER_FORM = {'full_name' : 'Иван Петров', 'address' : 'Москва, ул. Ленина, 1', 'phone' : '+70000000000'}
+
+
+class Shopper:
+    """
+    Один имитируемый клиент и журнал его запросов по шагам сценария.
+    """
+
+    def __init__(self, user=None):
+        self.client = Client()
+        self.user = user
+        self.queries = 0
+        # шаг -> список (время в мс, число SQL-запросов, успех)
+        self.log = defaultdict(list)
+
+    def count_query(self, execute, sql, params, many, context):
+        self.queries += 1
+        return execute(sql, params, many, context)
+
+    def request(self, step, method, path, data=None):
+        before = self.queries
+        started = time.perf_counter()
+        try :
+            response = getattr(self.client, method)(path, data or {})
+            ok = response.status_code < 400
+        except Exception :
+            response, ok = None, False
+        self.log[step].append(((time.perf_counter() - started) * 1000, self.queries - before, ok))
+        return response
+
+
+def browse(shopper, catalog, rng):
+    product = rng.choice(catalog)
+    shopper.request('catalog', 'get', reverse('store:product_list'))
+    shopper.request('catalog ?after=', 'get', reverse('store:product_list'), {'after' : encode_cursor([product['name']])})
+    shopper.request('product_detail', 'get', reverse('store:product_detail', args=[product['pk']]))
+    shopper.request('search', 'get', reverse('store:product_search'), {'q' : product['name'].split()[-1]})
+
+
+def add_to_cart(shopper, catalog, rng):
+    product = rng.choice(catalog)
+    shopper.request('add_to_cart', 'post', reverse('store:add_to_cart', args=[product['pk']]), {'quantity' : 1})
+    shopper.request('cart_detail', 'get', reverse('store:cart_detail'))
+
+
+def create_order(shopper, catalog, rng):
+    product = rng.choice(catalog)
+    shopper.request('add_to_cart', 'post', reverse('store:add_to_cart', args=[product['pk']]), {'quantity' : 1})
+    shopper.request('create_order', 'post', reverse('store:create_order'), ORDER_FORM)
+
+
+# Сценарий -> (функция, нужен ли вход)
+FLOWS = {
+    'browse' : (browse, False),
+    'add_to_cart' : (add_to_cart, True),
+    'create_order' : (create_order, True),
+}
+
+
+def run_flow(name, users, iterations, catalog, seed=0):
+    """
+    Запускает сценарий 'name' параллельно для всех 'users'
+    ('iterations' повторов на клиента) и возвращает сводку:
+    req/s, задержки и число SQL-запросов по шагам и в целом.
+    """
+    flow, needs_login = FLOWS[name]
+    start = threading.Barrier(len(users) + 1)
+
+    def worker(index, user):
+        shopper = Shopper(user if needs_login else None)
+        rng = random.Random(seed * 1000 + index)
+        try :
+            with connection.execute_wrapper(shopper.count_query) :
+                if shopper.user is not None :
+                    shopper.client.force_login(shopper.user)
+                start.wait()
+                for _ in range(iterations) :
+                    flow(shopper, catalog, rng)
+        except BaseException :
+            # Не оставляем остальные потоки ждать у барьера
+            start.abort()
+            raise
+        finally :
+            # Соединения потоков нужно закрыть до удаления временной БД
+            connections.close_all()
+        return shopper.log
+
+    with ThreadPoolExecutor(max_workers=len(users)) as pool :
+        futures = [pool.submit(worker, index, user) for index, user in enumerate(users)]
+        try :
+            start.wait()
+        except threading.BrokenBarrierError :
+            pass
+        started = time.perf_counter()
+        logs = [future.result() for future in futures]
+        elapsed = time.perf_counter() - started
+
+    steps = defaultdict(list)
+    for log in logs :
+        for step, records in log.items() :
+            steps[step].extend(records)
+    everything = [record for records in steps.values() for record in records]
+    result = _summary(everything, elapsed)
+    result['clients'] = len(users)
+    result['steps'] = {step : _summary(records, elapsed) for step, records in steps.items()}
+    return result
+
+
+def _summary(records, elapsed):
+    timings = [record[0] for record in records]
+    return {
+        'requests' : len(records),
+        'errors' : sum(1 for record in records if not record[2]),
+        'rps' : round(len(records) / elapsed, 1),
+        'latency_ms' : {key : round(value, 2) for key, value in summarize(timings).items()},
+        'queries_per_request' : round(sum(record[1] for record in records) / len(records), 2),
+    }
+
+
+def compare(baseline, results):
+    """
+    Строки сравнения двух прогонов: req/s, p95 и SQL-запросы по сценариям.
+    """
+    for name, flow in results['flows'].items() :
+        old = baseline.get('flows', {}).get(name)
+        if old is None :
+            continue
+        yield (
+            f'{name:<14} '
+            f'req/s {old["rps"]:>8} -> {flow["rps"]:<8} ({_change(old["rps"], flow["rps"])})  '
+            f'p95 {old["latency_ms"]["p95"]:>8} -> {flow["latency_ms"]["p95"]:<8} '
+            f'({_change(old["latency_ms"]["p95"], flow["latency_ms"]["p95"])})  '
+            f'SQL {old["queries_per_request"]} -> {flow["queries_per_request"]}'
+        )
+
+
+def _change(old, new):
+    if not old :
+        return 'n/a'
+    return f'{(new - old) / old * 100:+.1f}%'
+
+
+async def _http_get(host, port, path):
+    """
+    Один GET по отдельному TCP-соединению. Возвращает код ответа.
+    """
+    reader, writer = await asyncio.open_connection(host, port)
+    try :
+        writer.write(f'GET {path} HTTP/1.1\r\nHost: {host}\r\nConnection: close\r\n\r\n'.encode())
+        await writer.drain()
+        status_line = await reader.readline()
+        # Дочитываем ответ целиком - иначе замер не включит рендеринг тела
+        while await reader.read(65536) :
+            pass
+        return int(status_line.split()[1])
+    finally :
+        writer.close()
+
+
+async def http_load(host, port, paths, concurrency, total):
+    """
+    Обстрел живого сервера: 'concurrency' одновременных соединений,
+    всего 'total' запросов по списку 'paths' по кругу.
+    Возвращает сводку в том же виде, что и run_flow.
+    """
+    queue = asyncio.Queue()
+    for i in range(total) :
+        queue.put_nowait(paths[i % len(paths)])
+    records = []
+
+    async def client():
+        while not queue.empty() :
+            path = queue.get_nowait()
+            started = time.perf_counter()
+            try :
+                ok = await _http_get(host, port, path) < 400
+            except OSError :
+                ok = False
+            records.append(((time.perf_counter() - started) * 1000, 0, ok))
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    result = _summary(records, time.perf_counter() - started)
+    del result['queries_per_request']
+    return result
+
+
+def wsgi_load(paths, threads, total, cookie=''):
+    """
+    Прогон через WSGIHandler Django в 'threads' потоках - так запросы
+    обрабатывает многопоточный WSGI-сервер (gunicorn --threads).
+    В отличие от test Client здесь работают сигналы request_started /
+    request_finished, то есть и закрытие соединений по CONN_MAX_AGE.
+    """
+    handler = WSGIHandler()
+    queue = Queue()
+    for i in range(total) :
+        queue.put(paths[i % len(paths)])
+    records = []
+
+    def worker():
+        codes = []
+
+        def start_response(status, headers, exc_info=None):
+            codes.append(int(status.split()[0]))
+
+        try :
+            while True :
+                try :
+                    path = queue.get_nowait()
+                except Empty :
+                    return
+                path, _, query = path.partition('?')
+                environ = {'PATH_INFO' : path, 'QUERY_STRING' : query, 'HTTP_COOKIE' : cookie}
+                setup_testing_defaults(environ)
+                started = time.perf_counter()
+                response = handler(environ, start_response)
+                try :
+                    b''.join(response)
+                finally :
+                    response.close()
+                records.append(((time.perf_counter() - started) * 1000, 0, codes[-1] < 400))
+        finally :
+            connections.close_all()
+
+    pool = [threading.Thread(target=worker) for _ in range(threads)]
+    started = time.perf_counter()
+    for thread in pool :
+        thread.start()
+    for thread in pool :
+        thread.join()
+    result = _summary(records, time.perf_counter() - started)
+    del result['queries_per_request']
+    return result
@@ -0,0 +1,115 @@
+import argparse
+import csv
+import datetime
+import importlib.util
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from store import analytics
+from store.models import DailySales
+
+EXPORT_FIELDS = ['date', 'product_id', 'product__name', 'category__name', 'units', 'revenue']
+
+
+def _date(value):
+    day = parse_date(value)
+    if day is None :
+        raise argparse.ArgumentTypeError(f'Некорректная дата: "{value}"')
+    return day
+
+
+def _export(path, start, end):
+    """
+    Выгружает дневную сводку за период в CSV или Parquet (по расширению).
+    С pandas строки собираются в DataFrame колонками, без цикла по строкам;
+    без него CSV пишется модулем csv, а Parquet недоступен.
+    """
+    rows = (
+        DailySales.objects.filter(date__gte=start, date__lte=end)
+        .order_by('date', 'product_id')
+        .values_list(*EXPORT_FIELDS)
+    )
+    if importlib.util.find_spec('pandas') is not None :
+        import pandas
+
+        frame = pandas.DataFrame.from_records(rows.iterator(chunk_size=5000), columns=EXPORT_FIELDS)
+        frame['revenue'] = frame['revenue'].astype(float)
+        if path.endswith('.parquet') :
+            frame.to_parquet(path, index=False)
+        else :
+            frame.to_csv(path, index=False)
+        return len(frame)
+
+    if path.endswith('.parquet') :
+        raise CommandError('Для выгрузки в Parquet нужен pandas (и pyarrow): pip install pandas pyarrow')
+    count = 0
+    with open(path, 'w', encoding='utf-8', newline='') as f :
+        writer = csv.writer(f)
+        writer.writerow(EXPORT_FIELDS)
+        for row in rows.iterator(chunk_size=5000) :
+            writer.writerow(row)
+            count += 1
+    return count
+
+
+class Command(BaseCommand):
+    """
+    Отчет о продажах: выручка по дням, категориям и товарам, проданное
+    количество и оборачиваемость запаса (store/analytics.py).
+
+    Сначала пополняет дневную сводку (только новые дни), затем строит
+    отчет по ней. --rollup - только пополнить сводку, без отчета:
+    для запуска по расписанию (страница /analytics/ ее только читает).
+    --since / --rebuild пересчитывают сводку за прошлые дни, --export
+    выгружает ее строки за период в CSV или Parquet.
+    """
+    help = 'Отчет о продажах и оборачиваемости товаров за период'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', type=_date, default=None, help='Первый день периода (по умолчанию 30 дней назад)')
+        parser.add_argument('--end', type=_date, default=None, help='Последний день периода (по умолчанию сегодня)')
+        parser.add_argument('--limit', type=int, default=20, help='Сколько товаров показать')
+        parser.add_argument('--since', type=_date, default=None, help='Пересчитать сводку начиная с этого дня')
+        parser.add_argument('--rebuild', action='store_true', help='Пересчитать сводку за всю историю')
+        parser.add_argument('--rollup', action='store_true', help='Только пополнить сводку, без отчета')
+        parser.add_argument('--export', type=str, default=None, help='Выгрузить сводку за период в файл .csv или .parquet')
+
+    def handle(self, *args, **options):
+        end = options['end'] or timezone.localdate()
+        start = options['start'] or end - datetime.timedelta(days=29)
+        if start > end :
+            raise CommandError('Начало периода позже его конца.')
+
+        started = time.monotonic()
+        rows = analytics.rollup(since=options['since'], full=options['rebuild'])
+        self.stdout.write(f'Сводка обновлена: {rows} строк ({time.monotonic() - started:.2f} с).')
+        if options['rollup'] :
+            return
+
+        data = analytics.report(start, end, options['limit'])
+        totals = data['totals']
+        self.stdout.write(self.style.MIGRATE_HEADING(f'Продажи с {start} по {end}'))
+        self.stdout.write(f'Продано: {totals["units"] or 0} шт., выручка: {totals["revenue"] or 0}')
+
+        self.stdout.write(self.style.MIGRATE_HEADING('По дням'))
+        for row in data['days'] :
+            self.stdout.write(f'  {row["date"]}  {row["units"]:>8}  {row["revenue"]:>14}')
+
+        self.stdout.write(self.style.MIGRATE_HEADING('По категориям'))
+        for row in data['categories'] :
+            self.stdout.write(f'  {row["name"] or "-":<30}  {row["units"]:>8}  {row["revenue"]:>14}')
+
+        self.stdout.write(self.style.MIGRATE_HEADING(f'Товары (первые {options["limit"]} по выручке)'))
+        for row in data['products'] :
+            turnover = f'{row["turnover"]:.2f}' if row['turnover'] is not None else '-'
+            self.stdout.write(
+                f'  {row["name"]:<30}  {row["units"]:>8}  {row["revenue"]:>14}  '
+                f'остаток {row["stock"]:>6}  оборачиваемость {turnover}'
+            )
+
+        if options['export'] :
+            count = _export(options['export'], start, end)
+            self.stdout.write(self.style.SUCCESS(f'Выгружено строк: {count} -> {options["export"]}'))
@@ -0,0 +1,102 @@
+from django.contrib import admin
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.core.paginator import Paginator
+from django.db import connection
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+
+from store.admin import OrderAdmin, ProductAdmin
+from store.benchmarks import benchmark_database, seed_catalog, seed_users, measure, format_timings
+from store.models import Order, Product
+
+
+class _Untuned:
+    # Так списки админки работали до настройки: точный COUNT(*),
+    # второй COUNT(*) для "N из M", связанные объекты - запросом на строку
+    paginator = Paginator
+    show_full_result_count = True
+    list_select_related = False
+
+
+class UntunedOrderAdmin(_Untuned, OrderAdmin):
+    pass
+
+
+class UntunedProductAdmin(_Untuned, ProductAdmin):
+    list_filter = ('category', 'price')
+
+
+def _seed_orders(count, users):
+    """
+    Заказы генерируются одним INSERT ... SELECT из generate_series:
+    миллионы строк за секунды, без передачи их из Python.
+    """
+    user_ids = [user.pk for user in users]
+    with connection.cursor() as cursor :
+        cursor.execute(
+            f'''
+            INSERT INTO {Order._meta.db_table} (user_id, full_name, address, phone, status, created_at)
+            SELECT (%s::bigint[])[1 + i %% %s], 'Покупатель ' || i, 'Адрес ' || i, '+7' || i,
+                   (ARRAY['pending', 'shipped', 'delivered', 'cancelled'])[1 + i %% 4],
+                   now() - make_interval(secs => i)
+            FROM generate_series(1, %s) AS i
+            ''',
+            [user_ids, len(user_ids), count],
+        )
+        # Статистика для планировщика и pg_class.reltuples
+        cursor.execute(f'ANALYZE {Order._meta.db_table}')
+        cursor.execute(f'ANALYZE {Product._meta.db_table}')
+
+
+class Command(BaseCommand):
+    """
+    Бенчмарк списков админки (заказы и товары) до и после настройки:
+    list_select_related, оценка числа записей вместо COUNT(*) и фильтр
+    по диапазонам цены. Для каждого сценария - время ответа и число
+    SQL-запросов. Данные генерируются во временной БД.
+    """
+    help = 'Замеряет время списков заказов и товаров в админке до и после настройки'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', type=int, default=1_000_000, help='Число заказов (например, 10000000)')
+        parser.add_argument('--products', type=int, default=200_000, help='Размер каталога')
+        parser.add_argument('--users', type=int, default=1000, help='Число покупателей')
+        parser.add_argument('--repeat', type=int, default=10, help='Число замеров на сценарий')
+
+    def _changelist(self, model_admin, user, data=None):
+        request = RequestFactory().get('/admin/', data or {})
+        request.user = user
+
+        def call():
+            model_admin.changelist_view(request).render()
+        return call
+
+    def handle(self, *args, **options):
+        with benchmark_database() :
+            self.stdout.write(
+                f'Генерация: {options["orders"]} заказов, {options["products"]} товаров, '
+                f'{options["users"]} покупателей...'
+            )
+            seed_catalog(options['products'])
+            users = seed_users(options['users'])
+            _seed_orders(options['orders'], users)
+            staff = get_user_model().objects.create_superuser('bench_admin', password=None)
+
+            scenarios = [
+                ('заказы', Order, UntunedOrderAdmin, OrderAdmin, None),
+                ('заказы, статус', Order, UntunedOrderAdmin, OrderAdmin, {'status__exact' : 'pending'}),
+                ('товары', Product, UntunedProductAdmin, ProductAdmin, None),
+            ]
+            results = []
+            for label, model, before, after, data in scenarios :
+                for version, admin_class in (('до', before), ('после', after)) :
+                    call = self._changelist(admin_class(model, admin.site), staff, data)
+                    with CaptureQueriesContext(connection) as queries :
+                        call()
+                    stats = measure(call, options['repeat'], warmup=1)
+                    results.append((f'{label}: {version}', stats, len(queries.captured_queries)))
+
+        for label, stats, queries in results :
+            self.stdout.write(f'{format_timings(label, stats)}  SQL {queries:4d}')
+        self.stdout.write(self.style.SUCCESS('Бенчмарк админки завершен.'))
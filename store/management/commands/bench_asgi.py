@@ -0,0 +1,115 @@
+import asyncio
+import importlib.util
+import os
+import socket
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.urls import reverse
+
+from store.benchmarks import benchmark_database, seed_catalog
+from store.loadtest import http_load
+from store.models import Product
+
+HOST = '127.0.0.1'
+
+# Сервер -> команда запуска (порт подставляется)
+SERVERS = {
+    # WSGI через runserver (по потоку на соединение)
+    'wsgi' : lambda port : [sys.executable, 'manage.py', 'runserver', f'{HOST}:{port}', '--noreload'],
+    # ASGI: async-представления выполняются в цикле событий uvicorn
+    'asgi' : lambda port : [
+        sys.executable, '-m', 'uvicorn', 'online_store_project.asgi:application',
+        '--host', HOST, '--port', str(port), '--log-level', 'warning',
+    ],
+}
+
+
+def _wait_for_port(port, process, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline :
+        if process.poll() is not None :
+            return False
+        try :
+            with socket.create_connection((HOST, port), timeout=0.5) :
+                return True
+        except OSError :
+            time.sleep(0.2)
+    return False
+
+
+class Command(BaseCommand):
+    """
+    Сравнивает пропускную способность каталога и корзины под WSGI
+    (runserver) и ASGI (uvicorn) при разном числе одновременных соединений.
+
+    Сервера запускаются отдельными процессами на временной БД с каталогом,
+    нагрузка подается по настоящей сети (store.loadtest.http_load).
+    Для ASGI нужен установленный uvicorn.
+    """
+    help = 'Сравнивает WSGI (runserver) и ASGI (uvicorn) под параллельной нагрузкой'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=10_000, help='Размер каталога')
+        parser.add_argument('--concurrency', type=int, nargs='+', default=[10, 50, 100], help='Числа одновременных соединений')
+        parser.add_argument('--requests', type=int, default=1000, help='Запросов на каждый уровень нагрузки')
+        parser.add_argument('--servers', nargs='+', choices=list(SERVERS), default=list(SERVERS))
+        parser.add_argument('--port', type=int, default=8765, help='Порт для серверов')
+
+    def handle(self, *args, **options):
+        servers = options['servers']
+        if 'asgi' in servers and importlib.util.find_spec('uvicorn') is None :
+            raise CommandError('Для ASGI нужен uvicorn: pip install uvicorn (или запустите с --servers wsgi).')
+
+        results = []
+        with benchmark_database() :
+            self.stdout.write(f'Генерация каталога: {options["products"]} товаров...')
+            seed_catalog(options['products'])
+            pks = list(Product.objects.order_by('?').values_list('pk', flat=True)[:50])
+            paths = [reverse('store:product_list'), reverse('store:cart_detail')]
+            paths += [reverse('store:product_detail', args=[pk]) for pk in pks]
+
+            # Серверы - отдельные процессы: направляем их во временную БД
+            env = dict(
+                os.environ,
+                POSTGRES_DB=connection.settings_dict['NAME'],
+                PROFILING_SAMPLE_RATE='0',
+            )
+            connection.close()
+            for server in servers :
+                process = subprocess.Popen(
+                    SERVERS[server](options['port']), env=env, cwd=settings.BASE_DIR,
+                    stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                )
+                try :
+                    if not _wait_for_port(options['port'], process) :
+                        raise CommandError(f'Сервер {server} не запустился: {process.stderr.read().decode()[-2000:]}')
+                    # Прогрев: соединения с БД, кэш карточек
+                    asyncio.run(http_load(HOST, options['port'], paths, 10, len(paths) * 2))
+                    for concurrency in options['concurrency'] :
+                        stats = asyncio.run(
+                            http_load(HOST, options['port'], paths, concurrency, options['requests'])
+                        )
+                        results.append((server, concurrency, stats))
+                        self._report(server, concurrency, stats)
+                finally :
+                    process.terminate()
+                    process.wait(timeout=30)
+            # Серверные соединения с временной БД должны успеть закрыться
+            time.sleep(1)
+
+        self.stdout.write(self.style.SUCCESS('Сравнение WSGI и ASGI завершено.'))
+
+    def _report(self, server, concurrency, stats):
+        latency = stats['latency_ms']
+        line = (
+            f'{server:<5} соединений {concurrency:>4}  {stats["rps"]:>8} req/s  '
+            f'p50 {latency["p50"]:>8} мс  p95 {latency["p95"]:>8} мс  p99 {latency["p99"]:>8} мс'
+        )
+        if stats['errors'] :
+            line += self.style.ERROR(f'  ошибок: {stats["errors"]}')
+        self.stdout.write(line)
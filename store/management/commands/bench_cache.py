@@ -0,0 +1,102 @@
+import random
+from importlib import import_module
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+
+from store import product_cache
+from store.benchmarks import benchmark_database, seed_catalog, measure, format_timings
+from store.models import Product
+
+
+def _local(max_entries):
+    return {
+        'BACKEND' : 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION' : 'bench',
+        'OPTIONS' : {'MAX_ENTRIES' : max_entries},
+    }
+
+
+def _redis(url):
+    if url.startswith('fakeredis://') :
+        import fakeredis
+
+        return {
+            'BACKEND' : 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION' : url.replace('fakeredis://', 'redis://', 1),
+            'OPTIONS' : {'connection_class' : fakeredis.FakeConnection},
+        }
+    return {'BACKEND' : 'django.core.cache.backends.redis.RedisCache', 'LOCATION' : url}
+
+
+def _tiered(l1_entries):
+    return {
+        'BACKEND' : 'store.caching.TieredCache',
+        'LOCATION' : 'shared',
+        'OPTIONS' : {'MAX_ENTRIES' : l1_entries, 'L1_TIMEOUT' : settings.CACHE_L1_TIMEOUT},
+    }
+
+
+class Command(BaseCommand):
+    """
+    Бенчмарк кэша: задержка чтения сессии и карточки товара (product_cache)
+    для каждой конфигурации CACHES - локальный кэш процесса, общий Redis,
+    Redis с L1 в памяти процесса (store/caching.py). Сессии без общего
+    кэша читаются из БД, с ним - из кэша (cached_db).
+
+    По умолчанию Redis - fakeredis в памяти процесса: сетевой задержки
+    у него нет, и выигрыш L1 занижен. --url redis://... - замер
+    на настоящем сервере. Данные генерируются во временной БД.
+    """
+    help = 'Замеряет задержку сессий и карточек товаров для конфигураций кэша'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='fakeredis://localhost:6379/14', help='Адрес Redis (redis://... или fakeredis://...)')
+        parser.add_argument('--products', type=int, default=10_000, help='Размер каталога')
+        parser.add_argument('--hot', type=int, default=500, help='Сколько разных товаров читается')
+        parser.add_argument('--repeat', type=int, default=2000, help='Число замеров на сценарий')
+
+    def _configurations(self, url, hot):
+        shared = _redis(url)
+        # Все читаемые карточки помещаются в кэш - замеряются только попадания
+        local = _local(hot * 2)
+        return [
+            ('локальный', {'shared' : local, 'default' : local}, 'django.contrib.sessions.backends.db'),
+            ('Redis', {'shared' : shared, 'default' : shared}, 'django.contrib.sessions.backends.cached_db'),
+            ('Redis + L1', {'shared' : shared, 'default' : _tiered(max(hot * 2, settings.CACHE_L1_MAX_ENTRIES))},
+             'django.contrib.sessions.backends.cached_db'),
+        ]
+
+    def handle(self, *args, **options):
+        results = []
+        with benchmark_database() :
+            self.stdout.write(f'Генерация каталога: {options["products"]} товаров...')
+            seed_catalog(options['products'])
+            hot = list(Product.objects.order_by('?').values_list('pk', flat=True)[:options['hot']])
+
+            for label, cache_settings, session_engine in self._configurations(options['url'], len(hot)) :
+                # Остаток не перечитывается на каждое попадание - замеряется только кэш
+                with override_settings(CACHES=cache_settings, SESSION_ENGINE=session_engine, PRODUCT_STOCK_MAX_AGE=3600) :
+                    caches['default'].clear()
+                    session_store = import_module(settings.SESSION_ENGINE).SessionStore
+                    session = session_store()
+                    session['_auth_user_id'] = '1'
+                    session.save()
+
+                    def load_session():
+                        session_store(session_key=session.session_key).load()
+
+                    def get_product():
+                        product_cache.get_product(random.choice(hot))
+
+                    for pk in hot :
+                        product_cache.get_product(pk)
+                    results.append((f'{label}: сессия', measure(load_session, options['repeat'], warmup=10)))
+                    results.append((f'{label}: карточка товара', measure(get_product, options['repeat'], warmup=10)))
+                    caches['default'].clear()
+
+        for label, stats in results :
+            self.stdout.write(format_timings(label, stats))
+        self.stdout.write(self.style.SUCCESS('Бенчмарк кэша завершен.'))
@@ -0,0 +1,64 @@
+from asgiref.sync import async_to_sync
+from django.core.management.base import BaseCommand
+from django.core.paginator import Paginator
+
+from store import views
+from store.benchmarks import (
+    benchmark_database, seed_catalog, make_request, measure, format_timings,
+)
+from store.models import Product
+from store.pagination import encode_cursor
+
+
+class Command(BaseCommand):
+    """
+    Бенчмарк каталога: сравнивает время ответа product_list
+    на первой и на глубокой странице курсорной пагинации.
+    Для сравнения замеряется и классическая OFFSET-пагинация.
+    Данные генерируются во временной БД, рабочая база не затрагивается.
+    """
+    help = 'Замеряет время ответа каталога на первой и глубокой странице'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=200_000, help='Размер каталога')
+        parser.add_argument('--page', type=int, default=1000, help='Номер "глубокой" страницы')
+        parser.add_argument('--page-size', type=int, default=20)
+        parser.add_argument('--repeat', type=int, default=50, help='Число замеров на сценарий')
+
+    def handle(self, *args, **options):
+        page_size = options['page_size']
+        deep_page = options['page']
+        if (deep_page - 1) * page_size >= options['products'] :
+            self.stderr.write(self.style.ERROR('Глубокая страница выходит за пределы каталога.'))
+            return
+
+        with benchmark_database() :
+            self.stdout.write(f'Генерация каталога: {options["products"]} товаров...')
+            seed_catalog(options['products'])
+
+            # Курсор глубокой страницы - ключ последней записи предыдущей страницы
+            boundary = (
+                Product.objects.order_by('name')
+                .values_list('name')[(deep_page - 1) * page_size - 1]
+            )
+            deep_cursor = encode_cursor(boundary)
+
+            first = make_request('/products/', {'page_size' : page_size})
+            deep = make_request('/products/', {'page_size' : page_size, 'after' : deep_cursor})
+
+            def offset_page():
+                # Так выглядела бы глубокая страница с OFFSET-пагинацией
+                paginator = Paginator(Product.objects.only('id', 'name', 'price'), page_size)
+                list(paginator.page(deep_page).object_list)
+
+            # product_list асинхронное - вызываем его так же, как это делает Django
+            product_list = async_to_sync(views.product_list)
+            results = [
+                ('keyset: страница 1', measure(lambda : product_list(first), options['repeat'])),
+                (f'keyset: страница {deep_page}', measure(lambda : product_list(deep), options['repeat'])),
+                (f'offset: страница {deep_page} (только запрос)', measure(offset_page, options['repeat'])),
+            ]
+
+        for label, stats in results :
+            self.stdout.write(format_timings(label, stats))
+        self.stdout.write(self.style.SUCCESS('Бенчмарк каталога завершен.'))
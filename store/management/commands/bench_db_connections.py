@@ -0,0 +1,85 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from store.benchmarks import benchmark_database, seed_catalog, seed_users
+from store.loadtest import wsgi_load
+
+# Режим -> (CONN_MAX_AGE, использовать ли пул)
+MODES = {
+    'no_reuse' : (0, False),
+    'persistent' : (60, False),
+    'pool' : (0, True),
+}
+
+
+def _pool_supported():
+    return connection.vendor == 'postgresql' and connection.Database.__name__ == 'psycopg'
+
+
+class Command(BaseCommand):
+    """
+    Бенчмарк соединений с БД: req/s дешевых страниц (order_success,
+    каталог) при новом соединении на каждый запрос, при постоянных
+    соединениях (CONN_MAX_AGE) и с пулом psycopg 3 (OPTIONS['pool']).
+
+    Запросы идут через WSGIHandler в нескольких потоках, как
+    в многопоточном WSGI-сервере. Данные - во временной БД.
+    """
+    help = 'Сравнивает req/s без переиспользования соединений, с CONN_MAX_AGE и с пулом'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=1000, help='Размер каталога')
+        parser.add_argument('--threads', type=int, nargs='+', default=[1, 8, 32], help='Числа потоков')
+        parser.add_argument('--requests', type=int, default=2000, help='Запросов на каждый прогон')
+        parser.add_argument('--modes', nargs='+', choices=list(MODES), default=list(MODES))
+        parser.add_argument('--pool-size', type=int, default=10, help='max_size пула')
+
+    def handle(self, *args, **options):
+        modes = options['modes']
+        if 'pool' in modes and not _pool_supported() :
+            self.stderr.write(self.style.WARNING('Пул пропущен: нужен psycopg 3 с psycopg-pool.'))
+            modes = [mode for mode in modes if mode != 'pool']
+
+        database = connection.settings_dict
+        saved = database['CONN_MAX_AGE'], database.get('OPTIONS', {}).copy()
+        with benchmark_database(), override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver', '127.0.0.1']) :
+            self.stdout.write(f'Генерация каталога: {options["products"]} товаров...')
+            seed_catalog(options['products'])
+            # Вошедший покупатель: на каждый запрос - чтение сессии и пользователя
+            client = Client()
+            client.force_login(seed_users(1)[0])
+            cookie = f'{settings.SESSION_COOKIE_NAME}={client.cookies[settings.SESSION_COOKIE_NAME].value}'
+            paths = [reverse('store:order_success'), reverse('store:product_list')]
+            connection.close()
+
+            try :
+                for mode in modes :
+                    max_age, pooled = MODES[mode]
+                    # Потоки создают соединения по этому же словарю настроек
+                    database['CONN_MAX_AGE'] = max_age
+                    database['OPTIONS'] = dict(saved[1])
+                    if pooled :
+                        database['OPTIONS']['pool'] = {'min_size' : 1, 'max_size' : options['pool_size']}
+                    for threads in options['threads'] :
+                        stats = wsgi_load(paths, threads, options['requests'], cookie)
+                        self._report(mode, threads, stats)
+                    if pooled :
+                        connection.close_pool()
+            finally :
+                database['CONN_MAX_AGE'], database['OPTIONS'] = saved
+
+        self.stdout.write(self.style.SUCCESS('Бенчмарк соединений завершен.'))
+
+    def _report(self, mode, threads, stats):
+        latency = stats['latency_ms']
+        line = (
+            f'{mode:<11} потоков {threads:>3}  {stats["rps"]:>8} req/s  '
+            f'p50 {latency["p50"]:>7} мс  p95 {latency["p95"]:>7} мс  p99 {latency["p99"]:>7} мс'
+        )
+        if stats['errors'] :
+            line += self.style.ERROR(f'  ошибок: {stats["errors"]}')
+        self.stdout.write(line)
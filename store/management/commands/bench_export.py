@@ -0,0 +1,64 @@
+import os
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand, CommandError
+
+from store.benchmarks import benchmark_database, seed_catalog
+from store.exporting import residue_rows, export_rows, FORMATS
+from store.models import Category, Product
+
+
+class Command(BaseCommand):
+    """
+    Бенчмарк выгрузки остатков: для каталогов разного размера замеряет
+    пиковое потребление памяти (tracemalloc) и скорость export_rows.
+    Если пик превышает --max-peak-mb, команда завершается с ошибкой.
+    Данные генерируются во временной БД, рабочая база не затрагивается.
+    """
+    help = 'Проверяет, что память выгрузки остатков не растет с размером каталога'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000], help='Размеры каталога')
+        parser.add_argument('--format', choices=FORMATS, default='jsonl')
+        parser.add_argument('--chunk-size', type=int, default=2000)
+        parser.add_argument('--max-peak-mb', type=float, default=16.0, help='Допустимый пик памяти, МБ')
+
+    def handle(self, *args, **options):
+        results = []
+        with benchmark_database() :
+            for size in sorted(options['sizes']) :
+                Product.objects.all().delete()
+                Category.objects.all().delete()
+                seed_catalog(size)
+
+                with open(os.devnull, 'w', encoding='utf-8') as devnull :
+                    def run():
+                        export_rows(residue_rows(), options['format'], devnull.write, options['chunk_size'])
+
+                    # Скорость и память меряем раздельно:
+                    # tracemalloc заметно замедляет интерпретатор
+                    started = time.perf_counter()
+                    run()
+                    elapsed = time.perf_counter() - started
+
+                    tracemalloc.start()
+                    run()
+                    _, peak = tracemalloc.get_traced_memory()
+                    tracemalloc.stop()
+
+                peak_mb = peak / 1024 / 1024
+                results.append((size, peak_mb))
+                self.stdout.write(
+                    f'{size:>10} товаров: пик памяти {peak_mb:6.2f} МБ, '
+                    f'{elapsed:6.2f} с ({size / elapsed:,.0f} строк/с)'
+                )
+
+        worst = max(peak for _, peak in results)
+        if worst > options['max_peak_mb'] :
+            raise CommandError(
+                f'Пик памяти {worst:.2f} МБ превышает допустимые {options["max_peak_mb"]} МБ.'
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f'Пик памяти не превышает {options["max_peak_mb"]} МБ.'
+        ))
@@ -0,0 +1,67 @@
+import random
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Q
+
+from store.benchmarks import benchmark_database, seed_catalog, measure, format_timings
+from store.models import Product
+from store.search import search_products
+
+WORDS = (
+    'чайник', 'кружка', 'сковорода', 'футболка', 'куртка', 'ботинки', 'лампа',
+    'стол', 'стул', 'рюкзак', 'зонт', 'часы', 'наушники', 'зарядка', 'кабель',
+    'коврик', 'подушка', 'одеяло', 'полотенце', 'шарф', 'перчатки', 'кепка',
+    'красный', 'синий', 'зеленый', 'черный', 'белый', 'большой', 'маленький',
+    'легкий', 'прочный', 'мягкий', 'стальной', 'деревянный', 'хлопковый',
+)
+
+
+class Command(BaseCommand):
+    """
+    Бенчмарк поиска: сравнивает полнотекстовый поиск по search_vector
+    (GIN-индекс) с прежним ILIKE '%...%' по name и description.
+    Данные генерируются во временной БД, рабочая база не затрагивается.
+    """
+    help = 'Сравнивает полнотекстовый поиск с ILIKE на сгенерированном каталоге'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=200_000, help='Размер каталога')
+        parser.add_argument('--repeat', type=int, default=20, help='Число замеров на сценарий')
+        parser.add_argument('--limit', type=int, default=20, help='Сколько результатов выбирать')
+
+    def handle(self, *args, **options):
+        rng = random.Random(42)
+
+        def describe(i):
+            words = rng.sample(WORDS, 8)
+            # Редкое слово - примерно в одном товаре из тысячи
+            if i % 1000 == 0 :
+                words.append('эксклюзивный')
+            return ' '.join(words)
+
+        limit = options['limit']
+        with benchmark_database() :
+            self.stdout.write(f'Генерация каталога: {options["products"]} товаров...')
+            seed_catalog(options['products'], describe=describe)
+            with connection.cursor() as cursor :
+                cursor.execute('ANALYZE store_product')
+
+            results = []
+            for term in ('чайник', 'эксклюзивный', 'несуществующий') :
+                def ilike():
+                    list(
+                        Product.objects
+                        .filter(Q(name__icontains=term) | Q(description__icontains=term))
+                        .only('id', 'name', 'price')[:limit]
+                    )
+
+                def fulltext():
+                    list(search_products(term).only('id', 'name', 'price')[:limit])
+
+                results.append((f'ILIKE "{term}"', measure(ilike, options['repeat'])))
+                results.append((f'tsvector "{term}"', measure(fulltext, options['repeat'])))
+
+        for label, stats in results :
+            self.stdout.write(format_timings(label, stats))
+        self.stdout.write(self.style.SUCCESS('Бенчмарк поиска завершен.'))
@@ -0,0 +1,142 @@
+import asyncio
+import importlib.util
+import os
+import socket
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.urls import reverse
+
+from store.benchmarks import benchmark_database, seed_catalog
+from store.loadtest import http_load
+
+HOST = '127.0.0.1'
+
+
+def _children(pid):
+    """
+    PID дочерних процессов (воркеров gunicorn).
+    """
+    children = []
+    for entry in os.listdir('/proc') :
+        if not entry.isdigit() :
+            continue
+        try :
+            with open(f'/proc/{entry}/stat') as fp :
+                # Поле 4 - PPID; имя процесса (поле 2) может содержать пробелы
+                ppid = int(fp.read().rsplit(')', 1)[1].split()[1])
+        except (OSError, IndexError, ValueError) :
+            continue
+        if ppid == pid :
+            children.append(int(entry))
+    return children
+
+
+def _memory(pid):
+    """
+    Память процесса в МБ: RSS, PSS (доля с учетом общих страниц)
+    и общая с другими процессами часть.
+    """
+    values = {}
+    with open(f'/proc/{pid}/smaps_rollup') as fp :
+        for line in fp :
+            key, _, rest = line.partition(':')
+            if rest.strip().endswith('kB') :
+                values[key] = int(rest.split()[0]) / 1024
+    return {
+        'rss' : values.get('Rss', 0),
+        'pss' : values.get('Pss', 0),
+        'shared' : values.get('Shared_Clean', 0) + values.get('Shared_Dirty', 0),
+    }
+
+
+def _get_status(port, path):
+    try :
+        with socket.create_connection((HOST, port), timeout=1) as sock :
+            sock.sendall(f'GET {path} HTTP/1.1\r\nHost: {HOST}\r\nConnection: close\r\n\r\n'.encode())
+            return int(sock.recv(64).split()[1])
+    except (OSError, IndexError, ValueError) :
+        return None
+
+
+class Command(BaseCommand):
+    """
+    Время старта и память воркеров gunicorn (gunicorn.conf.py)
+    с предзагрузкой приложения (preload_app) и без нее.
+
+    Старт - время от запуска до первого успешного ответа каталога.
+    Память - RSS и PSS мастера и каждого воркера после прогрева;
+    PSS учитывает общие (copy-on-write) страницы, поэтому их сумма -
+    реальный расход памяти всего сервера. Только для Linux (/proc).
+    """
+    help = 'Замеряет время старта и память воркеров gunicorn с preload_app и без'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4)
+        parser.add_argument('--port', type=int, default=8766)
+        parser.add_argument('--warmup', type=int, default=200, help='Запросов на прогрев перед замером памяти')
+
+    def handle(self, *args, **options):
+        if importlib.util.find_spec('gunicorn') is None :
+            raise CommandError('Нужен gunicorn (см. requirements.txt).')
+        if not os.path.exists('/proc/self/smaps_rollup') :
+            raise CommandError('Замер памяти поддерживается только в Linux.')
+
+        with benchmark_database() :
+            seed_catalog(1000)
+            env = dict(
+                os.environ,
+                POSTGRES_DB=connection.settings_dict['NAME'],
+                PROFILING_SAMPLE_RATE='0',
+                GUNICORN_BIND=f'{HOST}:{options["port"]}',
+                GUNICORN_WORKERS=str(options['workers']),
+                GUNICORN_ACCESSLOG='/dev/null',
+                GUNICORN_LOGLEVEL='warning',
+                DJANGO_ALLOWED_HOSTS=','.join([*settings.ALLOWED_HOSTS, HOST]),
+            )
+            connection.close()
+            path = reverse('store:product_list')
+            for preload in ('1', '0') :
+                self._measure(dict(env, GUNICORN_PRELOAD=preload), path, options)
+            # Серверные соединения с временной БД должны успеть закрыться
+            time.sleep(1)
+
+        self.stdout.write(self.style.SUCCESS('Замер сервера завершен.'))
+
+    def _measure(self, env, path, options):
+        started = time.perf_counter()
+        process = subprocess.Popen(
+            [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'online_store_project.asgi:application'],
+            env=env, cwd=settings.BASE_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+        )
+        try :
+            while _get_status(options['port'], path) != 200 :
+                if process.poll() is not None :
+                    raise CommandError(f'gunicorn не запустился: {process.stderr.read().decode()[-2000:]}')
+                if time.perf_counter() - started > 60 :
+                    raise CommandError('gunicorn не ответил за 60 секунд.')
+                time.sleep(0.05)
+            startup = time.perf_counter() - started
+
+            asyncio.run(http_load(HOST, options['port'], [path], options['workers'] * 2, options['warmup']))
+            master = _memory(process.pid)
+            workers = [_memory(pid) for pid in _children(process.pid)]
+        finally :
+            process.terminate()
+            process.wait(timeout=60)
+
+        label = 'preload_app' if env['GUNICORN_PRELOAD'] == '1' else 'без preload'
+        average = {key : sum(w[key] for w in workers) / len(workers) for key in ('rss', 'pss', 'shared')}
+        total_pss = master['pss'] + sum(w['pss'] for w in workers)
+        self.stdout.write(self.style.MIGRATE_HEADING(f'{label}: {len(workers)} воркеров'))
+        self.stdout.write(f'  старт до первого ответа   {startup:8.2f} с')
+        self.stdout.write(f'  мастер                    RSS {master["rss"]:7.1f} МБ  PSS {master["pss"]:7.1f} МБ')
+        self.stdout.write(
+            f'  воркер (среднее)          RSS {average["rss"]:7.1f} МБ  PSS {average["pss"]:7.1f} МБ  '
+            f'общая {average["shared"]:7.1f} МБ'
+        )
+        self.stdout.write(f'  всего (сумма PSS)         {total_pss:7.1f} МБ')
@@ -0,0 +1,102 @@
+import json
+import platform
+import subprocess
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from store.benchmarks import benchmark_database, seed_catalog, seed_users
+from store.loadtest import FLOWS, compare, run_flow
+from store.models import Product
+
+
+def _git_revision():
+    try :
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            capture_output=True, text=True, check=True, cwd=settings.BASE_DIR,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError) :
+        return None
+
+
+class Command(BaseCommand):
+    """
+    Нагрузочный бенчмарк витрины: много параллельных покупателей проходят
+    сценарии просмотр -> корзина -> заказ через настоящие URL магазина
+    (см. store/loadtest.py). Для каждого сценария выводятся req/s,
+    задержки p50/p95/p99 и число SQL-запросов на HTTP-запрос.
+
+    Результат можно сохранить в JSON (--output) и сравнить
+    с прогоном на другом коммите (--compare).
+    Данные генерируются во временной БД, рабочая база не затрагивается.
+    """
+    help = 'Нагрузочный прогон сценариев витрины с параллельными клиентами'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=10_000, help='Размер каталога')
+        parser.add_argument('--clients', type=int, default=10, help='Число параллельных клиентов')
+        parser.add_argument('--iterations', type=int, default=20, help='Повторов сценария на клиента')
+        parser.add_argument('--flows', nargs='+', choices=list(FLOWS), default=list(FLOWS), help='Какие сценарии запускать')
+        parser.add_argument('--seed', type=int, default=0, help='Зерно генератора (для воспроизводимости)')
+        parser.add_argument('--output', help='Сохранить результаты в JSON-файл')
+        parser.add_argument('--compare', help='Сравнить с ранее сохраненными результатами')
+
+    def handle(self, *args, **options):
+        results = {
+            'meta' : {
+                'revision' : _git_revision(),
+                'started_at' : timezone.now().isoformat(),
+                'database' : connection.vendor,
+                'python' : platform.python_version(),
+                'options' : {key : options[key] for key in ('products', 'clients', 'iterations', 'seed')},
+            },
+            'flows' : {},
+        }
+
+        # test Client обращается к хосту 'testserver'
+        with benchmark_database(), override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']) :
+            self.stdout.write(
+                f'Генерация данных: {options["products"]} товаров, {options["clients"]} покупателей...'
+            )
+            seed_catalog(options['products'], stock=10 ** 6)
+            users = seed_users(options['clients'])
+            catalog = [
+                {'pk' : pk, 'name' : name}
+                for pk, name in Product.objects.values_list('pk', 'name').iterator()
+            ]
+
+            for name in options['flows'] :
+                self.stdout.write(f'Сценарий {name}...')
+                flow = run_flow(name, users, options['iterations'], catalog, seed=options['seed'])
+                results['flows'][name] = flow
+                self._report(name, flow)
+
+        if options['output'] :
+            with open(options['output'], 'w', encoding='utf-8') as fp :
+                json.dump(results, fp, ensure_ascii=False, indent=2)
+            self.stdout.write(f'Результаты сохранены в {options["output"]}')
+
+        if options['compare'] :
+            with open(options['compare'], encoding='utf-8') as fp :
+                baseline = json.load(fp)
+            self.stdout.write(f'Сравнение с {baseline["meta"].get("revision") or options["compare"]}:')
+            for line in compare(baseline, results) :
+                self.stdout.write(line)
+
+        self.stdout.write(self.style.SUCCESS('Нагрузочный бенчмарк завершен.'))
+
+    def _report(self, name, flow):
+        for label, row in [(name, flow)] + [(f'  {step}', row) for step, row in flow['steps'].items()] :
+            latency = row['latency_ms']
+            line = (
+                f'{label:<24} {row["requests"]:>6} запр.  {row["rps"]:>8} req/s  '
+                f'p50 {latency["p50"]:>8} мс  p95 {latency["p95"]:>8} мс  p99 {latency["p99"]:>8} мс  '
+                f'SQL/запр. {row["queries_per_request"]:>5}'
+            )
+            if row['errors'] :
+                line += self.style.ERROR(f'  ошибок: {row["errors"]}')
+            self.stdout.write(line)
@@ -0,0 +1,90 @@
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.utils import timezone
+
+from store import product_cache, thumbnails
+from store.models import Product
+
+
+def _build_all(jobs, workers):
+    """
+    Выполняет thumbnails.build для каждого (pk, файл, хэш) и отдает
+    (pk, результат или исключение) по мере готовности.
+    """
+    if workers == 1 :
+        for pk, name, digest in jobs :
+            try :
+                yield pk, thumbnails.build(pk, name, digest)
+            except Exception as e :
+                yield pk, e
+        return
+
+    # Потомки (fork) получают копию соединения с БД - закрываем его заранее
+    connections.close_all()
+    context = multiprocessing.get_context('fork')
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool :
+        futures = {pool.submit(thumbnails.build, pk, name, digest) : pk for pk, name, digest in jobs}
+        for future in as_completed(futures) :
+            try :
+                yield futures[future], future.result()
+            except Exception as e :
+                yield futures[future], e
+
+
+class Command(BaseCommand):
+    """
+    Строит миниатюры (store/thumbnails.py) для товаров, загруженных
+    до их появления или импортированных без сигналов.
+
+    Изображения обрабатываются параллельно в --workers процессах
+    (по умолчанию - по числу ядер): уменьшение и кодирование - работа
+    процессора. Уже построенные копии пропускаются, поэтому команду
+    можно безопасно перезапускать. С --rehash хэш пересчитывается
+    по файлу и для товаров, у которых он уже есть.
+    """
+    help = 'Строит миниатюры изображений товаров параллельно на всех ядрах'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Число процессов')
+        parser.add_argument('--rehash', action='store_true', help='Пересчитать хэши изображений по файлам')
+
+    def handle(self, *args, **options):
+        rows = list(
+            Product.objects.exclude(image='').exclude(image__isnull=True)
+            .order_by('pk').values_list('pk', 'image', 'image_hash')
+        )
+        known = {pk : digest for pk, _, digest in rows}
+        # Без хэша (None) build посчитает его по файлу
+        jobs = [(pk, name, None if options['rehash'] else (digest or None)) for pk, name, digest in rows]
+        self.stdout.write(f'Товаров с изображением: {len(jobs)}, процессов: {options["workers"]}')
+
+        started = time.monotonic()
+        now = timezone.now()
+        changed, created, failed = [], 0, 0
+        for pk, result in _build_all(jobs, max(1, options['workers'])) :
+            if isinstance(result, Exception) :
+                failed += 1
+                self.stderr.write(self.style.WARNING(f'Товар {pk}: {result}'))
+                continue
+            digest, count = result
+            created += count
+            if digest != known[pk] :
+                changed.append(Product(pk=pk, image_hash=digest, updated_at=now))
+
+        # Хэши - одним пакетом; сигналы bulk_update не шлет,
+        # поэтому карточки с новыми адресами сбрасываем сами.
+        # updated_at меняет ETag страниц с этими товарами
+        Product.objects.bulk_update(changed, ['image_hash', 'updated_at'], batch_size=1000)
+        product_cache.invalidate(*(product.pk for product in changed))
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Готово за {time.monotonic() - started:.1f} с. '
+                f'Новых копий: {created}, обновлено хэшей: {len(changed)}, ошибок: {failed}.'
+            )
+        )
@@ -0,0 +1,95 @@
+import time
+from decimal import Decimal, InvalidOperation
+
+from django.core.management.base import BaseCommand, CommandError
+
+from store import bulk
+from store.models import Category, Product
+
+
+def _percent(value):
+    try :
+        return Decimal(value)
+    except InvalidOperation :
+        raise CommandError(f'Некорректный процент: "{value}"')
+
+
+class Command(BaseCommand):
+    """
+    Массовые изменения товаров (store/bulk.py) - то же, что действия
+    в админке товаров, для больших объемов и скриптов:
+
+      bulk_products reprice --percent 10 --category Одежда
+      bulk_products stock остатки.csv [--increment]
+      bulk_products move --to Распродажа --category Одежда
+
+    Каждая операция - одна транзакция. С --dry-run ничего не меняется,
+    выводится только предпросмотр "было -> стало".
+    """
+    help = 'Массово меняет цены, остатки и категории товаров'
+
+    def add_arguments(self, parser):
+        operations = parser.add_subparsers(dest='operation', required=True)
+
+        reprice = operations.add_parser('reprice', help='Изменить цены на процент')
+        reprice.add_argument('--percent', type=_percent, required=True, help='Процент (отрицательный - скидка)')
+        reprice.add_argument('--category', action='append', default=[], help='Только товары категории (можно несколько)')
+
+        stock = operations.add_parser('stock', help='Остатки из CSV (колонки id или name и stock)')
+        stock.add_argument('csv_file', help='Путь к CSV-файлу')
+        stock.add_argument('--increment', action='store_true', help='Прибавить к остатку, а не заменить')
+
+        move = operations.add_parser('move', help='Перенести товары в другую категорию')
+        move.add_argument('--to', required=True, help='Новая категория (создается, если ее нет)')
+        move.add_argument('--category', action='append', default=[], help='Товары категории (можно несколько)')
+        move.add_argument('--ids', type=int, nargs='+', default=[], help='Товары с этими id')
+
+        for subparser in (reprice, stock, move) :
+            subparser.add_argument('--dry-run', action='store_true', help='Только показать изменения')
+
+    def _products(self, categories):
+        products = Product.objects.all()
+        if categories :
+            found = set(Category.objects.filter(name__in=categories).values_list('name', flat=True))
+            missing = set(categories) - found
+            if missing :
+                raise CommandError(f'Нет категорий: {", ".join(sorted(missing))}')
+            products = products.filter(category__name__in=categories)
+        return products
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        dry_run = options['dry_run']
+        try :
+            if options['operation'] == 'reprice' :
+                result = bulk.reprice(self._products(options['category']), options['percent'], dry_run)
+            elif options['operation'] == 'stock' :
+                with open(options['csv_file'], encoding='utf-8-sig', newline='') as f :
+                    key, values = bulk.read_stock_csv(f)
+                result = bulk.update_stock(key, values, options['increment'], dry_run)
+            else :
+                if not options['category'] and not options['ids'] :
+                    raise CommandError('Укажите товары: --category и/или --ids.')
+                products = self._products(options['category'])
+                if options['ids'] :
+                    products = products.filter(pk__in=options['ids'])
+                if dry_run :
+                    target = Category.objects.filter(name=options['to']).first() or Category(name=options['to'])
+                else :
+                    target, _ = Category.objects.get_or_create(name=options['to'])
+                result = bulk.move_to_category(products, target, dry_run)
+        except (bulk.BulkError, OSError) as e :
+            raise CommandError(str(e))
+
+        for change in result.preview :
+            self.stdout.write(f'  {change.name}: {change.old} -> {change.new}')
+        if result.count > len(result.preview) :
+            self.stdout.write(f'  ... и еще {result.count - len(result.preview)}')
+        for product in result.unknown :
+            self.stderr.write(self.style.WARNING(f'Товар не найден: {product}'))
+
+        elapsed = time.monotonic() - started
+        if dry_run :
+            self.stdout.write(self.style.WARNING(f'Пробный запуск: изменится товаров: {result.count}. Ничего не записано.'))
+        else :
+            self.stdout.write(self.style.SUCCESS(f'Изменено товаров: {result.count} ({elapsed:.2f} с).'))
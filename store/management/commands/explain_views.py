@@ -0,0 +1,160 @@
+import json
+from inspect import iscoroutinefunction
+
+from asgiref.sync import async_to_sync
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.contrib.messages.storage import default_storage
+from django.contrib.sessions.backends.base import SessionBase
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+
+from store import product_cache, views
+from store.explain import explain, seq_scans, summarize
+from store.models import Product
+from store.pagination import encode_cursor
+from users import views as user_views
+
+
+class Command(BaseCommand):
+    """
+    Выполняет основные страницы магазина и показывает план
+    (EXPLAIN ANALYZE) каждого их запроса на текущей базе.
+
+    Отчет можно сохранить (--output) и сравнивать с ним следующие запуски
+    (--compare): команда завершится ошибкой, если у какого-то запроса
+    поменялся способ чтения таблиц, например индекс сменился на Seq Scan.
+    Все выполняется в транзакции, которая откатывается.
+    """
+    help = 'Показывает планы запросов основных страниц магазина (EXPLAIN ANALYZE)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help='Пользователь для страниц корзины и профиля (по умолчанию - первый)')
+        parser.add_argument('--output', help='Сохранить отчет в JSON-файл')
+        parser.add_argument('--compare', help='Сравнить планы с ранее сохраненным отчетом')
+        parser.add_argument('--sql', action='store_true', help='Выводить текст запросов')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql' :
+            raise CommandError('EXPLAIN ANALYZE поддерживается только для PostgreSQL.')
+
+        with transaction.atomic() :
+            report = self._collect(self._user(options['user']))
+            transaction.set_rollback(True)
+
+        for view_name, queries in report.items() :
+            self.stdout.write(self.style.MIGRATE_HEADING(view_name))
+            for number, query in enumerate(queries, 1) :
+                self.stdout.write(
+                    f'  #{number} {query["time_ms"]:8.2f} мс  ' + '; '.join(query['plan'])
+                )
+                if options['sql'] :
+                    self.stdout.write(f'      {query["sql"]}')
+                for table in seq_scans(query['plan']) :
+                    self.stdout.write(self.style.WARNING(f'      Seq Scan по {table}'))
+
+        if options['output'] :
+            with open(options['output'], 'w', encoding='utf-8') as fp :
+                json.dump(report, fp, ensure_ascii=False, indent=2)
+            self.stdout.write(f'Отчет сохранен в {options["output"]}')
+
+        if options['compare'] :
+            with open(options['compare'], encoding='utf-8') as fp :
+                baseline = json.load(fp)
+            changes = list(self._compare(baseline, report))
+            for line in changes :
+                self.stderr.write(self.style.ERROR(line))
+            if changes :
+                raise CommandError(f'Планы запросов изменились: {len(changes)}.')
+            self.stdout.write(self.style.SUCCESS('Планы запросов совпадают с отчетом.'))
+
+    def _user(self, username):
+        User = get_user_model()
+        if username :
+            try :
+                return User.objects.get(username=username)
+            except User.DoesNotExist :
+                raise CommandError(f'Пользователь "{username}" не найден.')
+        return User.objects.order_by('pk').first()
+
+    def _scenarios(self, user):
+        """
+        Пары (название, view, параметры GET, пользователь).
+        """
+        product = Product.objects.order_by('name').only('pk', 'name').first()
+        scenarios = [
+            ('product_list', views.product_list, {}, None),
+            ('product_list ?in_stock=1', views.product_list, {'in_stock' : '1'}, None),
+        ]
+        if product is not None :
+            scenarios += [
+                ('product_list ?after=', views.product_list, {'after' : encode_cursor([product.name])}, None),
+                ('product_detail', views.product_detail, {'pk' : product.pk}, None),
+                ('product_search', views.product_search, {'q' : product.name.split()[0]}, None),
+            ]
+        if user is not None :
+            scenarios += [
+                ('cart_detail', views.cart_detail, {}, user),
+                ('profile', user_views.profile, {}, user),
+            ]
+        else :
+            self.stderr.write(self.style.WARNING('Пользователей нет - корзина и профиль пропущены.'))
+        return scenarios
+
+    def _collect(self, user):
+        factory = RequestFactory()
+        report = {}
+        for name, view, params, as_user in self._scenarios(user) :
+            kwargs = {}
+            if 'pk' in params :
+                kwargs['pk'] = params.pop('pk')
+                # Иначе карточка придет из кэша без единого запроса
+                product_cache.invalidate(kwargs['pk'])
+            request = factory.get('/', params)
+            request.user = as_user or AnonymousUser()
+
+            async def auser(user=request.user):
+                return user
+
+            request.auser = auser
+            # Сессия в памяти: команда не должна ничего сохранять
+            request.session = SessionBase()
+            request._messages = default_storage(request)
+
+            if iscoroutinefunction(view) :
+                # Запросы async ORM выполняются в этом же потоке
+                view = async_to_sync(view)
+            with CaptureQueriesContext(connection) as captured :
+                view(request, **kwargs)
+
+            report[name] = [
+                self._explain(query['sql'])
+                for query in captured.captured_queries
+                if query['sql'].lstrip().upper().startswith('SELECT')
+            ]
+        return report
+
+    def _explain(self, sql):
+        plan = explain(sql)
+        return {
+            'sql' : sql,
+            'time_ms' : plan['Execution Time'],
+            'plan' : summarize(plan),
+        }
+
+    def _compare(self, baseline, report):
+        for view_name, queries in report.items() :
+            before = baseline.get(view_name)
+            if before is None :
+                continue
+            if len(before) != len(queries) :
+                yield f'{view_name}: запросов было {len(before)}, стало {len(queries)}'
+                continue
+            for number, (old, new) in enumerate(zip(before, queries), 1) :
+                if old['plan'] != new['plan'] :
+                    yield (
+                        f'{view_name} #{number}: '
+                        f'было [{"; ".join(old["plan"])}], стало [{"; ".join(new["plan"])}]'
+                    )
@@ -1,28 +1,65 @@
-import json
+import argparse
+import datetime
+
 from django.core.management.base import BaseCommand
-from store.models import Product
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from store.exporting import residue_rows, export_rows, FORMATS
+from store.routers import use_replica
+
+
+def _moment(value):
+    """
+    Разбирает дату (2025-01-31) или дату-время (2025-01-31T12:00).
+    """
+    moment = parse_datetime(value)
+    if moment is None :
+        date = parse_date(value)
+        if date is None :
+            raise argparse.ArgumentTypeError(f'Некорректная дата: "{value}"')
+        moment = datetime.datetime.combine(date, datetime.time.min)
+    if timezone.is_naive(moment) :
+        moment = timezone.make_aware(moment)
+    return moment
 
 
 class Command(BaseCommand):
     """
     Кастомная management-команда для экспорта остатков товаров.
-    Выгружает данные в JSON-формате в stdout (стандартный вывод).
+    Выгружает данные потоково в stdout (стандартный вывод) или в файл:
+    строки пишутся по мере чтения из БД, память не растет с размером каталога.
     """
-    help = 'Экспортирует остатки товаров (название и остаток) в JSON'
-
-    def handle(self, *args, **options):
-        # Получаем все продукты, но берем только нужные поля
-        products = Product.objects.values('name', 'stock')
+    help = 'Экспортирует остатки товаров (название и остаток) в JSON, JSON Lines или CSV'
 
-        # Преобразуем QuerySet в обычный список
-        data_to_export = list(products)
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=FORMATS, default='json', help='Формат выгрузки')
+        parser.add_argument('--output', type=str, default=None, help='Файл для выгрузки (по умолчанию stdout)')
+        parser.add_argument('--chunk-size', type=int, default=2000, help='Сколько строк читать из БД за раз')
+        parser.add_argument('--category', type=str, default=None, help='Только товары указанной категории')
+        parser.add_argument('--low-stock', type=int, default=None, help='Только товары с остатком не больше порога')
+        parser.add_argument('--changed-since', type=_moment, default=None, help='Только товары, измененные с указанной даты')
 
-        # Используем json.dumps для красивого вывода в консоль
-        json_data = json.dumps(data_to_export, indent=4, ensure_ascii=False)
+    def handle(self, *args, **options):
+        rows = residue_rows(
+            category=options['category'],
+            low_stock=options['low_stock'],
+            changed_since=options['changed_since'],
+        )
 
-        # self.stdout.write - это "print" для команд Django
-        self.stdout.write(json_data)
+        # Выгрузка только читает - с реплики, если она настроена
+        with use_replica() :
+            if options['output'] :
+                with open(options['output'], 'w', encoding='utf-8', newline='') as f :
+                    total = export_rows(rows, options['format'], f.write, options['chunk_size'])
+            else :
+                total = export_rows(
+                    rows, options['format'],
+                    lambda text : self.stdout.write(text, ending=''),
+                    options['chunk_size'],
+                )
 
-        self.stdout.write(
-            self.style.SUCCESS('Экспорт остатков успешно завершен.')
-        )
\ No newline at end of file
+        # Сообщение об успехе пишем в stderr, чтобы не испортить
+        # выгрузку при перенаправлении stdout в файл
+        self.stderr.write(
+            self.style.SUCCESS(f'Экспорт остатков успешно завершен ({total} товаров).')
+        )
@@ -1,71 +1,135 @@
 import json
+import os
+import time
+
 from django.core.management.base import BaseCommand
-from store.models import Product, Category
-from django.db import transaction
+from store import facets
+from store.importing import iter_records, ProductImporter
+
+REQUIRED_FIELDS = ('name', 'price', 'stock')
 
 
 class Command(BaseCommand):
     """
+    Кастомная management-команда для загрузки товаров.
+
+    Файл (JSON-массив или JSON Lines) читается потоково, товары
+    записываются пакетами по --batch-size штук, каждый пакет - своя
+    транзакция. С --checkpoint после каждого пакета сохраняется число
+    обработанных записей, и прерванный запуск продолжается с того же места.
+
+    Пример записи:
+    {"name": "Футболка", "description": "...", "price": "990.00",
+     "stock": 10, "category": "Одежда"}
     """
-    help = 'Загружает товары из JSON-файла в базу данных'
+    help = 'Загружает товары из JSON/JSON Lines-файла в базу данных'
 
     def add_arguments(self, parser):
         # Добавляем обязательный аргумент - имя файла
         parser.add_argument('json_file', type=str, help='Путь к JSON-файлу с товарами')
+        parser.add_argument(
+            '--format', choices=('auto', 'json', 'jsonl'), default='auto',
+            help='Формат файла (по умолчанию определяется автоматически)'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Количество товаров в одном пакете записи'
+        )
+        parser.add_argument(
+            '--checkpoint', type=str, default=None,
+            help='Файл контрольной точки для продолжения прерванного импорта'
+        )
+        parser.add_argument(
+            '--progress-interval', type=float, default=5.0,
+            help='Как часто (в секундах) печатать прогресс'
+        )
 
-    @transaction.atomic  # Оборачиваем в транзакцию
     def handle(self, *args, **options):
         file_path = options['json_file']
+        checkpoint_path = options['checkpoint']
+        batch_size = max(1, options['batch_size'])
 
-        try :
-            with open(file_path, 'r', encoding='utf-8-sig') as f :
-                data = json.load(f)
+        state = {'source' : os.path.abspath(file_path), 'records' : 0, 'created' : 0, 'updated' : 0}
+        if checkpoint_path and os.path.exists(checkpoint_path) :
+            with open(checkpoint_path, encoding='utf-8') as f :
+                saved = json.load(f)
+            if saved.get('source') == state['source'] :
+                state = saved
+                self.stdout.write(f'Продолжаем с записи {state["records"]} (контрольная точка).')
 
-        except FileNotFoundError:
+        try :
+            f = open(file_path, 'r', encoding='utf-8-sig')
+        except FileNotFoundError :
             self.stderr.write(self.style.ERROR(f'Файл "{file_path}" не найден.'))
             return
-        except json.JSONDecodeError as e:  # <-- Добавили 'as e'
-            self.stderr.write(self.style.ERROR(f'Ошибка декодирования JSON в файле "{file_path}".'))
-            self.stderr.write(self.style.ERROR(f'Причина: {e}'))  # <-- Добавили эту строку
-            return
 
-        if not isinstance(data, list):
-            self.stderr.write(self.style.ERROR('JSON-файл должен содержать список (массив) объектов.'))
-            return
+        importer = ProductImporter()
+        skip = state['records']
+        processed = 0
+        batch = []
+        started = last_report = time.monotonic()
 
-        products_created = 0
-        products_updated = 0
+        def flush():
+            nonlocal last_report
+            created, updated = importer.write_batch(batch)
+            state['records'] += len(batch)
+            state['created'] += created
+            state['updated'] += updated
+            batch.clear()
+            if checkpoint_path :
+                self._save_checkpoint(checkpoint_path, state)
 
-        for item in data:
-            # Находим или создаем категорию
-            category_name = item.get('category', 'Без категории')
-            category, created = Category.objects.get_or_create(
-                name=category_name
-            )
+            now = time.monotonic()
+            if now - last_report >= options['progress_interval'] :
+                last_report = now
+                rate = (state['records'] - skip) / max(now - started, 1e-9)
+                self.stdout.write(f'Обработано: {state["records"]} ({rate:.0f} записей/с)')
 
-            # Создаем или обновляем товар
-            # update_or_create ищет товар по 'name'
-            # Если находит - обновляет поля из 'defaults'
-            # Если не находит - создает новый
-            product, created = Product.objects.update_or_create(
-                name=item['name'],
-                defaults={
-                    'description': item.get('description', ''),
-                    'price': item['price'],
-                    'stock': item['stock'],
-                    'category': category,
-                }
-            )
+        try :
+            with f :
+                try :
+                    for item in iter_records(f, options['format']) :
+                        processed += 1
+                        if processed <= skip :
+                            continue
+                        if not isinstance(item, dict) or any(key not in item for key in REQUIRED_FIELDS) :
+                            self.stderr.write(self.style.ERROR(
+                                f'Запись №{processed}: ожидается объект с полями {", ".join(REQUIRED_FIELDS)}.'
+                            ))
+                            return
+                        batch.append(item)
+                        if len(batch) >= batch_size :
+                            flush()
+                except json.JSONDecodeError as e :
+                    self.stderr.write(self.style.ERROR(f'Ошибка декодирования JSON в файле "{file_path}".'))
+                    self.stderr.write(self.style.ERROR(f'Причина: {e}'))
+                    return
+                if batch :
+                    flush()
+        finally :
+            # Сводки категорий пересчитываются один раз на весь импорт
+            # (и на прерванный - записанные пакеты уже в БД)
+            facets.refresh(importer.touched_categories)
 
-            if created:
-                products_created += 1
-            else:
-                products_updated += 1
+        if checkpoint_path and os.path.exists(checkpoint_path) :
+            os.remove(checkpoint_path)
 
+        elapsed = time.monotonic() - started
+        rate = (state['records'] - skip) / max(elapsed, 1e-9)
         self.stdout.write(
             self.style.SUCCESS(
                 f'Загрузка завершена. '
-                f'Создано: {products_created}, '
-                f'Обновлено: {products_updated}.'
+                f'Создано: {state["created"]}, '
+                f'Обновлено: {state["updated"]}. '
+                f'({elapsed:.1f} с, {rate:.0f} записей/с)'
             )
-        )
\ No newline at end of file
+        )
+
+    def _save_checkpoint(self, path, state):
+        """
+        Атомарно перезаписывает файл контрольной точки.
+        """
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f :
+            json.dump(state, f)
+        os.replace(tmp_path, path)
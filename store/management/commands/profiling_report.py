@@ -0,0 +1,40 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from store import profiling
+
+
+class Command(BaseCommand):
+    """
+    Сводка профилировщика запросов (store/profiling.py) по представлениям.
+    Данные читаются из кэша PROFILING_CACHE_ALIAS, поэтому команда видит
+    измерения веб-процессов только при общем для них бэкенде кэша.
+    """
+    help = 'Показывает время ответа и число SQL-запросов по представлениям'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--json', action='store_true', help='Вывести сводку в JSON')
+        parser.add_argument('--reset', action='store_true', help='Сбросить накопленные данные после вывода')
+
+    def handle(self, *args, **options):
+        stats = profiling.stats()
+        if options['json'] :
+            self.stdout.write(json.dumps(stats, ensure_ascii=False, indent=2))
+        elif not stats :
+            self.stdout.write('Данных нет: профилирование выключено (PROFILING_SAMPLE_RATE = 0) или еще не было запросов.')
+        else :
+            self.stdout.write(
+                f'{"Представление":<32} {"запросов":>8} {"SQL":>6} {"БД, мс":>8} '
+                f'{"шабл., мс":>9} {"Python, мс":>10} {"всего, мс":>9} {"p50":>6} {"p95":>6}'
+            )
+            for view_name, row in stats.items() :
+                self.stdout.write(
+                    f'{view_name:<32} {row["requests"]:>8} {row["avg_queries"]:>6} '
+                    f'{row["avg_db_ms"]:>8} {row["avg_template_ms"]:>9} {row["avg_python_ms"]:>10} '
+                    f'{row["avg_total_ms"]:>9} {row["p50_ms"]:>6} {row["p95_ms"]:>6}'
+                )
+
+        if options['reset'] :
+            profiling.reset_stats()
+            self.stdout.write(self.style.SUCCESS('Данные профилирования сброшены.'))
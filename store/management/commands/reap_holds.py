@@ -0,0 +1,39 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from store import holds
+
+
+class Command(BaseCommand):
+    """
+    Снимает истекшие резервы товара (store/holds.py): позиции корзин,
+    которые дольше STOCK_HOLD_TTL не продлевались, остаются в корзине,
+    но перестают занимать остаток.
+
+    Запускается по расписанию (cron) или постоянно с --loop.
+    С --rebuild сначала пересчитывает Product.reserved по позициям -
+    исправляет расхождения после правок в обход store/holds.py.
+    """
+    help = 'Снимает истекшие резервы товара в корзинах'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None, help='Позиций за одну транзакцию')
+        parser.add_argument('--loop', action='store_true', help='Работать постоянно')
+        parser.add_argument('--interval', type=float, default=30, help='Пауза между проходами с --loop, с')
+        parser.add_argument('--rebuild', action='store_true', help='Пересчитать счетчики резервов товаров')
+
+    def handle(self, *args, **options):
+        if options['rebuild'] :
+            fixed = holds.rebuild()
+            self.stdout.write(self.style.WARNING(f'Счетчиков резерва исправлено: {fixed}.'))
+
+        while True :
+            started = time.monotonic()
+            reaped = holds.reap(options['batch_size'])
+            self.stdout.write(
+                self.style.SUCCESS(f'Снято резервов: {reaped} ({time.monotonic() - started:.2f} с).')
+            )
+            if not options['loop'] :
+                break
+            time.sleep(options['interval'])
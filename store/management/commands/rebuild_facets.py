@@ -0,0 +1,36 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from store import facets
+from store.models import CategoryFacet
+
+
+def _snapshot():
+    return {row[0] : row[1:] for row in CategoryFacet.objects.values_list('pk', *facets.FIELDS)}
+
+
+class Command(BaseCommand):
+    """
+    Полный пересчет сводок категорий (store/facets.py) по таблице товаров:
+    один агрегирующий запрос на весь каталог. Сводки поддерживаются
+    сигналами и импортом, а эта команда исправляет расхождения после
+    изменений в обход них (UPDATE из SQL, восстановление из бэкапа).
+    """
+    help = 'Пересчитывает сводки категорий для фильтров каталога'
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        with transaction.atomic() :
+            before = _snapshot()
+            count = facets.refresh()
+            after = _snapshot()
+        changed = sum(1 for pk, values in after.items() if before.get(pk) != values)
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Сводок пересчитано: {count}, из них исправлено: {changed} '
+                f'({time.monotonic() - started:.2f} с).'
+            )
+        )
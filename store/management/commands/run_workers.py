@@ -0,0 +1,104 @@
+import multiprocessing
+import threading
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection, connections
+
+from store import jobs
+from store.models import Job
+
+
+def _worker(stop, counters, batch_size, poll_interval, once):
+    try :
+        results = jobs.work(stop, batch_size, poll_interval, once)
+        for counter, value in zip(counters, results) :
+            with counter.get_lock() :
+                counter.value += value
+    finally :
+        # У каждого потока (процесса) воркера - свое соединение с БД
+        connection.close()
+
+
+class Command(BaseCommand):
+    """
+    Выполняет фоновые задачи (store/jobs.py): письма покупателям,
+    уведомления о заканчивающихся товарах.
+
+    Воркеры - потоки (по умолчанию: задачи в основном ждут почту и БД)
+    или процессы (--processes, для задач, нагружающих процессор).
+    Каждый воркер держит одно соединение с БД. Пока воркеры работают,
+    основной поток раз в JOB_TIMEOUT возвращает в очередь зависшие задачи
+    и удаляет выполненные старше JOB_RETENTION_DAYS дней.
+    С --once команда выполняет все готовые задачи и завершается,
+    с --purge - только удаляет старые выполненные задачи.
+    """
+    help = 'Выполняет задачи из очереди фоновых задач'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=None, help='Число воркеров (по умолчанию JOB_WORKERS)')
+        parser.add_argument('--processes', action='store_true', help='Воркеры - процессы, а не потоки')
+        parser.add_argument('--batch-size', type=int, default=None, help='Задач, забираемых воркером за раз')
+        parser.add_argument('--poll-interval', type=float, default=None, help='Пауза между опросами пустой очереди, с')
+        parser.add_argument('--once', action='store_true', help='Выполнить готовые задачи и завершиться')
+        parser.add_argument('--purge', action='store_true', help='Только удалить старые выполненные задачи')
+
+    def _maintain(self):
+        stale = jobs.requeue_stale()
+        if stale :
+            self.stdout.write(self.style.WARNING(f'Возвращено в очередь зависших задач: {stale}'))
+        purged = jobs.purge()
+        if purged :
+            self.stdout.write(f'Удалено выполненных задач старше {settings.JOB_RETENTION_DAYS} дн.: {purged}')
+
+    def handle(self, *args, **options):
+        if options['purge'] :
+            self.stdout.write(self.style.SUCCESS(f'Удалено выполненных задач: {jobs.purge()}.'))
+            return
+        workers = max(1, options['workers'] or settings.JOB_WORKERS)
+        self._maintain()
+
+        worker_args = (options['batch_size'], options['poll_interval'], options['once'])
+        if workers == 1 and options['once'] :
+            # Один проход в текущем потоке - без отдельного соединения
+            done, failed = jobs.work(threading.Event(), *worker_args)
+        else :
+            if options['processes'] :
+                # Потомки (fork) получают копию соединения с БД - закрываем его заранее
+                connections.close_all()
+                context = multiprocessing.get_context('fork')
+                stop = context.Event()
+            else :
+                context = multiprocessing
+                stop = threading.Event()
+            # Счетчики выполненных и неудачных задач, общие для воркеров
+            counters = (context.Value('i', 0), context.Value('i', 0))
+            if options['processes'] :
+                pool = [context.Process(target=_worker, args=(stop, counters, *worker_args)) for _ in range(workers)]
+            else :
+                pool = [threading.Thread(target=_worker, args=(stop, counters, *worker_args)) for _ in range(workers)]
+            kind = 'процессов' if options['processes'] else 'потоков'
+            self.stdout.write(f'Воркеров: {workers} ({kind})')
+            for worker in pool :
+                worker.start()
+            try :
+                while True :
+                    alive = [worker for worker in pool if worker.is_alive()]
+                    if not alive :
+                        break
+                    alive[0].join(settings.JOB_TIMEOUT)
+                    self._maintain()
+            except KeyboardInterrupt :
+                self.stdout.write('Остановка: воркеры завершают текущие задачи...')
+            finally :
+                stop.set()
+                for worker in pool :
+                    worker.join()
+            done, failed = (counter.value for counter in counters)
+
+        if options['once'] :
+            # Очередь - по частичному индексу store_job_queued_idx
+            queued = Job.objects.filter(status=Job.QUEUED).count()
+            self.stdout.write(
+                self.style.SUCCESS(f'Выполнено задач: {done}, с ошибкой: {failed}. В очереди: {queued}.')
+            )
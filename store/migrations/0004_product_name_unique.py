@@ -0,0 +1,42 @@
+# Generated by Django 5.2.7 on 2026-10-18 00:26
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def rename_duplicate_products(apps, schema_editor):
+    """
+    Перед добавлением уникальности переименовывает одноименные товары:
+    самый ранний сохраняет название, к остальным добавляется их id.
+    Товары не сливаются - у них могут быть разные цены и остатки,
+    а на них ссылаются корзины и заказы.
+    """
+    Product = apps.get_model('store', 'Product')
+    max_length = Product._meta.get_field('name').max_length
+    duplicates = (
+        Product.objects.values('name')
+        .annotate(n=Count('id'), keep=Min('id'))
+        .filter(n__gt=1)
+    )
+    for row in duplicates :
+        extra = Product.objects.filter(name=row['name']).exclude(pk=row['keep'])
+        for product in extra.only('id', 'name') :
+            suffix = f' (#{product.pk})'
+            product.name = product.name[:max_length - len(suffix)] + suffix
+            product.save(update_fields=['name'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0003_product_name_id_idx'),
+    ]
+
+    operations = [
+        migrations.RunPython(rename_duplicate_products, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='product',
+            name='name',
+            field=models.CharField(max_length=255, unique=True, verbose_name='Название товара'),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.7 on 2026-10-18 00:40
+
+import django.contrib.postgres.search
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Хранимый вычисляемый столбец заполняется сразу для всех строк:
+    # PostgreSQL переписывает store_product целиком под блокировкой
+    # ACCESS EXCLUSIVE, и до конца миграции таблица недоступна даже
+    # на чтение. Обычный столбец потом не превратить в вычисляемый,
+    # поэтому на большой базе миграцию применяют в окно обслуживания
+    # (см. README). GIN-индекс строится отдельно, без блокировки
+    # записи (0008)
+
+    dependencies = [
+        ('store', '0006_cart_totals'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='search_vector',
+            field=models.GeneratedField(db_persist=True, expression=django.contrib.postgres.search.CombinedSearchVector(django.contrib.postgres.search.SearchVector('name', config='russian', weight='A'), '||', django.contrib.postgres.search.SearchVector('description', config='russian', weight='B'), django.contrib.postgres.search.SearchConfig('russian')), output_field=django.contrib.postgres.search.SearchVectorField(), verbose_name='Поисковый вектор'),
+        ),
+    ]
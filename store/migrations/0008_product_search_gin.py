@@ -0,0 +1,22 @@
+# Generated by Django 5.2.7 on 2026-10-18 00:40
+
+import django.contrib.postgres.indexes
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY не может выполняться внутри транзакции,
+    # зато не блокирует запись в store_product на время построения индекса
+    atomic = False
+
+    dependencies = [
+        ('store', '0007_product_search_vector'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='product',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='store_product_search_gin'),
+        ),
+    ]
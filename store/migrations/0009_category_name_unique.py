@@ -0,0 +1,38 @@
+# Generated by Django 5.2.7 on 2026-10-18 00:42
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def merge_duplicate_categories(apps, schema_editor):
+    """
+    Перед добавлением уникальности сливает одноименные категории
+    в самую раннюю: товары переносятся, дубликаты удаляются.
+    """
+    Category = apps.get_model('store', 'Category')
+    Product = apps.get_model('store', 'Product')
+    duplicates = (
+        Category.objects.values('name')
+        .annotate(n=Count('id'), keep=Min('id'))
+        .filter(n__gt=1)
+    )
+    for row in duplicates :
+        extra = Category.objects.filter(name=row['name']).exclude(pk=row['keep'])
+        Product.objects.filter(category__in=extra).update(category_id=row['keep'])
+        extra.delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0008_product_search_gin'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_categories, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='category',
+            name='name',
+            field=models.CharField(max_length=255, unique=True, verbose_name='Название категории'),
+        ),
+    ]
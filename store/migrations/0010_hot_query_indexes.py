@@ -0,0 +1,40 @@
+# Generated by Django 5.2.7 on 2026-10-18 00:44
+
+import django.db.models.deletion
+from django.conf import settings
+from django.contrib.postgres.operations import AddIndexConcurrently, RemoveIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Индексы строятся и удаляются CONCURRENTLY, без блокировки записи
+    # в store_order и store_product, поэтому миграция вне транзакции
+    atomic = False
+
+    dependencies = [
+        ('store', '0009_category_name_unique'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='order',
+            index=models.Index(fields=['user', '-created_at'], name='store_order_user_created_idx'),
+        ),
+        # Одиночный индекс по user_id покрыт составным индексом выше.
+        # Удаляется только после того, как составной построен
+        migrations.AlterField(
+            model_name='order',
+            name='user',
+            field=models.ForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='orders', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь'),
+        ),
+        AddIndexConcurrently(
+            model_name='product',
+            index=models.Index(condition=models.Q(('stock__gt', 0)), fields=['name'], name='store_product_in_stock_idx'),
+        ),
+        # Каталог сортируется по уникальному name - (name, id) больше не нужен
+        RemoveIndexConcurrently(
+            model_name='product',
+            name='store_product_name_id_idx',
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.2.7 on 2026-10-18 01:04
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Max, Min, Q
+
+
+def build_facets(apps, schema_editor):
+    """
+    Заполняет сводки для уже существующих категорий.
+    """
+    Category = apps.get_model('store', 'Category')
+    CategoryFacet = apps.get_model('store', 'CategoryFacet')
+    rows = Category.objects.order_by().values('pk').annotate(
+        product_count=Count('products'),
+        in_stock_count=Count('products', filter=Q(products__stock__gt=0)),
+        min_price=Min('products__price'),
+        max_price=Max('products__price'),
+    )
+    CategoryFacet.objects.bulk_create(
+        CategoryFacet(category_id=row.pop('pk'), **row) for row in rows
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0011_product_image_hash'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CategoryFacet',
+            fields=[
+                ('category', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='facet', serialize=False, to='store.category', verbose_name='Категория')),
+                ('product_count', models.PositiveIntegerField(default=0, verbose_name='Товаров')),
+                ('in_stock_count', models.PositiveIntegerField(default=0, verbose_name='Товаров в наличии')),
+                ('min_price', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True, verbose_name='Минимальная цена')),
+                ('max_price', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True, verbose_name='Максимальная цена')),
+            ],
+            options={
+                'verbose_name': 'Сводка категории',
+                'verbose_name_plural': 'Сводки категорий',
+            },
+        ),
+        migrations.RunPython(build_facets, migrations.RunPython.noop),
+    ]
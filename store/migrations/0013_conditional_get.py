@@ -0,0 +1,28 @@
+# Generated by Django 5.2.7 on 2026-10-18 01:20
+
+import django.utils.timezone
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Индекс строится CONCURRENTLY, без блокировки записи в store_product,
+    # поэтому миграция вне транзакции
+    atomic = False
+
+    dependencies = [
+        ('store', '0012_category_facets'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now, verbose_name='Дата изменения'),
+            preserve_default=False,
+        ),
+        AddIndexConcurrently(
+            model_name='product',
+            index=models.Index(fields=['updated_at'], name='store_product_updated_idx'),
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.2.7 on 2026-10-18 01:22
+
+import django.db.models.deletion
+from django.conf import settings
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Индекс по store_order строится CONCURRENTLY, без блокировки
+    # оформления заказов, поэтому миграция вне транзакции
+    atomic = False
+
+    dependencies = [
+        ('store', '0015_job_queue'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailySales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='День')),
+                ('units', models.PositiveIntegerField(verbose_name='Продано, шт.')),
+                ('revenue', models.DecimalField(decimal_places=2, max_digits=14, verbose_name='Выручка')),
+            ],
+            options={
+                'verbose_name': 'Продажи за день',
+                'verbose_name_plural': 'Продажи по дням',
+            },
+        ),
+        AddIndexConcurrently(
+            model_name='order',
+            index=models.Index(fields=['created_at'], name='store_order_created_idx'),
+        ),
+        migrations.AddField(
+            model_name='dailysales',
+            name='category',
+            field=models.ForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='store.category', verbose_name='Категория'),
+        ),
+        migrations.AddField(
+            model_name='dailysales',
+            name='product',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='daily_sales', to='store.product', verbose_name='Товар'),
+        ),
+        migrations.AddConstraint(
+            model_name='dailysales',
+            constraint=models.UniqueConstraint(fields=('date', 'product'), name='store_dailysales_date_product_uniq'),
+        ),
+    ]
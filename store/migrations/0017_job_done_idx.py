@@ -0,0 +1,21 @@
+# Generated by Django 5.2.7 on 2026-10-18 01:58
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # store_job к этому моменту может быть большой (выполненные задачи
+    # раньше не удалялись) - индекс строится CONCURRENTLY, вне транзакции
+    atomic = False
+
+    dependencies = [
+        ('store', '0016_sales_rollup'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='job',
+            index=models.Index(condition=models.Q(('status', 'done')), fields=['finished_at'], name='store_job_done_idx'),
+        ),
+    ]
@@ -1,7 +1,10 @@
 # store/models.py
 
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVector, SearchVectorField
 from django.db import models
 from django.conf import settings
+from django.utils import timezone
 
 User = settings.AUTH_USER_MODEL
 
@@ -10,8 +13,10 @@ class Category(models.Model) :
     """
     Модель, представляющая категорию товара.
     """
+    # Уникально: по названию категории ищут импорт (load_goods) и фильтры
     name = models.CharField(
         max_length=255,
+        unique=True,
         verbose_name="Название категории"
     )
     description = models.TextField(
@@ -19,6 +24,11 @@ class Category(models.Model) :
         null=True,
         verbose_name="Описание"
     )
+    # Момент последнего изменения (Last-Modified страниц каталога)
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name="Дата изменения"
+    )
 
     class Meta :
         verbose_name = "Категория"
@@ -33,8 +43,10 @@ class Product(models.Model) :
     """
     Модель, представляющая товар в магазине.
     """
+    # Название - ключ товара при импорте (load_goods), поэтому уникально
     name = models.CharField(
         max_length=255,
+        unique=True,
         verbose_name="Название товара"
     )
     description = models.TextField(
@@ -52,12 +64,28 @@ class Product(models.Model) :
         default=0,
         verbose_name="Остаток на складе"
     )
+    # Сколько из остатка зарезервировано корзинами (store/holds.py).
+    # Меняется только атомарными UPDATE, свободно stock - reserved
+    reserved = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name="Зарезервировано"
+    )
     image = models.ImageField(
         upload_to='products/',
         blank=True,
         null=True,
         verbose_name="Изображение"
     )
+    # Хэш содержимого изображения - часть имен миниатюр (store/thumbnails.py).
+    # Пустой, если изображения нет или миниатюры еще не строились
+    image_hash = models.CharField(
+        max_length=16,
+        blank=True,
+        default='',
+        editable=False,
+        verbose_name="Хэш изображения"
+    )
     # Связь "Многие-к-Одному" с Категорией
     category = models.ForeignKey(
         Category,
@@ -65,15 +93,96 @@ class Product(models.Model) :
         on_delete=models.PROTECT,  # Защита от удаления категории, у которой есть товары
         verbose_name="Категория"
     )
+    # Момент последнего изменения (для выгрузок "изменено с ...")
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name="Дата изменения"
+    )
+    # Поисковый вектор по названию (вес A) и описанию (вес B).
+    # Вычисляется самой БД при любой записи, включая bulk-операции
+    search_vector = models.GeneratedField(
+        expression=(
+            SearchVector('name', weight='A', config='russian')
+            + SearchVector('description', weight='B', config='russian')
+        ),
+        output_field=SearchVectorField(),
+        db_persist=True,
+        verbose_name="Поисковый вектор"
+    )
 
     class Meta :
         verbose_name = "Товар"
         verbose_name_plural = "Товары"
         ordering = ['name']
+        indexes = [
+            # Каталог с фильтром "в наличии" (ORDER BY name WHERE stock > 0).
+            # Для каталога без фильтра хватает уникального индекса по name
+            models.Index(
+                fields=['name'],
+                condition=models.Q(stock__gt=0),
+                name='store_product_in_stock_idx'
+            ),
+            # Полнотекстовый поиск (store/search.py)
+            GinIndex(fields=['search_vector'], name='store_product_search_gin'),
+            # MAX(updated_at) для ETag каталога (store/conditional.py)
+            # и выгрузка "изменено с ..." - без просмотра всей таблицы
+            models.Index(fields=['updated_at'], name='store_product_updated_idx'),
+        ]
 
     def __str__(self) :
         return self.name
 
+    @property
+    def available(self) :
+        """
+        Сколько товара можно положить в корзину: остаток без резервов.
+        """
+        return max(self.stock - self.reserved, 0)
+
+
+class CategoryFacet(models.Model) :
+    """
+    Сводка по товарам категории для фильтров каталога (store/facets.py):
+    фильтры строятся по строке на категорию, без подсчета товаров.
+    """
+    category = models.OneToOneField(
+        Category,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='facet',
+        verbose_name="Категория"
+    )
+    product_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name="Товаров"
+    )
+    in_stock_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name="Товаров в наличии"
+    )
+    # Пустые, если в категории нет товаров
+    min_price = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        blank=True,
+        null=True,
+        verbose_name="Минимальная цена"
+    )
+    max_price = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        blank=True,
+        null=True,
+        verbose_name="Максимальная цена"
+    )
+
+    class Meta :
+        verbose_name = "Сводка категории"
+        verbose_name_plural = "Сводки категорий"
+
+    def __str__(self) :
+        return f"{self.category_id}: {self.product_count}"
+
 
 class Cart(models.Model) :
     """
@@ -89,6 +198,18 @@ class Cart(models.Model) :
         auto_now_add=True,
         verbose_name="Дата создания"
     )
+    # Денормализованные итоги корзины (см. store/carts.py):
+    # позволяют показать корзину в шапке, не читая CartItem
+    total = models.DecimalField(
+        max_digits=12,
+        decimal_places=2,
+        default=0,
+        verbose_name="Сумма"
+    )
+    item_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name="Количество товаров"
+    )
 
     class Meta :
         verbose_name = "Корзина"
@@ -118,12 +239,27 @@ class CartItem(models.Model) :
         default=1,
         verbose_name="Количество"
     )
+    # До какого момента позиция держит резерв товара (store/holds.py).
+    # Пусто - резерва нет: истек и снят или позиция его не получила
+    held_until = models.DateTimeField(
+        blank=True,
+        null=True,
+        verbose_name="Резерв до"
+    )
 
     class Meta :
         verbose_name = "Позиция корзины"
         verbose_name_plural = "Позиции корзины"
         # Уникальность: один товар не может быть добавлен в одну корзину дважды
         unique_together = ('cart', 'product')
+        indexes = [
+            # Поиск истекших резервов (reap_holds) - только позиции с резервом
+            models.Index(
+                fields=['held_until'],
+                condition=models.Q(held_until__isnull=False),
+                name='store_cartitem_held_idx'
+            ),
+        ]
 
     def __str__(self) :
         return f"{self.quantity} x {self.product.name} в корзине"
@@ -153,6 +289,8 @@ class Order(models.Model) :
         on_delete=models.SET_NULL,  # Сохраняем заказ, даже если пользователь удален
         null=True,
         related_name='orders',
+        # Отдельный индекс не нужен: user_id - первое поле составного индекса ниже
+        db_index=False,
         verbose_name="Пользователь"
     )
     # Поля для адреса и ФИО (Требование заказчика №1)
@@ -175,6 +313,12 @@ class Order(models.Model) :
         verbose_name = "Заказ"
         verbose_name_plural = "Заказы"
         ordering = ['-created_at']
+        indexes = [
+            # История заказов пользователя: WHERE user_id = ... ORDER BY created_at DESC
+            models.Index(fields=['user', '-created_at'], name='store_order_user_created_idx'),
+            # Заказы за период: дневная сводка продаж (store/analytics.py)
+            models.Index(fields=['created_at'], name='store_order_created_idx'),
+        ]
 
     def __str__(self) :
         return f"Заказ №{self.id} от {self.created_at.strftime('%Y-%m-%d')}"
@@ -212,4 +356,103 @@ class OrderItem(models.Model) :
         verbose_name_plural = "Позиции заказа"
 
     def __str__(self) :
-        return f"{self.quantity} x {self.product.name}"
\ No newline at end of file
+        return f"{self.quantity} x {self.product.name}"
+
+
+class DailySales(models.Model) :
+    """
+    Продажи товара за день - сводка по OrderItem для отчетов
+    (store/analytics.py). Пополняется инкрементально, не редактируется.
+    """
+    date = models.DateField(verbose_name="День")
+    product = models.ForeignKey(
+        Product,
+        on_delete=models.CASCADE,
+        related_name='daily_sales',
+        # Отчеты выбирают строки по дню (первое поле уникального индекса)
+        db_index=False,
+        verbose_name="Товар"
+    )
+    # Категория товара на момент сводки: отчет по категориям без JOIN товаров
+    category = models.ForeignKey(
+        Category,
+        on_delete=models.SET_NULL,
+        null=True,
+        related_name='+',
+        db_index=False,
+        verbose_name="Категория"
+    )
+    units = models.PositiveIntegerField(verbose_name="Продано, шт.")
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, verbose_name="Выручка")
+
+    class Meta :
+        verbose_name = "Продажи за день"
+        verbose_name_plural = "Продажи по дням"
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'product'], name='store_dailysales_date_product_uniq'),
+        ]
+
+    def __str__(self) :
+        return f"{self.date}: {self.product_id} x {self.units}"
+
+
+class Job(models.Model) :
+    """
+    Фоновая задача в очереди (store/jobs.py): выполняется командой
+    run_workers после коммита транзакции, которая ее поставила.
+    """
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = (
+        (QUEUED, 'В очереди'),
+        (RUNNING, 'Выполняется'),
+        (DONE, 'Выполнена'),
+        (FAILED, 'Ошибка'),
+    )
+
+    name = models.CharField(max_length=100, verbose_name="Задача")
+    payload = models.JSONField(default=dict, blank=True, verbose_name="Параметры")
+    status = models.CharField(
+        max_length=10,
+        choices=STATUS_CHOICES,
+        default=QUEUED,
+        verbose_name="Статус"
+    )
+    attempts = models.PositiveSmallIntegerField(default=0, verbose_name="Попыток")
+    max_attempts = models.PositiveSmallIntegerField(default=5, verbose_name="Максимум попыток")
+    # Не раньше этого момента; после ошибки отодвигается (повтор с паузой)
+    run_at = models.DateTimeField(default=timezone.now, verbose_name="Выполнить после")
+    started_at = models.DateTimeField(null=True, blank=True, verbose_name="Начата")
+    finished_at = models.DateTimeField(null=True, blank=True, verbose_name="Завершена")
+    last_error = models.TextField(blank=True, verbose_name="Последняя ошибка")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Создана")
+
+    class Meta :
+        verbose_name = "Фоновая задача"
+        verbose_name_plural = "Фоновые задачи"
+        ordering = ['-created_at']
+        indexes = [
+            # Выборка готовых задач воркерами: только очередь, по времени запуска
+            models.Index(
+                fields=['run_at'],
+                condition=models.Q(status='queued'),
+                name='store_job_queued_idx'
+            ),
+            # Поиск зависших задач (воркер упал посреди выполнения)
+            models.Index(
+                fields=['started_at'],
+                condition=models.Q(status='running'),
+                name='store_job_running_idx'
+            ),
+            # Удаление старых выполненных задач (jobs.purge)
+            models.Index(
+                fields=['finished_at'],
+                condition=models.Q(status='done'),
+                name='store_job_done_idx'
+            ),
+        ]
+
+    def __str__(self) :
+        return f"{self.name} #{self.pk} ({self.get_status_display()})"
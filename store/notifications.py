@@ -0,0 +1,58 @@
+# store/notifications.py
+"""
+Уведомления после оформления заказа - обработчики фоновых задач
+(store/jobs.py). Ставит их store/checkout.py, выполняет run_workers.
+
+Задача может выполниться повторно (повтор после ошибки, возврат
+зависшей задачи), поэтому обработчики читают актуальные данные
+по id и не меняют их.
+"""
+
+import logging
+
+from django.conf import settings
+from django.core.mail import send_mail
+from django.template.loader import render_to_string
+
+from . import jobs
+from .models import Order, Product
+
+logger = logging.getLogger('store.notifications')
+
+
+@jobs.handler('order_confirmation')
+def send_order_confirmation(order_id):
+    """
+    Письмо покупателю с составом заказа.
+    """
+    order = Order.objects.select_related('user').filter(pk=order_id).first()
+    if order is None or order.user is None or not order.user.email :
+        logger.info('Заказ %s: некому отправить подтверждение', order_id)
+        return
+    items = list(order.items.select_related('product').only('price', 'quantity', 'product__name'))
+    body = render_to_string('store/emails/order_confirmation.txt', {
+        'order' : order,
+        'items' : items,
+        'total' : sum(item.price * item.quantity for item in items),
+    })
+    send_mail(f"Заказ №{order.pk} оформлен", body, None, [order.user.email])
+
+
+@jobs.handler('low_stock')
+def notify_low_stock(product_ids):
+    """
+    Письмо LOW_STOCK_RECIPIENTS о товарах, остаток которых опустился
+    до LOW_STOCK_THRESHOLD (если их еще не пополнили).
+    """
+    threshold = settings.LOW_STOCK_THRESHOLD
+    products = list(
+        Product.objects.filter(pk__in=product_ids, stock__lte=threshold)
+        .order_by('name').values_list('name', 'stock')
+    )
+    if not products :
+        return
+    if not settings.LOW_STOCK_RECIPIENTS :
+        logger.warning('Товары заканчиваются: %s', ', '.join(f'{name} ({stock})' for name, stock in products))
+        return
+    body = render_to_string('store/emails/low_stock.txt', {'products' : products, 'threshold' : threshold})
+    send_mail(f"Заканчиваются товары: {len(products)}", body, None, settings.LOW_STOCK_RECIPIENTS)
@@ -0,0 +1,222 @@
+# store/pagination.py
+
+import base64
+import binascii
+import json
+
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db import models
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+
+class InvalidCursor(ValueError):
+    """
+    Курсор из запроса не удалось разобрать.
+    """
+
+
+def encode_cursor(values):
+    """
+    Упаковывает значения ключа сортировки в компактную строку,
+    безопасную для использования в URL.
+    """
+    raw = json.dumps(list(values), ensure_ascii=False, separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor, size):
+    """
+    Обратная операция к encode_cursor.
+    Возвращает кортеж из 'size' значений или бросает InvalidCursor.
+    """
+    padded = cursor + '=' * (-len(cursor) % 4)
+    try :
+        values = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except (binascii.Error, UnicodeError, ValueError) :
+        raise InvalidCursor(cursor)
+    if not isinstance(values, list) or len(values) != size :
+        raise InvalidCursor(cursor)
+    return tuple(values)
+
+
+def _keyset_condition(fields, values, forward):
+    """
+    Строит условие "(f1, f2, ...) > (v1, v2, ...)" (или "<" для движения назад)
+    в виде, который БД может выполнить по составному индексу:
+    f1 >= v1 AND (f1 > v1 OR (f1 = v1 AND f2 > v2) OR ...)
+    """
+    lookup = 'gt' if forward else 'lt'
+    condition = Q()
+    for i, field in enumerate(fields):
+        equal = dict(zip(fields[:i], values[:i]))
+        condition |= Q(**equal, **{f'{field}__{lookup}' : values[i]})
+    # Избыточное "f1 >= v1" позволяет планировщику начать
+    # сканирование индекса с нужного места, а не фильтровать OR построчно
+    return Q(**{f'{fields[0]}__{lookup}e' : values[0]}) & condition
+
+
+class KeysetPage:
+    """
+    Одна страница выдачи KeysetPaginator.
+    """
+
+    def __init__(self, object_list, next_cursor, previous_cursor, page_size):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+        self.page_size = page_size
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+
+class KeysetPaginator:
+    """
+    Курсорная (keyset) пагинация.
+
+    В отличие от django.core.paginator.Paginator, не использует OFFSET и
+    COUNT(*): каждая страница - это "WHERE ключ > курсор ORDER BY ключ LIMIT n",
+    поэтому время ответа не зависит ни от номера страницы, ни от размера таблицы.
+    Последнее поле 'ordering' должно быть уникальным (обычно 'pk'),
+    иначе курсор будет неоднозначным.
+    """
+
+    def __init__(self, queryset, ordering, page_size):
+        self.queryset = queryset
+        self.ordering = tuple(ordering)
+        self.page_size = page_size
+
+    def _field(self, name):
+        meta = self.queryset.model._meta
+        return meta.pk if name == 'pk' else meta.get_field(name)
+
+    def _check_values(self, values, cursor):
+        """
+        Значения курсора приходят от клиента - проверяем, что каждое
+        подходит своему полю сортировки: None или строка с NUL дошли бы
+        до БД и закончились ошибкой 500, а не первой страницей.
+        """
+        for name, value in zip(self.ordering, values) :
+            field = self._field(name)
+            if isinstance(field, (models.CharField, models.TextField)) :
+                valid = isinstance(value, str) and '\x00' not in value
+            elif isinstance(field, models.IntegerField) :
+                valid = isinstance(value, int) and not isinstance(value, bool)
+            else :
+                valid = value is not None
+            if not valid :
+                raise InvalidCursor(cursor)
+
+    def _cursor_for(self, obj):
+        return encode_cursor(getattr(obj, field) for field in self.ordering)
+
+    def _window(self, after, before):
+        """
+        Запрос на страницу (с запасом в одну запись) и направление.
+        """
+        forward = before is None
+        queryset = self.queryset
+        if after is not None or before is not None :
+            cursor = after if forward else before
+            values = decode_cursor(cursor, len(self.ordering))
+            self._check_values(values, cursor)
+            queryset = queryset.filter(_keyset_condition(self.ordering, values, forward))
+
+        if forward :
+            order_by = self.ordering
+        else :
+            order_by = tuple(f'-{field}' for field in self.ordering)
+
+        # Берем на одну запись больше, чтобы узнать, есть ли еще страница
+        return queryset.order_by(*order_by)[:self.page_size + 1], forward
+
+    def _make_page(self, rows, forward, after):
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if not forward :
+            rows.reverse()
+
+        next_cursor = previous_cursor = None
+        if rows :
+            if has_more or not forward :
+                next_cursor = self._cursor_for(rows[-1])
+            if (has_more and not forward) or (forward and after is not None) :
+                previous_cursor = self._cursor_for(rows[0])
+
+        return KeysetPage(rows, next_cursor, previous_cursor, self.page_size)
+
+    def page(self, after=None, before=None):
+        """
+        Возвращает страницу после курсора 'after', перед курсором 'before'
+        или первую страницу, если курсоры не переданы.
+        """
+        queryset, forward = self._window(after, before)
+        return self._make_page(list(queryset), forward, after)
+
+    async def apage(self, after=None, before=None):
+        """
+        То же, что page(), для асинхронных представлений.
+        """
+        queryset, forward = self._window(after, before)
+        return self._make_page([obj async for obj in queryset], forward, after)
+
+
+def estimate_count(queryset):
+    """
+    Оценка числа строк QuerySet без COUNT(*) - только PostgreSQL:
+    для всей таблицы - pg_class.reltuples (обновляется ANALYZE и
+    автоочисткой), с фильтрами - оценка планировщика из EXPLAIN.
+    None, если оценки нет (другая БД, таблица еще не анализировалась).
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql' :
+        return None
+    with connection.cursor() as cursor :
+        if not queryset.query.where :
+            cursor.execute(
+                'SELECT reltuples FROM pg_class WHERE oid = %s::regclass',
+                [queryset.model._meta.db_table],
+            )
+            row = cursor.fetchone()
+            # -1 - таблица ни разу не анализировалась (PostgreSQL 14+)
+            return int(row[0]) if row and row[0] >= 0 else None
+        sql, params = queryset.query.sql_with_params()
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str) :
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator для списков админки на больших таблицах.
+
+    Точный COUNT(*) по миллионам строк - полный просмотр таблицы
+    на каждой странице списка. Если оценка PostgreSQL (estimate_count)
+    не меньше ADMIN_ESTIMATED_COUNT_THRESHOLD, число записей и страниц
+    берется из нее; меньше - считается точно, это уже дешево.
+    Цена приближения: последняя страница может оказаться пустой
+    или неполной.
+    """
+
+    @cached_property
+    def count(self):
+        estimate = estimate_count(self.object_list)
+        if estimate is None or estimate < settings.ADMIN_ESTIMATED_COUNT_THRESHOLD :
+            return super().count
+        return estimate
@@ -0,0 +1,172 @@
+# store/product_cache.py
+"""
+Кэш карточек товаров для product_detail.
+
+В кэше лежит экземпляр Product вместе с категорией. Бэкенд - любой кэш
+Django из settings.CACHES, алиас задается PRODUCT_CACHE_ALIAS.
+Записи сбрасываются сигналами при изменении товара (см. store/signals.py),
+а по истечении PRODUCT_CACHE_TIMEOUT - сами. Ключи карточек
+версионированы версией каталога (store/caching.py): при изменении
+категории или массовом изменении товаров invalidate_all() сбрасывает
+все карточки разом, без удаления ключей по одному.
+
+Остаток меняется при каждом заказе, поэтому он живет по своим правилам:
+при PRODUCT_STOCK_MAX_AGE = 0 он перечитывается из БД на каждый запрос,
+при N > 0 - не чаще, чем раз в N секунд. Вместе с остатком
+перечитывается updated_at (его меняет оформление заказа) - от него
+зависит ETag карточки (store/conditional.py).
+
+aget_product - асинхронный вариант get_product для async-представлений.
+"""
+
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS
+from django.http import Http404
+
+from . import caching
+from .models import Product
+
+KEY_PREFIX = 'store:product'
+STATS_KEYS = {'hits' : f'{KEY_PREFIX}:stats:hits', 'misses' : f'{KEY_PREFIX}:stats:misses'}
+
+
+def _cache():
+    return caches[settings.PRODUCT_CACHE_ALIAS]
+
+
+def product_key(pk):
+    return f'{KEY_PREFIX}:{pk}'
+
+
+def _count(counter):
+    """
+    Счетчики лежат в том же кэше, что и данные, поэтому
+    общие для всех процессов при разделяемом бэкенде.
+    """
+    cache = _cache()
+    try :
+        cache.incr(STATS_KEYS[counter])
+    except ValueError :
+        # Ключа еще нет (или он вытеснен) - начинаем счет заново
+        cache.add(STATS_KEYS[counter], 0, timeout=None)
+        cache.incr(STATS_KEYS[counter])
+
+
+async def _acount(counter):
+    cache = _cache()
+    try :
+        await cache.aincr(STATS_KEYS[counter])
+    except ValueError :
+        await cache.aadd(STATS_KEYS[counter], 0, timeout=None)
+        await cache.aincr(STATS_KEYS[counter])
+
+
+def _entry(product):
+    return {'product' : product, 'stock_at' : time.time()}
+
+
+def _store(pk, product, version):
+    _cache().set(product_key(pk), _entry(product), settings.PRODUCT_CACHE_TIMEOUT, version=version)
+
+
+def _products():
+    # Кэш заполняется только с основной БД: карточка, прочитанная с отстающей
+    # реплики сразу после сброса, осталась бы в кэше устаревшей надолго
+    return Product.objects.using(DEFAULT_DB_ALIAS).select_related('category').defer('search_vector')
+
+
+def get_product(pk):
+    """
+    Товар с категорией по pk - из кэша или из БД.
+    Бросает Http404, если товара нет.
+    """
+    version = caching.catalog_version()
+    entry = _cache().get(product_key(pk), version=version)
+    if entry is None :
+        _count('misses')
+        try :
+            product = _products().get(pk=pk)
+        except Product.DoesNotExist :
+            raise Http404('Товар не найден.')
+        _store(pk, product, version)
+        return product
+
+    _count('hits')
+    product = entry['product']
+    max_age = settings.PRODUCT_STOCK_MAX_AGE
+    if time.time() - entry['stock_at'] >= max_age :
+        fresh = Product.objects.filter(pk=pk).values_list('stock', 'reserved', 'updated_at').first()
+        if fresh is None :
+            invalidate(pk)
+            raise Http404('Товар не найден.')
+        product.stock, product.reserved, product.updated_at = fresh
+        if max_age > 0 :
+            _store(pk, product, version)
+    return product
+
+
+async def aget_product(pk):
+    """
+    То же, что get_product, через асинхронные API кэша и ORM.
+    """
+    cache = _cache()
+    version = await caching.acatalog_version()
+    entry = await cache.aget(product_key(pk), version=version)
+    if entry is None :
+        await _acount('misses')
+        try :
+            product = await _products().aget(pk=pk)
+        except Product.DoesNotExist :
+            raise Http404('Товар не найден.')
+        await cache.aset(product_key(pk), _entry(product), settings.PRODUCT_CACHE_TIMEOUT, version=version)
+        return product
+
+    await _acount('hits')
+    product = entry['product']
+    max_age = settings.PRODUCT_STOCK_MAX_AGE
+    if time.time() - entry['stock_at'] >= max_age :
+        fresh = await Product.objects.filter(pk=pk).values_list('stock', 'reserved', 'updated_at').afirst()
+        if fresh is None :
+            await cache.adelete(product_key(pk), version=version)
+            raise Http404('Товар не найден.')
+        product.stock, product.reserved, product.updated_at = fresh
+        if max_age > 0 :
+            await cache.aset(product_key(pk), _entry(product), settings.PRODUCT_CACHE_TIMEOUT, version=version)
+    return product
+
+
+def invalidate(*pks):
+    """
+    Сбрасывает кэш указанных товаров.
+    """
+    if pks :
+        _cache().delete_many([product_key(pk) for pk in pks], version=caching.catalog_version())
+
+
+def invalidate_all():
+    """
+    Сбрасывает кэш всех товаров - новой версией каталога.
+    """
+    caching.bump_catalog_version()
+
+
+def stats():
+    """
+    Счетчики попаданий и промахов - для подбора размера кэша.
+    """
+    values = _cache().get_many(STATS_KEYS.values())
+    hits = values.get(STATS_KEYS['hits'], 0)
+    misses = values.get(STATS_KEYS['misses'], 0)
+    total = hits + misses
+    return {
+        'hits' : hits,
+        'misses' : misses,
+        'hit_ratio' : round(hits / total, 4) if total else None,
+    }
+
+
+def reset_stats():
+    _cache().delete_many(list(STATS_KEYS.values()))
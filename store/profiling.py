@@ -0,0 +1,323 @@
+# store/profiling.py
+"""
+Профилирование запросов: число SQL-запросов, время в БД, время
+рендеринга шаблонов и "чистое" время Python для каждого представления.
+
+Включается настройкой PROFILING_SAMPLE_RATE (доля запросов от 0 до 1,
+0 - выключено). Для отобранных запросов:
+
+* в ответ добавляется заголовок Server-Timing (виден в DevTools браузера);
+* измерения складываются в гистограмму по представлению - в кэш
+  PROFILING_CACHE_ALIAS, поэтому при общем кэше она общая для всех
+  процессов (см. команду profiling_report и /products/profiling/);
+* запросы дольше PROFILING_SLOW_REQUEST_MS пишутся в лог 'store.profiling'
+  вместе с самыми медленными SQL-запросами.
+
+Время шаблонов меряет шаблонный бэкенд ProfilingTemplates (TEMPLATES в settings).
+"""
+
+import logging
+import random
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.template.backends.django import DjangoTemplates
+
+logger = logging.getLogger('store.profiling')
+
+KEY_PREFIX = 'store:profiling'
+# Верхние границы корзин гистограммы времени ответа, мс
+BUCKETS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+# Суммы, которые копятся по каждому представлению (время - в микросекундах)
+TOTALS = ('requests', 'queries', 'db_us', 'template_us', 'python_us', 'total_us')
+
+VIEWS_COUNT_KEY = f'{KEY_PREFIX}:views:count'
+
+_current = ContextVar('store_profile', default=None)
+
+
+class RequestProfile:
+    """
+    Измерения одного запроса.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.total = 0.0
+        self.db = 0.0
+        self.template = 0.0
+        # Время БД, пришедшееся на рендеринг шаблонов (ленивые QuerySet)
+        self.db_in_template = 0.0
+        self.queries = []
+
+    @property
+    def python(self):
+        return max(0.0, self.total - self.db - (self.template - self.db_in_template))
+
+    def record_query(self, sql, params, duration):
+        self.db += duration
+        self.queries.append((duration, sql, params))
+
+    def finish(self):
+        self.total = time.perf_counter() - self.started
+
+    def server_timing(self):
+        """
+        Значение заголовка Server-Timing (длительности в мс).
+        """
+        return ', '.join([
+            f'db;dur={self.db * 1000:.2f};desc="{len(self.queries)} SQL"',
+            f'tpl;dur={self.template * 1000:.2f}',
+            f'app;dur={self.python * 1000:.2f}',
+            f'total;dur={self.total * 1000:.2f}',
+        ])
+
+
+def _cache():
+    return caches[settings.PROFILING_CACHE_ALIAS]
+
+
+def _key(view_name, metric):
+    return f'{KEY_PREFIX}:{view_name}:{metric}'
+
+
+def _bounds():
+    return [str(bound) for bound in BUCKETS] + ['inf']
+
+
+def _incr(key, delta):
+    cache = _cache()
+    try :
+        return cache.incr(key, delta)
+    except ValueError :
+        cache.add(key, 0, timeout=None)
+        return cache.incr(key, delta)
+
+
+def _register(view_name):
+    """
+    Добавляет представление в список для stats(). Без чтения-изменения-
+    записи общего множества (параллельные запросы теряли бы друг друга):
+    add атомарен и удается только первому запросу представления, а тот
+    занимает в списке ячейку с номером из атомарного incr.
+    """
+    if _cache().add(_key(view_name, 'registered'), 1, timeout=None) :
+        slot = _incr(VIEWS_COUNT_KEY, 1)
+        _cache().set(f'{KEY_PREFIX}:views:{slot}', view_name, timeout=None)
+
+
+def _views():
+    count = _cache().get(VIEWS_COUNT_KEY, 0)
+    keys = [f'{KEY_PREFIX}:views:{slot}' for slot in range(1, count + 1)]
+    return keys, set(_cache().get_many(keys).values())
+
+
+def record(view_name, profile):
+    """
+    Добавляет измерения запроса в гистограмму представления 'view_name'.
+    """
+    _register(view_name)
+
+    total_ms = profile.total * 1000
+    bucket = next((str(bound) for bound in BUCKETS if total_ms <= bound), 'inf')
+    _incr(_key(view_name, f'bucket:{bucket}'), 1)
+    for metric, value in (
+        ('requests', 1),
+        ('queries', len(profile.queries)),
+        ('db_us', int(profile.db * 1_000_000)),
+        ('template_us', int(profile.template * 1_000_000)),
+        ('python_us', int(profile.python * 1_000_000)),
+        ('total_us', int(profile.total * 1_000_000)),
+    ) :
+        _incr(_key(view_name, metric), value)
+
+
+def _percentile(histogram, requests, fraction):
+    """
+    Оценка перцентиля по гистограмме - верхняя граница корзины.
+    """
+    seen = 0
+    for bound, count in histogram.items() :
+        seen += count
+        if seen >= requests * fraction :
+            return bound
+    return None
+
+
+def stats():
+    """
+    Сводка по представлениям: число запросов, средние значения
+    и гистограмма времени ответа {граница в мс: число запросов}.
+    """
+    result = {}
+    for view_name in sorted(_views()[1]) :
+        bounds = _bounds()
+        keys = [_key(view_name, metric) for metric in TOTALS]
+        keys += [_key(view_name, f'bucket:{bound}') for bound in bounds]
+        values = _cache().get_many(keys)
+        totals = {metric : values.get(_key(view_name, metric), 0) for metric in TOTALS}
+        requests = totals['requests']
+        if not requests :
+            continue
+        histogram = {bound : values.get(_key(view_name, f'bucket:{bound}'), 0) for bound in bounds}
+        result[view_name] = {
+            'requests' : requests,
+            'avg_queries' : round(totals['queries'] / requests, 2),
+            'avg_db_ms' : round(totals['db_us'] / requests / 1000, 2),
+            'avg_template_ms' : round(totals['template_us'] / requests / 1000, 2),
+            'avg_python_ms' : round(totals['python_us'] / requests / 1000, 2),
+            'avg_total_ms' : round(totals['total_us'] / requests / 1000, 2),
+            'p50_ms' : _percentile(histogram, requests, 0.5),
+            'p95_ms' : _percentile(histogram, requests, 0.95),
+            'histogram' : histogram,
+        }
+    return result
+
+
+def reset_stats():
+    cache = _cache()
+    keys, views = _views()
+    keys.append(VIEWS_COUNT_KEY)
+    for view_name in views :
+        keys.append(_key(view_name, 'registered'))
+        keys += [_key(view_name, metric) for metric in TOTALS]
+        keys += [_key(view_name, f'bucket:{bound}') for bound in _bounds()]
+    cache.delete_many(keys)
+
+
+def _log_slow(view_name, request, profile):
+    worst = sorted(profile.queries, key=lambda query : query[0], reverse=True)
+    lines = [
+        f'{duration * 1000:8.2f} мс  {sql}  {params!r}'
+        for duration, sql, params in worst[:settings.PROFILING_SLOW_QUERIES]
+    ]
+    logger.warning(
+        'Медленный запрос %s %s (%s): %.1f мс, SQL-запросов %d, БД %.1f мс, шаблоны %.1f мс\n%s',
+        request.method, request.get_full_path(), view_name,
+        profile.total * 1000, len(profile.queries), profile.db * 1000, profile.template * 1000,
+        '\n'.join(lines),
+    )
+
+
+def _record_query(execute, sql, params, many, context):
+    # Запрос относится к профилю того запроса, в контексте которого
+    # выполняется: под ASGI несколько запросов делят поток sync_to_async
+    # и его соединения, но контекстные переменные у каждого свои
+    profile = _current.get()
+    if profile is None :
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try :
+        return execute(sql, params, many, context)
+    finally :
+        profile.record_query(sql, params, time.perf_counter() - started)
+
+
+def _install_wrappers():
+    """
+    Подключает замер SQL-запросов к соединениям текущего потока - один
+    раз на соединение, а не на каждый запрос: обертки, добавляемые
+    и снимаемые запросами, накладывались бы друг на друга.
+    """
+    for connection in connections.all() :
+        if _record_query not in connection.execute_wrappers :
+            connection.execute_wrappers.append(_record_query)
+
+
+class ProfilingMiddleware:
+    """
+    Профилирует долю PROFILING_SAMPLE_RATE запросов.
+    При PROFILING_SAMPLE_RATE = 0 не подключается вовсе.
+    Работает и под WSGI, и под ASGI (с async-представлениями).
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if settings.PROFILING_SAMPLE_RATE <= 0 :
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response) :
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self) :
+            return self.__acall__(request)
+        if random.random() >= settings.PROFILING_SAMPLE_RATE :
+            return self.get_response(request)
+
+        _install_wrappers()
+        profile = RequestProfile()
+        token = _current.set(profile)
+        try :
+            response = self.get_response(request)
+        finally :
+            _current.reset(token)
+        return self._finish(request, response, profile)
+
+    async def __acall__(self, request):
+        if random.random() >= settings.PROFILING_SAMPLE_RATE :
+            return await self.get_response(request)
+
+        # Async ORM и sync-код запроса выполняются в отдельном потоке
+        # (sync_to_async) - замер подключается к соединениям этого потока
+        await sync_to_async(_install_wrappers)()
+        profile = RequestProfile()
+        token = _current.set(profile)
+        try :
+            response = await self.get_response(request)
+        finally :
+            _current.reset(token)
+        # Запись в кэш - сетевой вызов для общего бэкенда, не в цикле событий
+        return await sync_to_async(self._finish)(request, response, profile)
+
+    def _finish(self, request, response, profile):
+        profile.finish()
+        match = getattr(request, 'resolver_match', None)
+        view_name = match.view_name if match else 'unresolved'
+        response['Server-Timing'] = profile.server_timing()
+        record(view_name, profile)
+        if profile.total * 1000 >= settings.PROFILING_SLOW_REQUEST_MS :
+            _log_slow(view_name, request, profile)
+        return response
+
+
+class ProfilingTemplate:
+    """
+    Обертка шаблона, засекающая время рендеринга.
+    """
+
+    def __init__(self, template):
+        self.template = template
+
+    def __getattr__(self, name):
+        return getattr(self.template, name)
+
+    def render(self, context=None, request=None):
+        profile = _current.get()
+        if profile is None :
+            return self.template.render(context, request)
+        started, db_before = time.perf_counter(), profile.db
+        try :
+            return self.template.render(context, request)
+        finally :
+            profile.template += time.perf_counter() - started
+            profile.db_in_template += profile.db - db_before
+
+
+class ProfilingTemplates(DjangoTemplates):
+    """
+    Стандартный шаблонный бэкенд Django, шаблоны которого
+    сообщают время рендеринга профилировщику.
+    """
+
+    def from_string(self, template_code):
+        return ProfilingTemplate(super().from_string(template_code))
+
+    def get_template(self, template_name):
+        return ProfilingTemplate(super().get_template(template_name))
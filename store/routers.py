@@ -0,0 +1,147 @@
+# store/routers.py
+"""
+Чтение с реплики PostgreSQL.
+
+Реплика - необязательный алиас БД 'replica' (см. POSTGRES_REPLICA_HOST
+в settings). Все записи и по умолчанию все чтения идут на основную БД;
+на реплику уходят только чтения внутри use_replica() - это страницы
+каталога и истории заказов (декоратор replica_reads) и выгрузка остатков.
+
+Даже там чтение остается на основной БД, если:
+* пользователь недавно что-то записал (ReplicaPinMiddleware ставит
+  cookie на REPLICA_PIN_SECONDS) - так он сразу видит свой заказ;
+* идет транзакция на основной БД;
+* запрос с select_for_update или get_or_create - Django сам
+  отправляет такие QuerySet в db_for_write.
+"""
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DEFAULT_DB_ALIAS, connections
+
+REPLICA = 'replica'
+PIN_COOKIE = 'pin_primary'
+
+_replica_reads = ContextVar('store_replica_reads', default=False)
+# Состояние текущего HTTP-запроса (ставит ReplicaPinMiddleware)
+_request_state = ContextVar('store_replica_request', default=None)
+
+
+class RequestState:
+
+    def __init__(self, pinned):
+        self.pinned = pinned
+        self.wrote = False
+
+
+def replica_configured():
+    return REPLICA in connections.settings
+
+
+@contextmanager
+def use_replica():
+    """
+    Чтения внутри блока идут на реплику (если она настроена и
+    пользователь не закреплен за основной БД).
+    """
+    token = _replica_reads.set(True)
+    try :
+        yield
+    finally :
+        _replica_reads.reset(token)
+
+
+def replica_reads(view):
+    """
+    Декоратор представления, которое только читает данные.
+    """
+    if iscoroutinefunction(view) :
+        @wraps(view)
+        async def wrapper(*args, **kwargs):
+            with use_replica() :
+                return await view(*args, **kwargs)
+    else :
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            with use_replica() :
+                return view(*args, **kwargs)
+    return wrapper
+
+
+class ReplicaRouter:
+    """
+    Роутер БД: реплика для разрешенных чтений, основная БД - для остального.
+    """
+
+    def db_for_read(self, model, **hints):
+        if not _replica_reads.get() or not replica_configured() :
+            return None
+        state = _request_state.get()
+        if state is not None and state.pinned :
+            return None
+        # Внутри транзакции читаем то, что в ней уже записано
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block :
+            return None
+        return REPLICA
+
+    def db_for_write(self, model, **hints):
+        state = _request_state.get()
+        if state is not None :
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплика - копия основной БД, связи между ними допустимы
+        databases = {DEFAULT_DB_ALIAS, REPLICA}
+        if obj1._state.db in databases and obj2._state.db in databases :
+            return True
+        return None
+
+
+class ReplicaPinMiddleware:
+    """
+    Read-your-writes: после запроса, который писал в БД, пользователь
+    на REPLICA_PIN_SECONDS читает только с основной БД (cookie).
+    Без настроенной реплики не подключается.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not replica_configured() :
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response) :
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self) :
+            return self.__acall__(request)
+        state = RequestState(pinned=PIN_COOKIE in request.COOKIES)
+        token = _request_state.set(state)
+        try :
+            response = self.get_response(request)
+        finally :
+            _request_state.reset(token)
+        return self._pin(state, response)
+
+    async def __acall__(self, request):
+        state = RequestState(pinned=PIN_COOKIE in request.COOKIES)
+        token = _request_state.set(state)
+        try :
+            response = await self.get_response(request)
+        finally :
+            _request_state.reset(token)
+        return self._pin(state, response)
+
+    def _pin(self, state, response):
+        if state.wrote :
+            response.set_cookie(
+                PIN_COOKIE, '1', max_age=settings.REPLICA_PIN_SECONDS, httponly=True, samesite='Lax'
+            )
+        return response
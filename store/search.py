@@ -0,0 +1,38 @@
+# store/search.py
+"""
+Полнотекстовый поиск по каталогу.
+
+Ищем по сохраненному столбцу Product.search_vector (название с весом A,
+описание с весом B, конфигурация 'russian') с GIN-индексом, поэтому
+запрос не сканирует таблицу, как ILIKE '%...%'.
+"""
+
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db.models import F
+
+from .models import Product
+
+SEARCH_CONFIG = 'russian'
+
+
+def search_query(text):
+    """
+    Запрос в "поисковом" синтаксисе: слова, "фраза", -исключение, or.
+    """
+    return SearchQuery(text, config=SEARCH_CONFIG, search_type='websearch')
+
+
+def search_products(text, category_id=None, queryset=None):
+    """
+    Товары, подходящие под запрос 'text', по убыванию релевантности.
+    """
+    query = search_query(text)
+    queryset = (queryset if queryset is not None else Product.objects.all())
+    queryset = queryset.filter(search_vector=query)
+    if category_id is not None :
+        queryset = queryset.filter(category_id=category_id)
+    return (
+        queryset
+        .annotate(rank=SearchRank(F('search_vector'), query))
+        .order_by('-rank', 'pk')
+    )
@@ -0,0 +1,130 @@
+# store/signals.py
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, pre_delete, pre_save
+from django.dispatch import receiver
+
+from . import carts, facets, product_cache, thumbnails
+from .models import Cart, Category, Product
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def invalidate_product(sender, instance, **kwargs):
+    """
+    Товар изменен или удален - его карточка в кэше больше не актуальна.
+    Сброс - после коммита: до него параллельный промах кэша прочитал бы
+    еще старую строку и положил ее в кэш на PRODUCT_CACHE_TIMEOUT.
+    """
+    pk = instance.pk
+    transaction.on_commit(lambda : product_cache.invalidate(pk))
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_category_products(sender, instance, **kwargs):
+    """
+    Карточки хранятся вместе с категорией - сбрасываем их новой
+    версией каталога, не перечисляя товары категории (после коммита -
+    см. invalidate_product).
+    """
+    transaction.on_commit(product_cache.invalidate_all)
+
+
+@receiver(post_save, sender=Product)
+def recalculate_carts_on_price_change(sender, instance, created, **kwargs):
+    """
+    Итоги корзин считаются по текущим ценам - пересчитываем
+    корзины, в которых лежит измененный товар.
+    """
+    if not created :
+        carts.recalculate(Cart.objects.filter(items__product=instance))
+
+
+@receiver(pre_delete, sender=Product)
+def remember_carts_of_deleted_product(sender, instance, **kwargs):
+    # Позиции корзин удаляются каскадом вместе с товаром,
+    # поэтому запоминаем корзины заранее
+    instance._affected_cart_ids = list(
+        Cart.objects.filter(items__product=instance).values_list('pk', flat=True)
+    )
+
+
+@receiver(post_delete, sender=Product)
+def recalculate_carts_on_delete(sender, instance, **kwargs):
+    cart_ids = getattr(instance, '_affected_cart_ids', None)
+    if cart_ids :
+        carts.recalculate(Cart.objects.filter(pk__in=cart_ids))
+
+
+@receiver(pre_save, sender=Product)
+def hash_product_image(sender, instance, **kwargs):
+    """
+    Новое изображение (еще не записанное в хранилище) - считаем хэш
+    его содержимого: от него зависят имена миниатюр.
+    """
+    image = instance.image
+    if not image :
+        instance.image_hash = ''
+    elif not image._committed :
+        instance.image_hash = thumbnails.content_hash(image)
+        instance._image_uploaded = True
+
+
+@receiver(post_save, sender=Product)
+def build_thumbnails_on_upload(sender, instance, **kwargs):
+    # Строим копии после коммита, чтобы не держать транзакцию
+    # на время обработки изображения
+    if getattr(instance, '_image_uploaded', False) :
+        instance._image_uploaded = False
+        if settings.THUMBNAIL_ON_UPLOAD :
+            pk, name, digest = instance.pk, instance.image.name, instance.image_hash
+            transaction.on_commit(lambda : thumbnails.build_after_upload(pk, name, digest))
+
+
+# Поля товара, от которых зависят сводки категорий (store/facets.py)
+FACET_FIELDS = {'category', 'category_id', 'stock', 'price'}
+
+
+def _facet_state(category_id, stock, price):
+    # То, что учитывают сводки: категория, наличие и цена
+    return category_id, stock > 0, price
+
+
+@receiver(pre_save, sender=Product)
+def remember_facet_categories(sender, instance, raw=False, update_fields=None, **kwargs):
+    """
+    Запоминает, что в товаре было до сохранения (категория, наличие,
+    цена): сводки меняются на разницу старого и нового, а при переносе
+    товара в другую категорию - обе.
+    """
+    if raw or (update_fields is not None and not FACET_FIELDS & set(update_fields)) :
+        instance._facet_change = None
+        return
+    old = None
+    if not instance._state.adding :
+        row = Product.objects.filter(pk=instance.pk).values_list('category_id', 'stock', 'price').first()
+        old = row and _facet_state(*row)
+    instance._facet_change = (old, _facet_state(instance.category_id, instance.stock, instance.price))
+
+
+@receiver(post_save, sender=Product)
+def refresh_facets_on_save(sender, instance, **kwargs):
+    # В той же транзакции, что и запись товара: при откате
+    # откатится и изменение сводки
+    change = getattr(instance, '_facet_change', None)
+    if change :
+        facets.product_changed(*change)
+
+
+@receiver(post_delete, sender=Product)
+def refresh_facets_on_delete(sender, instance, **kwargs):
+    facets.product_changed(_facet_state(instance.category_id, instance.stock, instance.price), None)
+
+
+@receiver(pre_delete, sender=Cart)
+def release_holds_of_deleted_cart(sender, instance, **kwargs):
+    # Корзина удаляется (вместе с пользователем) - ее позиции
+    # уйдут каскадом, а резервы товара нужно вернуть
+    carts.release_cart(instance)
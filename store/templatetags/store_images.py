@@ -0,0 +1,44 @@
+from django import template
+from django.conf import settings
+from django.utils.html import format_html, format_html_join
+
+from store import thumbnails
+
+register = template.Library()
+
+
+@register.simple_tag
+def product_image(product, width, sizes=None, loading='lazy'):
+    """
+    Изображение товара с миниатюрами: <picture> с srcset во всех форматах
+    THUMBNAIL_FORMATS (последний - для <img>, его понимают все браузеры).
+    width - ширина на странице в CSS-пикселях, sizes - атрибут sizes
+    (по умолчанию та же ширина). Браузер сам выбирает копию под экран.
+
+        {% load store_images %}
+        {% product_image product 400 loading='eager' %}
+    """
+    if not product.image :
+        return ''
+    if not product.image_hash :
+        # Миниатюр еще нет (см. build_thumbnails) - отдаем оригинал
+        return format_html(
+            '<img src="{}" alt="{}" width="{}" loading="{}">',
+            product.image.url, product.name, width, loading,
+        )
+
+    sizes = sizes or f'{width}px'
+    *sources, fallback = settings.THUMBNAIL_FORMATS
+    widths = settings.THUMBNAIL_WIDTHS
+    # src - для браузеров без srcset: первая копия не уже места на странице
+    src_width = next((w for w in widths if w >= width), widths[-1])
+    return format_html(
+        '<picture>{}<img src="{}" srcset="{}" sizes="{}" alt="{}" width="{}" loading="{}" decoding="async"></picture>',
+        format_html_join(
+            '', '<source type="{}" srcset="{}" sizes="{}">',
+            ((thumbnails.FORMATS[fmt][2], thumbnails.srcset(product, fmt), sizes) for fmt in sources),
+        ),
+        thumbnails.thumbnail_url(product.pk, product.image_hash, src_width, fallback),
+        thumbnails.srcset(product, fallback),
+        sizes, product.name, width, loading,
+    )
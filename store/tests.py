@@ -1,10 +1,39 @@
-from django.test import TestCase
+import asyncio
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+from unittest import mock
+
+from asgiref.sync import sync_to_async
+from django.core import mail
+from django.core.management import call_command, CommandError
+from django.core.cache import caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test.utils import CaptureQueriesContext
+from django.test import TestCase, TransactionTestCase, override_settings, skipUnlessDBFeature
 from django.urls import reverse
+from django.utils import timezone
 from django.contrib.auth import get_user_model
+from django.db import connection, connections, transaction
+from django.db.backends.signals import connection_created
 from decimal import Decimal
+import fakeredis
+from PIL import Image
 
 # Импортируем наши модели
-from .models import Product, Category, Cart, CartItem
+from .models import Product, Category, CategoryFacet, Cart, CartItem, DailySales, Job, Order, OrderItem
+from .checkout import place_order, OutOfStock
+from .pagination import EstimatedCountPaginator, InvalidCursor, KeysetPaginator, encode_cursor, estimate_count
+from .importing import iter_json_array, ProductImporter
+from . import analytics, bulk, caching, carts, holds, jobs, product_cache, profiling, thumbnails
+from .search import search_products
+from .routers import use_replica, PIN_COOKIE
+from .loadtest import run_flow, compare, wsgi_load
+from .benchmarks import seed_catalog, seed_users
 
 # Импортируем наши формы
 from .forms import AddToCartForm, OrderForm
@@ -151,14 +180,13 @@ class ViewTests(TestCase) :
 
     def test_cart_access_redirects_unauthenticated(self) :
         """
-        Тестируем, что страницы корзины и заказа
-        перенаправляют неавторизованного пользователя
-        на страницу входа.
+        Тестируем, что корзина доступна без входа,
+        а страница заказа перенаправляет неавторизованного
+        пользователя на страницу входа.
         """
-        # 1. Проверяем корзину
+        # 1. Проверяем корзину (анонимная корзина хранится в cookie)
         response_cart = self.client.get(self.cart_detail_url)
-        self.assertEqual(response_cart.status_code, 302)  # 302 - это редирект
-        self.assertRedirects(response_cart, f"{reverse('users:login')}?next={self.cart_detail_url}")
+        self.assertEqual(response_cart.status_code, 200)
 
         # 2. Проверяем оформление заказа
         response_order = self.client.get(self.create_order_url)
@@ -175,4 +203,1988 @@ class ViewTests(TestCase) :
 
         response = self.client.get(self.cart_detail_url)
         self.assertEqual(response.status_code, 200)
-        self.assertContains(response, "Ваша корзина")
\ No newline at end of file
+        self.assertContains(response, "Ваша корзина")
+
+class PaginationTests(TestCase) :
+    """
+    Тестирование курсорной пагинации каталога.
+    """
+
+    def setUp(self) :
+        """
+        25 товаров, у части из них одинаковые цены и остатки.
+        """
+        category = Category.objects.create(name="Категория")
+        for i in range(25) :
+            Product.objects.create(
+                name=f"Товар {24 - i:02d}",
+                category=category,
+                price=10,
+                stock=i // 3
+            )
+        self.url = reverse('store:product_list')
+        self.expected = list(Product.objects.order_by('name', 'pk').values_list('pk', flat=True))
+
+    def _walk(self, page_size) :
+        """
+        Проходит каталог вперед до конца, затем назад до начала.
+        """
+        forward, pages = [], []
+        response = self.client.get(self.url, {'page_size' : page_size})
+        while True :
+            page = response.context['page']
+            pages.append([p.pk for p in page])
+            forward.extend(p.pk for p in page)
+            if not page.has_next :
+                break
+            response = self.client.get(self.url, {'page_size' : page_size, 'after' : page.next_cursor})
+
+        backward = [pages.pop()]
+        while page.has_previous :
+            response = self.client.get(self.url, {'page_size' : page_size, 'before' : page.previous_cursor})
+            page = response.context['page']
+            backward.append([p.pk for p in page])
+        return forward, pages, backward
+
+    def test_walk_forward_and_back(self) :
+        """
+        Все товары проходятся ровно один раз в порядке (name, id),
+        а обратный проход возвращает те же самые страницы.
+        """
+        forward, pages, backward = self._walk(page_size=10)
+        self.assertEqual(forward, self.expected)
+        self.assertEqual(backward[1:], list(reversed(pages)))
+        self.assertFalse(self.client.get(self.url, {'page_size' : 10}).context['page'].has_previous)
+
+    def test_page_size_is_clamped(self) :
+        """
+        Размер страницы ограничен настройкой CATALOG_MAX_PAGE_SIZE
+        и не может быть меньше 1.
+        """
+        with self.settings(CATALOG_MAX_PAGE_SIZE=5) :
+            response = self.client.get(self.url, {'page_size' : 1000})
+        self.assertEqual(len(response.context['products']), 5)
+
+        response = self.client.get(self.url, {'page_size' : 0})
+        self.assertEqual(len(response.context['products']), 1)
+
+    def test_invalid_cursor_shows_first_page(self) :
+        """
+        Битый курсор не приводит к ошибке - показывается первая страница.
+        """
+        response = self.client.get(self.url, {'after' : 'не-курсор'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [p.pk for p in response.context['products']],
+            self.expected[:20]
+        )
+
+    def test_tampered_cursor_shows_first_page(self) :
+        """
+        Курсор с подмененными значениями (null, NUL в строке, число
+        вместо названия) - тоже первая страница, а не ошибка 500.
+        """
+        for values in ([None], ['Товар\x00'], [5], [['Товар']]) :
+            response = self.client.get(self.url, {'after' : encode_cursor(values)})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual([p.pk for p in response.context['products']], self.expected[:20])
+
+        paginator = KeysetPaginator(Product.objects.all(), ordering=('stock', 'pk'), page_size=4)
+        for values in ([0, 'abc'], [True, 1], [None, 1]) :
+            with self.assertRaises(InvalidCursor) :
+                paginator.page(after=encode_cursor(values))
+
+    def test_ties_are_broken_by_pk(self) :
+        """
+        При одинаковых значениях первого поля сортировки
+        порядок определяется по pk, и записи не теряются и не дублируются.
+        """
+        paginator = KeysetPaginator(Product.objects.all(), ordering=('stock', 'pk'), page_size=4)
+        seen, page = [], paginator.page()
+        seen.extend(p.pk for p in page)
+        while page.has_next :
+            page = paginator.page(after=page.next_cursor)
+            seen.extend(p.pk for p in page)
+        self.assertEqual(seen, list(Product.objects.order_by('stock', 'pk').values_list('pk', flat=True)))
+
+    def test_in_stock_filter(self) :
+        """
+        ?in_stock=1 убирает закончившиеся товары и сохраняется в ссылках.
+        """
+        response = self.client.get(self.url, {'in_stock' : '1', 'page_size' : 10})
+        expected = list(Product.objects.filter(stock__gt=0).order_by('name').values_list('pk', flat=True))
+        self.assertEqual([p.pk for p in response.context['products']], expected[:10])
+        self.assertContains(response, 'in_stock=1">Вперед')
+
+    def test_page_query_count_is_constant(self) :
+        """
+        Любая страница каталога - один запрос к таблице товаров,
+        один к сводкам категорий для фильтров и MAX(updated_at) для ETag.
+        """
+        page = self.client.get(self.url, {'page_size' : 5}).context['page']
+        with self.assertNumQueries(3) :
+            self.client.get(self.url, {'page_size' : 5, 'after' : page.next_cursor})
+
+
+class CheckoutTests(TestCase) :
+    """
+    Тестирование оформления заказа (store.checkout).
+    """
+
+    def setUp(self) :
+        self.user = User.objects.create_user(username='buyer', password='password123')
+        self.category = Category.objects.create(name="Категория")
+        self.cart = Cart.objects.create(user=self.user)
+        self.products = [
+            Product.objects.create(
+                name=f"Товар {i:02d}",
+                category=self.category,
+                price=Decimal("10.00") + i,
+                stock=10
+            )
+            for i in range(30)
+        ]
+        for product in self.products :
+            CartItem.objects.create(cart=self.cart, product=product, quantity=3)
+
+    def _order(self) :
+        return Order(user=self.user, full_name='Тест', address='Адрес', phone='123')
+
+    def test_place_order(self) :
+        """
+        Заказ содержит все позиции по текущей цене,
+        остатки списаны, корзина очищена.
+        """
+        order = place_order(self._order(), self.cart)
+
+        self.assertEqual(order.items.count(), 30)
+        self.assertEqual(
+            sorted(order.items.values_list('price', flat=True)),
+            [p.price for p in self.products]
+        )
+        self.assertEqual(set(Product.objects.values_list('stock', flat=True)), {7})
+        self.assertFalse(self.cart.items.exists())
+
+    def test_query_budget(self) :
+        """
+        Число запросов не зависит от количества позиций в корзине:
+        SAVEPOINT, позиции, блокировка товаров, заказ, UPDATE,
+        bulk_create, очистка корзины и ее итогов, RELEASE SAVEPOINT.
+        """
+        with self.assertNumQueries(9) :
+            place_order(self._order(), self.cart)
+
+    def test_out_of_stock_rolls_back(self) :
+        """
+        Если хотя бы одного товара не хватает, ничего не меняется.
+        """
+        short = self.products[17]
+        short.stock = 2
+        short.save()
+
+        with self.assertRaises(OutOfStock) as cm :
+            place_order(self._order(), self.cart)
+
+        self.assertEqual(cm.exception.product, short)
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(Product.objects.filter(stock=10).count(), 29)
+        self.assertEqual(self.cart.items.count(), 30)
+
+    def test_create_order_view(self) :
+        """
+        POST на create_order оформляет заказ и ведет на страницу "Спасибо".
+        """
+        self.client.login(username='buyer', password='password123')
+        response = self.client.post(reverse('store:create_order'), {
+            'full_name' : 'Тест Тестов',
+            'address' : 'г. Тест',
+            'phone' : '+1234567890',
+        })
+        self.assertRedirects(response, reverse('store:order_success'))
+        self.assertEqual(Order.objects.get().user, self.user)
+
+
+@skipUnlessDBFeature('has_select_for_update')
+class ConcurrentCheckoutTests(TransactionTestCase) :
+    """
+    Параллельные заказы одного и того же товара не уводят остаток в минус.
+    Требует БД с SELECT ... FOR UPDATE (PostgreSQL).
+    """
+
+    buyers = 20
+    stock = 7
+
+    def setUp(self) :
+        category = Category.objects.create(name="Категория")
+        self.product = Product.objects.create(
+            name="Дефицит", category=category, price=100, stock=self.stock
+        )
+        self.carts = []
+        for i in range(self.buyers) :
+            user = User.objects.create(username=f'buyer{i}')
+            cart = Cart.objects.create(user=user)
+            CartItem.objects.create(cart=cart, product=self.product, quantity=1)
+            self.carts.append(cart)
+
+    def test_parallel_checkouts(self) :
+        barrier = threading.Barrier(self.buyers)
+        results = []
+
+        def checkout(cart) :
+            try :
+                barrier.wait()
+                order = Order(user=cart.user, full_name='Тест', address='Адрес', phone='1')
+                place_order(order, cart)
+                results.append('ok')
+            except OutOfStock :
+                results.append('out_of_stock')
+            finally :
+                connection.close()
+
+        threads = [threading.Thread(target=checkout, args=(cart,)) for cart in self.carts]
+        for thread in threads :
+            thread.start()
+        for thread in threads :
+            thread.join()
+
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 0)
+        self.assertEqual(results.count('ok'), self.stock)
+        self.assertEqual(results.count('out_of_stock'), self.buyers - self.stock)
+        self.assertEqual(Order.objects.count(), self.stock)
+        self.assertEqual(OrderItem.objects.count(), self.stock)
+
+
+class LoadGoodsTests(TestCase) :
+    """
+    Тестирование потокового импорта (команда load_goods).
+    """
+
+    def setUp(self) :
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.category = Category.objects.create(name="Одежда")
+        Product.objects.create(name="Футболка", category=self.category, price=100, stock=1)
+
+    def _write(self, name, content) :
+        path = os.path.join(self.tmpdir.name, name)
+        with open(path, 'w', encoding='utf-8') as f :
+            f.write(content)
+        return path
+
+    def _records(self, count) :
+        return [
+            {'name' : f'Товар {i}', 'price' : f'{i}.50', 'stock' : i, 'category' : f'Категория {i % 3}'}
+            for i in range(count)
+        ]
+
+    def test_json_array(self) :
+        """
+        JSON-массив: существующий товар обновляется, новые создаются,
+        категории не дублируются.
+        """
+        records = [
+            {'name' : 'Футболка', 'price' : '150.00', 'stock' : 7, 'category' : 'Одежда'},
+            {'name' : 'Кепка', 'price' : '50', 'stock' : 3, 'category' : 'Одежда'},
+            {'name' : 'Чайник', 'price' : '900', 'stock' : 2},
+        ]
+        out = io.StringIO()
+        call_command('load_goods', self._write('data.json', json.dumps(records)), stdout=out)
+
+        self.assertIn('Создано: 2, Обновлено: 1', out.getvalue())
+        shirt = Product.objects.get(name='Футболка')
+        self.assertEqual((shirt.price, shirt.stock), (Decimal('150.00'), 7))
+        self.assertEqual(Product.objects.get(name='Кепка').category, self.category)
+        self.assertEqual(Product.objects.get(name='Чайник').category.name, 'Без категории')
+        self.assertEqual(Category.objects.filter(name='Одежда').count(), 1)
+
+    def test_query_count_per_batch(self) :
+        """
+        Число запросов определяется количеством пакетов, а не записей.
+        """
+        path = self._write('data.jsonl', '\n'.join(json.dumps(r) for r in self._records(300)))
+        # Категории + (SAVEPOINT, новые категории, проверка существующих,
+        # INSERT, пересчет корзин, RELEASE) на первый пакет
+        # и на 2 следующих без новых категорий, затем пересчет
+        # сводок затронутых категорий (агрегат и INSERT)
+        with self.assertNumQueries(1 + 6 + 5 * 2 + 2) :
+            call_command('load_goods', path, batch_size=100, stdout=io.StringIO())
+        self.assertEqual(Product.objects.count(), 301)
+
+    def test_resume_from_checkpoint(self) :
+        """
+        После прерывания повторный запуск с тем же --checkpoint
+        продолжает с первой незаписанной записи.
+        """
+        path = self._write('data.jsonl', '\n'.join(json.dumps(r) for r in self._records(50)))
+        checkpoint = os.path.join(self.tmpdir.name, 'import.checkpoint')
+        original = ProductImporter.write_batch
+        calls = []
+
+        def interrupted(importer, batch) :
+            calls.append(len(batch))
+            if len(calls) == 3 :
+                raise KeyboardInterrupt
+            return original(importer, batch)
+
+        with mock.patch.object(ProductImporter, 'write_batch', interrupted) :
+            with self.assertRaises(KeyboardInterrupt) :
+                call_command('load_goods', path, batch_size=10, checkpoint=checkpoint, stdout=io.StringIO())
+        with open(checkpoint, encoding='utf-8') as f :
+            self.assertEqual(json.load(f)['records'], 20)
+
+        with mock.patch.object(ProductImporter, 'write_batch', autospec=True, side_effect=original) as write :
+            out = io.StringIO()
+            call_command('load_goods', path, batch_size=10, checkpoint=checkpoint, stdout=out)
+
+        self.assertEqual(write.call_count, 3)
+        self.assertIn('Создано: 50, Обновлено: 0', out.getvalue())
+        self.assertEqual(Product.objects.filter(name__startswith='Товар ').count(), 50)
+        self.assertFalse(os.path.exists(checkpoint))
+
+    def test_invalid_json(self) :
+        """
+        Битый файл - сообщение об ошибке, без исключения.
+        """
+        err = io.StringIO()
+        call_command('load_goods', self._write('bad.json', '[{"name": '), stdout=io.StringIO(), stderr=err)
+        self.assertIn('Ошибка декодирования JSON', err.getvalue())
+
+    def test_array_parser_handles_chunk_boundaries(self) :
+        """
+        Разбор массива не зависит от того, где файл разрезан на куски.
+        """
+        data = [1234567, {'a' : [1, 2, {'b' : 'x, ]'}]}, 'строка', None, 3.25]
+        text = ' [ ' + ' , '.join(json.dumps(v, ensure_ascii=False) for v in data) + ' ] '
+        for chunk_size in (1, 2, 3, 7, 1024) :
+            self.assertEqual(list(iter_json_array(io.StringIO(text), chunk_size=chunk_size)), data)
+
+
+class ExportResidueTests(TestCase) :
+    """
+    Тестирование потоковой выгрузки остатков (команда export_product_residue).
+    """
+
+    def setUp(self) :
+        clothes = Category.objects.create(name="Одежда")
+        food = Category.objects.create(name="Еда")
+        for i in range(5) :
+            Product.objects.create(name=f"Одежда {i}", category=clothes, price=10, stock=i)
+        Product.objects.create(name="Хлеб", category=food, price=5, stock=100)
+
+    def _export(self, *args, **options) :
+        out, err = io.StringIO(), io.StringIO()
+        call_command('export_product_residue', *args, stdout=out, stderr=err, **options)
+        self.assertIn('Экспорт остатков успешно завершен', err.getvalue())
+        return out.getvalue()
+
+    def test_json_array_across_chunks(self) :
+        """
+        JSON-массив валиден при любом размере куска,
+        и в stdout нет ничего, кроме данных.
+        """
+        for chunk_size in (1, 2, 6, 100) :
+            data = json.loads(self._export(chunk_size=chunk_size))
+            self.assertEqual(len(data), 6)
+            self.assertEqual(data[-1], {'name' : 'Хлеб', 'stock' : 100})
+
+    def test_jsonl_and_csv(self) :
+        """
+        JSON Lines - по объекту на строку, CSV - с заголовком.
+        """
+        lines = self._export(format='jsonl').splitlines()
+        self.assertEqual(json.loads(lines[0]), {'name' : 'Одежда 0', 'stock' : 0})
+        self.assertEqual(len(lines), 6)
+
+        rows = self._export(format='csv').splitlines()
+        self.assertEqual(rows[0], 'name,stock')
+        self.assertEqual(rows[-1], 'Хлеб,100')
+
+    def test_filters(self) :
+        """
+        Фильтры по категории, порогу остатка и дате изменения.
+        """
+        data = json.loads(self._export(category='Одежда', low_stock=2))
+        self.assertEqual([row['name'] for row in data], ['Одежда 0', 'Одежда 1', 'Одежда 2'])
+
+        Product.objects.filter(name='Хлеб').update(updated_at=datetime(2030, 1, 1, tzinfo=dt_timezone.utc))
+        data = json.loads(self._export('--changed-since', '2029-12-31'))
+        self.assertEqual(data, [{'name' : 'Хлеб', 'stock' : 100}])
+
+    def test_output_file(self) :
+        """
+        С --output выгрузка пишется в файл, а не в stdout.
+        """
+        with tempfile.TemporaryDirectory() as tmpdir :
+            path = os.path.join(tmpdir, 'stock.csv')
+            self.assertEqual(self._export(format='csv', output=path), '')
+            with open(path, encoding='utf-8') as f :
+                self.assertEqual(len(f.read().splitlines()), 7)
+
+
+class ProductCacheTests(TestCase) :
+    """
+    Тестирование кэша карточек товаров.
+    """
+
+    def setUp(self) :
+        caches['default'].clear()
+        self.category = Category.objects.create(name="Посуда")
+        self.product = Product.objects.create(name="Чайник", category=self.category, price=900, stock=5)
+        self.url = reverse('store:product_detail', args=[self.product.pk])
+
+    def test_hit_reads_only_stock(self) :
+        """
+        Повторный запрос берет карточку из кэша и перечитывает только остаток.
+        """
+        self.client.get(self.url)
+        Product.objects.filter(pk=self.product.pk).update(stock=3)
+        with self.assertNumQueries(1) :
+            response = self.client.get(self.url)
+        self.assertContains(response, "3 шт.")
+        self.assertEqual(product_cache.stats(), {'hits' : 1, 'misses' : 1, 'hit_ratio' : 0.5})
+
+    @override_settings(PRODUCT_STOCK_MAX_AGE=60)
+    def test_bounded_stock_staleness(self) :
+        """
+        С PRODUCT_STOCK_MAX_AGE > 0 попадание не обращается к БД вовсе.
+        """
+        self.client.get(self.url)
+        Product.objects.filter(pk=self.product.pk).update(stock=3)
+        with self.assertNumQueries(0) :
+            response = self.client.get(self.url)
+        self.assertContains(response, "5 шт.")
+
+    def test_invalidation_on_change(self) :
+        """
+        Изменение товара или его категории сбрасывает карточку.
+        """
+        self.client.get(self.url)
+
+        # Карточка сбрасывается только после коммита изменения
+        self.product.price = 1200
+        with self.captureOnCommitCallbacks(execute=True) as callbacks :
+            self.product.save()
+            self.assertContains(self.client.get(self.url), "900")
+        self.assertTrue(callbacks)
+        self.assertContains(self.client.get(self.url), "1200")
+
+        self.category.name = "Кухня"
+        with self.captureOnCommitCallbacks(execute=True) :
+            self.category.save()
+        self.assertContains(self.client.get(self.url), "Кухня")
+
+        with self.captureOnCommitCallbacks(execute=True) :
+            self.product.delete()
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+    def test_stats_are_staff_only(self) :
+        stats_url = reverse('store:product_cache_stats')
+        self.assertEqual(self.client.get(stats_url).status_code, 302)
+
+        User.objects.create_user(username='staff', password='password123', is_staff=True)
+        self.client.login(username='staff', password='password123')
+        self.assertEqual(self.client.get(stats_url).json()['misses'], 0)
+
+
+class CartTotalsTests(TestCase) :
+    """
+    Тестирование корзины и ее денормализованных итогов.
+    """
+
+    def setUp(self) :
+        self.user = User.objects.create_user(username='buyer', password='password123')
+        category = Category.objects.create(name="Категория")
+        self.products = [
+            Product.objects.create(name=f"Товар {i}", category=category, price=Decimal("10.00") * (i + 1), stock=10)
+            for i in range(5)
+        ]
+        self.client.force_login(self.user)
+
+    def _add(self, product, quantity) :
+        return self.client.post(reverse('store:add_to_cart', args=[product.pk]), {'quantity' : quantity})
+
+    def _cart(self) :
+        return Cart.objects.get(user=self.user)
+
+    def test_totals_follow_add_and_remove(self) :
+        """
+        Итоги корзины меняются вместе с позициями.
+        """
+        self._add(self.products[0], 2)
+        self._add(self.products[1], 1)
+        self._add(self.products[0], 1)
+        cart = self._cart()
+        self.assertEqual((cart.total, cart.item_count), (Decimal("50.00"), 4))
+
+        self.client.post(reverse('store:remove_from_cart', args=[self.products[0].pk]))
+        cart = self._cart()
+        self.assertEqual((cart.total, cart.item_count), (Decimal("20.00"), 1))
+
+    def test_totals_follow_price_change(self) :
+        """
+        Смена цены товара пересчитывает итоги корзин с этим товаром.
+        """
+        self._add(self.products[2], 3)
+        product = self.products[2]
+        product.price = Decimal("1.50")
+        product.save()
+        self.assertEqual(self._cart().total, Decimal("4.50"))
+
+        product.delete()
+        self.assertEqual((self._cart().total, self._cart().item_count), (0, 0))
+
+    def test_cart_detail_single_query(self) :
+        """
+        Страница корзины: сессия, пользователь и один запрос
+        за позициями, товарами и итогом - при любом числе позиций.
+        """
+        for product in self.products :
+            self._add(product, 2)
+        with self.assertNumQueries(3) :
+            response = self.client.get(reverse('store:cart_detail'))
+        self.assertEqual(response.context['total_price'], Decimal("300.00"))
+        self.assertContains(response, "Корзина (10 шт.")
+
+    def test_header_badge_reads_only_cart(self) :
+        """
+        Значок корзины в шапке берет данные из Cart, не из CartItem.
+        """
+        self._add(self.products[0], 2)
+        with CaptureQueriesContext(connection) as queries :
+            response = self.client.get(reverse('store:product_list'))
+        self.assertContains(response, "2 шт., 20,00 руб.")
+        self.assertFalse(any('store_cartitem' in q['sql'] for q in queries.captured_queries))
+
+
+class AnonymousCartTests(TestCase) :
+    """
+    Тестирование корзины анонимного посетителя и ее переноса при входе.
+    """
+
+    def setUp(self) :
+        caches['default'].clear()
+        category = Category.objects.create(name="Категория")
+        self.kettle = Product.objects.create(name="Чайник", category=category, price=Decimal("900.00"), stock=5)
+        self.cup = Product.objects.create(name="Чашка", category=category, price=Decimal("150.00"), stock=10)
+        self.user = User.objects.create_user(username='buyer', password='password123')
+
+    def _add(self, product, quantity) :
+        return self.client.post(reverse('store:add_to_cart', args=[product.pk]), {'quantity' : quantity})
+
+    def test_add_does_not_write_to_db(self) :
+        """
+        Добавление в корзину без входа ничего не пишет в БД.
+        """
+        self._add(self.kettle, 1)  # карточка попадает в кэш
+        with CaptureQueriesContext(connection) as queries :
+            response = self._add(self.kettle, 2)
+        self.assertRedirects(response, reverse('store:cart_detail'))
+        self.assertFalse([q for q in queries.captured_queries if not q['sql'].startswith('SELECT')])
+
+        response = self.client.get(reverse('store:cart_detail'))
+        self.assertEqual(response.context['total_price'], Decimal("2700.00"))
+        self.assertContains(response, "Корзина (3 шт., 2700,00 руб.)")
+
+    def test_stock_and_remove(self) :
+        """
+        Остаток проверяется с учетом уже лежащего в корзине,
+        удаление убирает позицию из cookie.
+        """
+        self._add(self.kettle, 4)
+        self._add(self.kettle, 2)
+        self._add(self.cup, 1)
+        self.client.post(reverse('store:remove_from_cart', args=[self.cup.pk]))
+
+        items = self.client.get(reverse('store:cart_detail')).context['cart_items']
+        self.assertEqual([(i.product, i.quantity) for i in items], [(self.kettle, 4)])
+
+    def test_tampered_cookie_is_ignored(self) :
+        self.client.cookies['cart'] = f'{self.kettle.pk}:3'
+        response = self.client.get(reverse('store:cart_detail'))
+        self.assertEqual(response.context['cart_items'], [])
+
+    def test_merge_on_login(self) :
+        """
+        При входе корзина из cookie складывается с сохраненной
+        корзиной пользователя (не больше остатка), cookie удаляется.
+        """
+        self._add(self.kettle, 4)
+        self._add(self.cup, 2)
+        # Резерв сохраненной корзины уменьшает свободный остаток
+        # уже после того, как товар положен в cookie
+        cart = Cart.objects.create(user=self.user)
+        carts.add_item(cart, self.kettle, 3)
+
+        response = self.client.post(reverse('users:login'), {'username' : 'buyer', 'password' : 'password123'})
+
+        self.assertEqual(response.cookies['cart'].value, '')
+        self.assertEqual(
+            dict(cart.items.values_list('product__name', 'quantity')),
+            {'Чайник' : 5, 'Чашка' : 2}
+        )
+        cart.refresh_from_db()
+        self.assertEqual((cart.total, cart.item_count), (Decimal("4800.00"), 7))
+
+    def test_merge_on_register(self) :
+        self._add(self.cup, 2)
+        self.client.post(reverse('users:register'), {
+            'username' : 'newbie',
+            'password1' : 'Sup3r-secret-pass',
+            'password2' : 'Sup3r-secret-pass',
+        })
+        cart = Cart.objects.get(user__username='newbie')
+        self.assertEqual(cart.item_count, 2)
+
+
+class SearchTests(TestCase) :
+    """
+    Тестирование полнотекстового поиска по каталогу.
+    """
+
+    def setUp(self) :
+        self.kitchen = Category.objects.create(name="Кухня")
+        self.clothes = Category.objects.create(name="Одежда")
+        self.kettle = Product.objects.create(
+            name="Чайник электрический", description="Стальной корпус", category=self.kitchen, price=900, stock=1
+        )
+        self.cup = Product.objects.create(
+            name="Кружка", description="Подходит к любому чайнику", category=self.kitchen, price=150, stock=1
+        )
+        self.shirt = Product.objects.create(
+            name="Футболка с чайником", description="Хлопок", category=self.clothes, price=500, stock=1
+        )
+        self.url = reverse('store:product_search')
+
+    def test_ranking_and_stemming(self) :
+        """
+        Слово находится в любой форме; совпадение в названии
+        ранжируется выше, чем в описании.
+        """
+        results = list(search_products('чайники'))
+        self.assertEqual(results[-1], self.cup)
+        self.assertEqual(set(results), {self.kettle, self.cup, self.shirt})
+
+    def test_category_filter(self) :
+        response = self.client.get(self.url, {'q' : 'чайник', 'category' : self.clothes.pk})
+        self.assertEqual(response.context['products'], [self.shirt])
+
+    def test_pagination(self) :
+        response = self.client.get(self.url, {'q' : 'чайник', 'page_size' : 2})
+        self.assertEqual(len(response.context['products']), 2)
+        self.assertTrue(response.context['has_next'])
+
+        response = self.client.get(self.url, {'q' : 'чайник', 'page_size' : 2, 'page' : 2})
+        self.assertEqual(response.context['products'], [self.cup])
+        self.assertFalse(response.context['has_next'])
+
+    def test_admin_search_uses_search_vector(self) :
+        User.objects.create_superuser(username='admin', password='password123')
+        self.client.login(username='admin', password='password123')
+        with CaptureQueriesContext(connection) as queries :
+            response = self.client.get(reverse('admin:store_product_changelist'), {'q' : 'хлопок'})
+        self.assertEqual(list(response.context['cl'].result_list), [self.shirt])
+        self.assertTrue(any('@@' in q['sql'] for q in queries.captured_queries))
+        self.assertFalse(any('LIKE' in q['sql'].upper() for q in queries.captured_queries))
+
+
+class ExplainViewsTests(TestCase) :
+    """
+    Тестирование команды explain_views.
+    """
+
+    def setUp(self) :
+        category = Category.objects.create(name="Кухня")
+        Product.objects.create(name="Чайник", category=category, price=900, stock=3)
+        User.objects.create_user(username='buyer', password='password123')
+
+    def test_report_and_compare(self) :
+        """
+        Отчет покрывает страницы каталога, корзины и профиля;
+        сравнение с самим собой проходит, с измененным планом - нет.
+        """
+        with tempfile.TemporaryDirectory() as tmp :
+            path = os.path.join(tmp, 'plans.json')
+            out = io.StringIO()
+            call_command('explain_views', output=path, stdout=out)
+            with open(path, encoding='utf-8') as fp :
+                report = json.load(fp)
+            self.assertEqual(
+                set(report),
+                {
+                    'product_list', 'product_list ?in_stock=1', 'product_list ?after=',
+                    'product_detail', 'product_search', 'cart_detail', 'profile',
+                }
+            )
+            self.assertTrue(all(q['plan'] for q in report['product_list']))
+            self.assertIn('store_product', out.getvalue())
+
+            call_command('explain_views', compare=path, stdout=io.StringIO())
+
+            report['product_list'][0]['plan'] = ['Seq Scan on store_product']
+            with open(path, 'w', encoding='utf-8') as fp :
+                json.dump(report, fp)
+            with self.assertRaises(CommandError) :
+                call_command('explain_views', compare=path, stdout=io.StringIO(), stderr=io.StringIO())
+
+
+@override_settings(PROFILING_SAMPLE_RATE=1)
+class ProfilingTests(TestCase) :
+    """
+    Тестирование профилировщика запросов (store/profiling.py).
+    """
+
+    def setUp(self) :
+        caches['default'].clear()
+        category = Category.objects.create(name="Посуда")
+        Product.objects.create(name="Чайник", category=category, price=900, stock=5)
+        self.url = reverse('store:product_list')
+
+    def test_server_timing_and_histogram(self) :
+        """
+        Каждый отобранный запрос получает Server-Timing
+        и попадает в сводку своего представления.
+        """
+        response = self.client.get(self.url)
+        self.assertRegex(response['Server-Timing'], r'^db;dur=[\d.]+;desc="3 SQL", tpl;dur=[\d.]+, app;dur=')
+        self.client.get(self.url)
+
+        stats = profiling.stats()['store:product_list']
+        self.assertEqual(stats['requests'], 2)
+        self.assertEqual(stats['avg_queries'], 3)
+        self.assertGreater(stats['avg_template_ms'], 0)
+        self.assertEqual(sum(stats['histogram'].values()), 2)
+
+        out = io.StringIO()
+        call_command('profiling_report', reset=True, stdout=out)
+        self.assertIn('store:product_list', out.getvalue())
+        self.assertEqual(profiling.stats(), {})
+
+    @override_settings(PROFILING_SAMPLE_RATE=0)
+    def test_disabled_by_default(self) :
+        response = self.client.get(self.url)
+        self.assertNotIn('Server-Timing', response)
+        self.assertEqual(profiling.stats(), {})
+
+    @override_settings(PROFILING_SLOW_REQUEST_MS=0)
+    def test_slow_request_log_contains_sql(self) :
+        with self.assertLogs('store.profiling', 'WARNING') as logs :
+            self.client.get(self.url)
+        self.assertIn('store:product_list', logs.output[0])
+        self.assertIn('FROM "store_product"', logs.output[0])
+
+    def test_stats_are_staff_only(self) :
+        stats_url = reverse('store:profiling_stats')
+        self.assertEqual(self.client.get(stats_url).status_code, 302)
+
+        User.objects.create_user(username='staff', password='password123', is_staff=True)
+        self.client.login(username='staff', password='password123')
+        self.client.get(self.url)
+        self.assertIn('store:product_list', self.client.get(stats_url).json())
+
+
+class StorefrontLoadTests(TransactionTestCase) :
+    """
+    Тестирование нагрузочного прогона витрины (store/loadtest.py).
+    Потоки работают через свои соединения, поэтому данные должны быть
+    закоммичены - отсюда TransactionTestCase.
+    """
+
+    def test_flows_run_concurrently_without_errors(self) :
+        seed_catalog(20, categories=2, stock=100)
+        users = seed_users(2)
+        catalog = [{'pk' : pk, 'name' : name} for pk, name in Product.objects.values_list('pk', 'name')]
+
+        results = {'flows' : {}}
+        for name in ('browse', 'add_to_cart', 'create_order') :
+            results['flows'][name] = run_flow(name, users, 2, catalog)
+
+        browse = results['flows']['browse']
+        self.assertEqual(browse['requests'], 2 * 2 * 4)
+        self.assertEqual(browse['errors'], 0)
+        self.assertEqual(set(browse['steps']), {'catalog', 'catalog ?after=', 'product_detail', 'search'})
+        self.assertEqual(results['flows']['create_order']['errors'], 0)
+        self.assertEqual(Order.objects.count(), 2 * 2)
+        self.assertEqual(len(list(compare(results, results))), 3)
+
+
+class AsyncViewTests(TestCase) :
+    """
+    Тестирование асинхронных представлений каталога и корзины
+    через ASGI-клиент (без перехода в синхронный режим).
+    """
+
+    def setUp(self) :
+        caches['default'].clear()
+        self.user = User.objects.create_user(username='buyer', password='password123')
+        category = Category.objects.create(name="Посуда")
+        self.product = Product.objects.create(name="Чайник", category=category, price=900, stock=5)
+        cart = Cart.objects.create(user=self.user)
+        carts.add_item(cart, self.product, 2)
+
+    async def test_pages_for_authenticated_user(self) :
+        """
+        Шапка с пользователем и итогами корзины рендерится без
+        синхронных обращений к БД из асинхронного кода.
+        """
+        await self.async_client.aforce_login(self.user)
+
+        response = await self.async_client.get(reverse('store:product_list'))
+        self.assertContains(response, "Чайник")
+        self.assertEqual(response.context['cart_summary']['item_count'], 2)
+
+        response = await self.async_client.get(reverse('store:product_detail', args=[self.product.pk]))
+        self.assertContains(response, "Посуда")
+
+        response = await self.async_client.get(reverse('store:cart_detail'))
+        self.assertEqual(response.context['total_price'], Decimal('1800.00'))
+
+    async def test_anonymous_cart_and_missing_product(self) :
+        response = await self.async_client.get(reverse('store:cart_detail'))
+        self.assertEqual(response.context['cart_items'], [])
+
+        response = await self.async_client.get(reverse('store:product_detail', args=[self.product.pk + 100]))
+        self.assertEqual(response.status_code, 404)
+
+    @override_settings(PROFILING_SAMPLE_RATE=1)
+    async def test_profiling_under_asgi(self) :
+        """
+        Под ASGI профилировщик видит запросы async ORM.
+        """
+        response = await self.async_client.get(reverse('store:product_list'))
+        self.assertIn('desc="3 SQL"', response['Server-Timing'])
+
+    @override_settings(PROFILING_SAMPLE_RATE=1)
+    async def test_concurrent_profiles_do_not_mix(self) :
+        """
+        Параллельные запросы делят поток sync_to_async и его соединения,
+        но каждый профиль видит только свои SQL-запросы.
+        """
+        url = reverse('store:product_list')
+        responses = await asyncio.gather(*(self.async_client.get(url) for _ in range(4)))
+        for response in responses :
+            self.assertIn('desc="3 SQL"', response['Server-Timing'])
+        stats = await sync_to_async(profiling.stats)()
+        self.assertEqual(stats['store:product_list']['avg_queries'], 3)
+        self.assertEqual(stats['store:product_list']['requests'], 4)
+
+
+class ConnectionReuseTests(TransactionTestCase) :
+    """
+    Тестирование переиспользования соединений с БД (CONN_MAX_AGE).
+    """
+
+    def _connections_opened(self, max_age) :
+        opened = []
+
+        def on_connect(sender, connection, **kwargs) :
+            opened.append(connection)
+
+        database = connections.settings['default']
+        saved = database['CONN_MAX_AGE']
+        database['CONN_MAX_AGE'] = max_age
+        connection_created.connect(on_connect)
+        try :
+            stats = wsgi_load([reverse('store:product_list')], threads=1, total=5)
+        finally :
+            connection_created.disconnect(on_connect)
+            database['CONN_MAX_AGE'] = saved
+        self.assertEqual(stats['errors'], 0)
+        return len(opened)
+
+    @override_settings(ALLOWED_HOSTS=['127.0.0.1'])
+    def test_persistent_connection_is_reused(self) :
+        self.assertEqual(self._connections_opened(0), 5)
+        self.assertEqual(self._connections_opened(60), 1)
+
+
+class ReplicaRoutingTests(TransactionTestCase) :
+    """
+    Тестирование чтения с реплики (store/routers.py) на двух базах:
+    основной тестовой и отдельной базе-"реплике" с другими данными,
+    чтобы было видно, откуда прочитан каждый ответ.
+    """
+
+    @classmethod
+    def setUpClass(cls) :
+        # Алиас 'replica' добавляется только на время этих тестов,
+        # поэтому и в databases он попадает здесь, а не в атрибуте класса
+        default = connections.settings['default']
+        name = f'{default["NAME"]}_replica'
+        connections.settings['replica'] = {
+            **default, 'NAME' : name, 'TEST' : {**default['TEST'], 'NAME' : name, 'MIRROR' : None},
+        }
+        connections['replica'].creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        cls.databases = {'default', 'replica'}
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls) :
+        super().tearDownClass()
+        connections['replica'].creation.destroy_test_db(verbosity=0)
+        del connections['replica']
+        del connections.settings['replica']
+
+    def setUp(self) :
+        caches['default'].clear()
+        for database, name in (('default', 'Основная'), ('replica', 'Реплика')) :
+            category = Category.objects.using(database).create(name="Посуда")
+            Product.objects.using(database).create(name=name, category=category, price=100, stock=5)
+        self.user = User.objects.create_user(username='buyer', password='password123')
+
+    def test_catalog_reads_from_replica(self) :
+        response = self.client.get(reverse('store:product_list'))
+        self.assertContains(response, 'Реплика')
+        self.assertNotContains(response, 'Основная')
+
+    def test_write_pins_user_to_primary(self) :
+        """
+        После записи (добавление в корзину) пользователь на время
+        читает с основной БД и видит свои изменения.
+        """
+        self.client.force_login(self.user)
+        product = Product.objects.get()
+        response = self.client.post(reverse('store:add_to_cart', args=[product.pk]), {'quantity' : 1})
+        self.assertIn(PIN_COOKIE, response.cookies)
+
+        response = self.client.get(reverse('store:product_list'))
+        self.assertContains(response, 'Основная')
+        self.assertNotContains(response, 'Реплика')
+
+    def test_locks_and_transactions_stay_on_primary(self) :
+        with use_replica() :
+            self.assertEqual(Product.objects.all().db, 'replica')
+            self.assertEqual(Product.objects.select_for_update().db, 'default')
+            with transaction.atomic() :
+                self.assertEqual(Product.objects.all().db, 'default')
+        self.assertEqual(Product.objects.all().db, 'default')
+
+    def test_export_reads_from_replica(self) :
+        out = io.StringIO()
+        call_command('export_product_residue', format='json', stdout=out, stderr=io.StringIO())
+        self.assertEqual(json.loads(out.getvalue()), [{'name' : 'Реплика', 'stock' : 5}])
+
+
+def _png(width=800, height=600) :
+    """
+    PNG с прозрачностью - как загрузка через админку.
+    """
+    buffer = io.BytesIO()
+    Image.new('RGBA', (width, height), (200, 50, 50, 128)).save(buffer, 'PNG')
+    return SimpleUploadedFile('photo.png', buffer.getvalue(), content_type='image/png')
+
+
+class ThumbnailTests(TestCase) :
+    """
+    Тестирование миниатюр изображений товаров (store/thumbnails.py).
+    """
+
+    def setUp(self) :
+        caches['default'].clear()
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=tmpdir.name))
+        self.category = Category.objects.create(name="Посуда")
+
+    def _create(self) :
+        return Product.objects.create(name="Чайник", category=self.category, price=900, stock=5, image=_png())
+
+    def _path(self, product, width, fmt) :
+        return os.path.join(
+            thumbnails.default_storage.location,
+            thumbnails.thumbnail_name(product.pk, product.image_hash, width, fmt),
+        )
+
+    def test_thumbnails_built_after_upload(self) :
+        """
+        После загрузки строятся все копии, меньшие изображения не увеличиваются,
+        JPEG получает белый фон вместо прозрачности.
+        """
+        with self.captureOnCommitCallbacks(execute=True) :
+            product = self._create()
+        self.assertEqual(len(product.image_hash), 16)
+
+        for width in (160, 320, 640, 1280) :
+            for fmt in ('webp', 'jpeg') :
+                self.assertTrue(os.path.exists(self._path(product, width, fmt)))
+        with Image.open(self._path(product, 320, 'jpeg')) as image :
+            self.assertEqual((image.format, image.mode, image.size), ('JPEG', 'RGB', (320, 240)))
+        with Image.open(self._path(product, 1280, 'webp')) as image :
+            self.assertEqual(image.size, (800, 600))
+
+    @override_settings(THUMBNAIL_ON_UPLOAD=False)
+    def test_missing_thumbnail_built_on_first_request(self) :
+        product = self._create()
+        url = thumbnails.thumbnail_url(product.pk, product.image_hash, 320, 'webp')
+        self.assertFalse(os.path.exists(self._path(product, 320, 'webp')))
+
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'image/webp')
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertTrue(os.path.exists(self._path(product, 320, 'webp')))
+
+        # Чужой хэш и размер не из THUMBNAIL_WIDTHS - 404
+        self.assertEqual(self.client.get(url.replace(product.image_hash, '0' * 16)).status_code, 404)
+        self.assertEqual(self.client.get(url.replace('-320.', '-321.')).status_code, 404)
+
+    def test_new_upload_changes_urls(self) :
+        product = self._create()
+        old_hash = product.image_hash
+        product.image = _png(400, 400)
+        product.save()
+        self.assertNotEqual(product.image_hash, old_hash)
+
+        product.image = None
+        product.save()
+        self.assertEqual(product.image_hash, '')
+
+    def test_templates_emit_srcset(self) :
+        product = self._create()
+        response = self.client.get(reverse('store:product_detail', args=[product.pk]))
+        self.assertContains(response, '<source type="image/webp"')
+        self.assertContains(response, thumbnails.thumbnail_url(product.pk, product.image_hash, 640, 'jpeg') + ' 640w')
+
+        response = self.client.get(reverse('store:product_list'))
+        self.assertContains(response, 'loading="lazy"')
+
+    def test_product_without_hash_shows_original(self) :
+        product = self._create()
+        Product.objects.filter(pk=product.pk).update(image_hash='')
+        response = self.client.get(reverse('store:product_list'))
+        self.assertContains(response, f'<img src="{product.image.url}"')
+
+
+class ThumbnailBackfillTests(TransactionTestCase) :
+    """
+    Тестирование команды build_thumbnails (процессы-воркеры не видят
+    незакоммиченных данных, поэтому TransactionTestCase).
+    """
+
+    def setUp(self) :
+        caches['default'].clear()
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=tmpdir.name, THUMBNAIL_ON_UPLOAD=False))
+        category = Category.objects.create(name="Посуда")
+        for i in range(3) :
+            Product.objects.create(name=f"Чашка {i}", category=category, price=100, stock=1, image=_png(300, 300))
+        Product.objects.create(name="Без фото", category=category, price=100, stock=1)
+        # Товары, загруженные до появления миниатюр
+        Product.objects.update(image_hash='')
+
+    def test_backfill_in_parallel(self) :
+        out = io.StringIO()
+        call_command('build_thumbnails', workers=2, stdout=out)
+        self.assertIn('обновлено хэшей: 3, ошибок: 0', out.getvalue())
+
+        for product in Product.objects.exclude(image='') :
+            self.assertEqual(len(product.image_hash), 16)
+            for fmt in ('webp', 'jpeg') :
+                name = thumbnails.thumbnail_name(product.pk, product.image_hash, 160, fmt)
+                self.assertTrue(thumbnails.default_storage.exists(name))
+
+        # Повторный запуск ничего не перестраивает
+        out = io.StringIO()
+        call_command('build_thumbnails', workers=1, stdout=out)
+        self.assertIn('Новых копий: 0, обновлено хэшей: 0', out.getvalue())
+
+
+class FacetTests(TestCase) :
+    """
+    Тестирование сводок категорий (store/facets.py) и фильтров каталога.
+    """
+
+    def setUp(self) :
+        caches['default'].clear()
+        self.dishes = Category.objects.create(name="Посуда")
+        self.clothes = Category.objects.create(name="Одежда")
+        with self.captureOnCommitCallbacks(execute=True) :
+            self.kettle = Product.objects.create(name="Чайник", category=self.dishes, price=900, stock=2)
+            self.cup = Product.objects.create(name="Чашка", category=self.dishes, price=150, stock=0)
+            self.shirt = Product.objects.create(name="Футболка", category=self.clothes, price=500, stock=3)
+
+    def _facet(self, category) :
+        facet = CategoryFacet.objects.get(pk=category.pk)
+        return facet.product_count, facet.in_stock_count, facet.min_price, facet.max_price
+
+    def test_signals_keep_facets_up_to_date(self) :
+        self.assertEqual(self._facet(self.dishes), (2, 1, Decimal('150.00'), Decimal('900.00')))
+
+        # Перенос в другую категорию пересчитывает обе
+        with self.captureOnCommitCallbacks(execute=True) :
+            self.kettle.category = self.clothes
+            self.kettle.save()
+        self.assertEqual(self._facet(self.dishes), (1, 0, Decimal('150.00'), Decimal('150.00')))
+        self.assertEqual(self._facet(self.clothes), (2, 2, Decimal('500.00'), Decimal('900.00')))
+
+        with self.captureOnCommitCallbacks(execute=True) :
+            self.cup.delete()
+        self.assertEqual(self._facet(self.dishes), (0, 0, None, None))
+
+    def test_save_applies_deltas_without_reading_category(self) :
+        """
+        Правка товара меняет сводку на разницу: товары категории
+        перечитываются, только если ушла граничная цена.
+        """
+        with CaptureQueriesContext(connection) as queries :
+            with self.captureOnCommitCallbacks(execute=True) :
+                self.cup.stock = 5
+                self.cup.save()
+        facet_queries = [q['sql'] for q in queries if 'store_categoryfacet' in q['sql']]
+        self.assertEqual(len(facet_queries), 1)
+        self.assertNotIn('store_product', facet_queries[0])
+        self.assertEqual(self._facet(self.dishes), (2, 2, Decimal('150.00'), Decimal('900.00')))
+
+        # Ушла граничная цена 150 - диапазон перечитывается
+        with self.captureOnCommitCallbacks(execute=True) :
+            self.cup.price = 200
+            self.cup.save()
+        self.assertEqual(self._facet(self.dishes), (2, 2, Decimal('200.00'), Decimal('900.00')))
+
+        with self.captureOnCommitCallbacks(execute=True) :
+            self.kettle.price = 100
+            self.kettle.stock = 0
+            self.kettle.save()
+        self.assertEqual(self._facet(self.dishes), (2, 1, Decimal('100.00'), Decimal('200.00')))
+
+    def test_checkout_marks_sold_out(self) :
+        user = User.objects.create_user(username='buyer', password='password123')
+        cart = Cart.objects.create(user=user)
+        CartItem.objects.create(cart=cart, product=self.kettle, quantity=2)
+        place_order(Order(user=user, full_name='Тест', address='Адрес', phone='123'), cart)
+        self.assertEqual(self._facet(self.dishes)[:2], (2, 0))
+
+    def test_import_refreshes_touched_categories(self) :
+        with tempfile.TemporaryDirectory() as tmpdir :
+            path = os.path.join(tmpdir, 'goods.jsonl')
+            with open(path, 'w', encoding='utf-8') as f :
+                f.write(json.dumps({'name' : 'Чайник', 'price' : '950', 'stock' : 0, 'category' : 'Одежда'}) + '\n')
+                f.write(json.dumps({'name' : 'Кепка', 'price' : '300', 'stock' : 4, 'category' : 'Шапки'}) + '\n')
+            call_command('load_goods', path, stdout=io.StringIO())
+
+        self.assertEqual(self._facet(self.dishes), (1, 0, Decimal('150.00'), Decimal('150.00')))
+        self.assertEqual(self._facet(self.clothes), (2, 1, Decimal('500.00'), Decimal('950.00')))
+        self.assertEqual(self._facet(Category.objects.get(name='Шапки'))[:2], (1, 1))
+
+    def test_rebuild_fixes_drift(self) :
+        # UPDATE в обход сигналов
+        Product.objects.update(stock=0)
+        out = io.StringIO()
+        call_command('rebuild_facets', stdout=out)
+        self.assertIn('исправлено: 2', out.getvalue())
+        self.assertEqual(self._facet(self.clothes)[:2], (1, 0))
+
+    def test_catalog_filters(self) :
+        url = reverse('store:product_list')
+        response = self.client.get(url, {'category' : self.dishes.pk, 'in_stock' : '1'})
+        self.assertEqual([p.name for p in response.context['products']], ["Чайник"])
+        self.assertEqual(response.context['selected_category'].pk, self.dishes.pk)
+        self.assertEqual(response.context['price_range'], (Decimal('150.00'), Decimal('900.00')))
+        self.assertEqual([f.category.name for f in response.context['facets']], ["Одежда", "Посуда"])
+
+        response = self.client.get(url, {'min_price' : '200', 'max_price' : '600'})
+        self.assertEqual([p.name for p in response.context['products']], ["Футболка"])
+        self.assertContains(response, f'category={self.dishes.pk}&amp;min_price=200&amp;max_price=600')
+
+        # Неверные значения фильтров игнорируются
+        response = self.client.get(url, {'min_price' : 'дешево', 'category' : 'x'})
+        self.assertEqual(len(response.context['products']), 3)
+
+    def test_filters_cost_does_not_depend_on_catalog_size(self) :
+        """
+        Фильтры строятся по строке на категорию: каталог - все те же
+        три запроса, сколько бы товаров ни было.
+        """
+        with self.captureOnCommitCallbacks(execute=True) :
+            for i in range(20) :
+                Product.objects.create(name=f"Тарелка {i}", category=self.dishes, price=100 + i, stock=1)
+        with self.assertNumQueries(3) :
+            response = self.client.get(reverse('store:product_list'))
+        self.assertEqual(response.context['facets'][1].product_count, 22)
+
+
+class ConditionalGetTests(TestCase) :
+    """
+    Тестирование условных GET-запросов и Cache-Control страниц каталога
+    (store/conditional.py).
+    """
+
+    def setUp(self) :
+        caches['default'].clear()
+        self.category = Category.objects.create(name="Посуда")
+        with self.captureOnCommitCallbacks(execute=True) :
+            self.product = Product.objects.create(name="Чайник", category=self.category, price=900, stock=5)
+        self.list_url = reverse('store:product_list')
+        self.detail_url = reverse('store:product_detail', args=[self.product.pk])
+
+    def test_catalog_not_modified(self) :
+        """
+        Повторный запрос с актуальным ETag - 304 без запроса товаров
+        и без рендеринга: только сводки и MAX(updated_at).
+        """
+        response = self.client.get(self.list_url)
+        etag = response['ETag']
+        self.assertTrue(etag.startswith('W/"'))
+        self.assertIn('Last-Modified', response)
+        self.assertIn('public', response['Cache-Control'])
+        self.assertIn('max-age=60', response['Cache-Control'])
+
+        with self.assertNumQueries(2) :
+            response = self.client.get(self.list_url, headers={'if-none-match' : etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        self.assertIn('public', response['Cache-Control'])
+
+        # Для роботов без ETag - по дате изменения
+        response = self.client.get(self.list_url, headers={'if-modified-since' : response['Last-Modified']})
+        self.assertEqual(response.status_code, 304)
+
+        # Изменение цены - новая версия страницы
+        with self.captureOnCommitCallbacks(execute=True) :
+            self.product.price = 950
+            self.product.save()
+        response = self.client.get(self.list_url, headers={'if-none-match' : etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_personal_pages_are_private(self) :
+        """
+        С корзиной или после входа страница только для браузера,
+        а ETag учитывает итоги корзины в шапке.
+        """
+        self.client.post(reverse('store:add_to_cart', args=[self.product.pk]), {'quantity' : 1})
+        response = self.client.get(self.list_url)
+        self.assertIn('private', response['Cache-Control'])
+        self.assertNotIn('Last-Modified', response)
+
+        user = User.objects.create_user(username='buyer', password='password123')
+        self.client.force_login(user)
+        response = self.client.get(self.list_url)
+        etag = response['ETag']
+        self.assertIn('private', response['Cache-Control'])
+        self.assertEqual(self.client.get(self.list_url, headers={'if-none-match' : etag}).status_code, 304)
+
+        carts.add_item(Cart.objects.create(user=user), self.product, 2)
+        self.assertEqual(self.client.get(self.list_url, headers={'if-none-match' : etag}).status_code, 200)
+
+    def test_product_detail_not_modified(self) :
+        response = self.client.get(self.detail_url)
+        etag = response['ETag']
+        self.assertIn('no-cache', response['Cache-Control'])
+        self.assertEqual(self.client.get(self.detail_url, headers={'if-none-match' : etag}).status_code, 304)
+
+        # Заказ списывает остаток UPDATE-ом в обход сигналов и кэша карточек
+        Product.objects.filter(pk=self.product.pk).update(stock=4, updated_at=datetime.now(dt_timezone.utc))
+        response = self.client.get(self.detail_url, headers={'if-none-match' : etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['product'].stock, 4)
+
+        # Изменение категории тоже меняет версию карточки
+        etag = response['ETag']
+        self.category.description = "Новое описание"
+        with self.captureOnCommitCallbacks(execute=True) :
+            self.category.save()
+        self.assertEqual(self.client.get(self.detail_url, headers={'if-none-match' : etag}).status_code, 200)
+
+
+class HoldTests(TestCase) :
+    """
+    Тестирование резервирования товара корзинами (store.holds).
+    """
+
+    def setUp(self) :
+        caches['default'].clear()
+        category = Category.objects.create(name="Категория")
+        self.product = Product.objects.create(name="Чайник", category=category, price=900, stock=5)
+        self.user = User.objects.create_user(username='buyer', password='password123')
+        self.cart = Cart.objects.create(user=self.user)
+
+    def _product(self) :
+        self.product.refresh_from_db()
+        return self.product
+
+    def _order(self) :
+        return Order(user=self.user, full_name='Тест', address='Адрес', phone='123')
+
+    def _expire(self) :
+        self.cart.items.update(held_until=datetime(2000, 1, 1, tzinfo=dt_timezone.utc))
+
+    def test_add_reserves(self) :
+        """
+        Позиция корзины резервирует товар: свободный остаток уменьшается,
+        лишнее сверх него не добавляется ни в одну корзину.
+        """
+        carts.add_item(self.cart, self.product, 3)
+        self.assertEqual((self._product().stock, self.product.reserved, self.product.available), (5, 3, 2))
+        self.assertIsNotNone(self.cart.items.get().held_until)
+
+        other = Cart.objects.create(user=User.objects.create_user(username='other'))
+        with self.assertRaises(holds.NotEnoughStock) as cm :
+            carts.add_item(other, self.product, 3)
+        self.assertEqual(cm.exception.available, 2)
+        self.assertFalse(other.items.exists())
+        self.assertEqual(self._product().reserved, 3)
+
+    def test_add_view_rejects_reserved(self) :
+        carts.add_item(Cart.objects.create(user=User.objects.create_user(username='other')), self.product, 4)
+        self.client.force_login(self.user)
+        response = self.client.post(reverse('store:add_to_cart', args=[self.product.pk]), {'quantity' : 2}, follow=True)
+        self.assertIn("доступно: 1", [str(m) for m in response.context['messages']][0])
+        self.assertContains(response, "доступно к заказу: 1 шт.")
+        self.assertFalse(self.cart.items.exists())
+
+    def test_remove_releases(self) :
+        carts.add_item(self.cart, self.product, 3)
+        carts.remove_item(self.cart, self.product.pk)
+        self.assertEqual(self._product().reserved, 0)
+
+    def test_deleted_cart_releases(self) :
+        carts.add_item(self.cart, self.product, 3)
+        self.user.delete()
+        self.assertEqual(self._product().reserved, 0)
+
+    def test_reap_expired(self) :
+        """
+        Истекшие резервы снимаются, позиции остаются в корзине;
+        свежие не трогаются.
+        """
+        carts.add_item(self.cart, self.product, 2)
+        self.assertEqual(holds.reap(), 0)
+        self._expire()
+
+        out = io.StringIO()
+        call_command('reap_holds', batch_size=1, stdout=out)
+        self.assertIn('Снято резервов: 1', out.getvalue())
+        self.assertEqual(self._product().reserved, 0)
+        self.assertEqual(self.cart.items.get().held_until, None)
+
+        # Повторное добавление резервирует всю позицию заново
+        carts.add_item(self.cart, self.product, 1)
+        self.assertEqual(self._product().reserved, 3)
+
+    def test_checkout_converts_holds(self) :
+        """
+        Заказ списывает и остаток, и резерв - без повторной проверки.
+        """
+        carts.add_item(self.cart, self.product, 3)
+        with self.assertNumQueries(9) :
+            place_order(self._order(), self.cart)
+        self.assertEqual((self._product().stock, self.product.reserved), (2, 0))
+
+    def test_checkout_after_expiry(self) :
+        """
+        Позиция со снятым резервом проверяется по свободному остатку.
+        """
+        carts.add_item(self.cart, self.product, 3)
+        self._expire()
+        holds.reap()
+        other = Cart.objects.create(user=User.objects.create_user(username='other'))
+        carts.add_item(other, self.product, 4)
+
+        with self.assertRaises(OutOfStock) :
+            place_order(self._order(), self.cart)
+        self.assertEqual((self._product().stock, self.product.reserved), (5, 4))
+
+        carts.remove_item(other, self.product.pk)
+        place_order(self._order(), self.cart)
+        self.assertEqual((self._product().stock, self.product.reserved), (2, 0))
+
+    def test_merge_caps_at_available(self) :
+        carts.add_item(Cart.objects.create(user=User.objects.create_user(username='other')), self.product, 2)
+        carts.add_item(self.cart, self.product, 1)
+        carts.merge_items(self.user, {self.product.pk : 10})
+        self.assertEqual(self.cart.items.get().quantity, 3)
+        self.assertEqual(self._product().reserved, 5)
+
+    def test_rebuild(self) :
+        carts.add_item(self.cart, self.product, 2)
+        Product.objects.filter(pk=self.product.pk).update(reserved=4)
+
+        out = io.StringIO()
+        call_command('reap_holds', rebuild=True, stdout=out)
+        self.assertIn('исправлено: 1', out.getvalue())
+        self.assertEqual(self._product().reserved, 2)
+        self.assertEqual(holds.rebuild(), 0)
+
+
+@skipUnlessDBFeature('has_select_for_update')
+class ConcurrentHoldTests(TransactionTestCase) :
+    """
+    Параллельные добавления в корзину не резервируют больше остатка.
+    """
+
+    buyers = 20
+    stock = 7
+
+    def test_parallel_reserves(self) :
+        category = Category.objects.create(name="Категория")
+        product = Product.objects.create(name="Дефицит", category=category, price=100, stock=self.stock)
+        carts_ = [Cart.objects.create(user=User.objects.create(username=f'buyer{i}')) for i in range(self.buyers)]
+        barrier = threading.Barrier(self.buyers)
+        results = []
+
+        def add(cart) :
+            try :
+                barrier.wait()
+                carts.add_item(cart, product, 1)
+                results.append('ok')
+            except holds.NotEnoughStock :
+                results.append('rejected')
+            finally :
+                connection.close()
+
+        threads = [threading.Thread(target=add, args=(cart,)) for cart in carts_]
+        for thread in threads :
+            thread.start()
+        for thread in threads :
+            thread.join()
+
+        product.refresh_from_db()
+        self.assertEqual((product.stock, product.reserved), (self.stock, self.stock))
+        self.assertEqual(results.count('ok'), self.stock)
+        self.assertEqual(CartItem.objects.count(), self.stock)
+
+
+class JobTests(TestCase) :
+    """
+    Тестирование очереди фоновых задач (store.jobs) и уведомлений о заказе.
+    """
+
+    def setUp(self) :
+        self.user = User.objects.create_user(username='buyer', email='buyer@example.com', password='password123')
+        category = Category.objects.create(name="Категория")
+        self.kettle = Product.objects.create(name="Чайник", category=category, price=900, stock=4)
+        self.cup = Product.objects.create(name="Чашка", category=category, price=150, stock=100)
+        self.cart = Cart.objects.create(user=self.user)
+        carts.add_item(self.cart, self.kettle, 2)
+        carts.add_item(self.cart, self.cup, 1)
+
+    def _order(self) :
+        return Order(user=self.user, full_name='Тест Тестов', address='Адрес', phone='123')
+
+    @override_settings(LOW_STOCK_THRESHOLD=3, LOW_STOCK_RECIPIENTS=['manager@example.com'])
+    def test_checkout_notifications(self) :
+        """
+        Заказ ставит задачи только после коммита; письма отправляют воркеры.
+        """
+        with self.captureOnCommitCallbacks() as callbacks :
+            order = place_order(self._order(), self.cart)
+        self.assertFalse(Job.objects.exists())
+        for callback in callbacks :
+            callback()
+        self.assertEqual(
+            sorted(Job.objects.values_list('name', flat=True)), ['low_stock', 'order_confirmation']
+        )
+        self.assertEqual(mail.outbox, [])
+
+        out = io.StringIO()
+        call_command('run_workers', workers=1, once=True, stdout=out)
+        self.assertIn('Выполнено задач: 2', out.getvalue())
+        self.assertFalse(Job.objects.exclude(status=Job.DONE).exists())
+
+        by_recipient = {message.to[0] : message for message in mail.outbox}
+        self.assertIn(f"№{order.pk}", by_recipient['buyer@example.com'].subject)
+        self.assertIn("Чайник - 2 шт.", by_recipient['buyer@example.com'].body)
+        self.assertIn("Итого: 1950", by_recipient['buyer@example.com'].body)
+        self.assertIn("Чайник - 2 шт.", by_recipient['manager@example.com'].body)
+        self.assertNotIn("Чашка", by_recipient['manager@example.com'].body)
+
+    def test_failed_checkout_enqueues_nothing(self) :
+        Product.objects.filter(pk=self.kettle.pk).update(stock=1)
+        CartItem.objects.filter(product=self.kettle).update(held_until=None)
+        with self.captureOnCommitCallbacks() as callbacks :
+            with self.assertRaises(OutOfStock) :
+                place_order(self._order(), self.cart)
+        self.assertEqual(callbacks, [])
+
+    def test_retry_with_backoff(self) :
+        """
+        После ошибки задача ждет паузу и повторяется,
+        после max_attempts попыток - остается с ошибкой.
+        """
+        failing = mock.Mock(side_effect=ConnectionError("SMTP недоступен"))
+        with mock.patch.dict(jobs.HANDLERS, {'flaky' : failing}), self.assertLogs('store.jobs') as logs :
+            job = Job.objects.create(name='flaky', payload={'x' : 1}, max_attempts=2)
+            self.assertEqual(jobs.work_once(), 1)
+            job.refresh_from_db()
+            self.assertEqual((job.status, job.attempts), (Job.QUEUED, 1))
+            self.assertGreater(job.run_at, job.started_at)
+            self.assertEqual(jobs.work_once(), 0)  # пауза еще не прошла
+
+            Job.objects.filter(pk=job.pk).update(run_at=job.started_at)
+            self.assertEqual(jobs.work_once(), 1)
+        self.assertEqual([record.levelname for record in logs.records], ['WARNING', 'ERROR'])
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.FAILED, 2))
+        self.assertIn("SMTP недоступен", job.last_error)
+        failing.assert_called_with(x=1)
+
+    def test_unknown_job_fails(self) :
+        job = Job.objects.create(name='missing')
+        with self.assertLogs('store.jobs', 'ERROR') :
+            jobs.work_once()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.FAILED, 1))
+
+    @override_settings(JOB_TIMEOUT=60)
+    def test_requeue_stale(self) :
+        started = datetime(2000, 1, 1, tzinfo=dt_timezone.utc)
+        stale = Job.objects.create(name='x', status=Job.RUNNING, started_at=started)
+        Job.objects.create(name='x', status=Job.RUNNING, started_at=datetime.now(dt_timezone.utc))
+        self.assertEqual(jobs.requeue_stale(), 1)
+        stale.refresh_from_db()
+        self.assertEqual(stale.status, Job.QUEUED)
+
+
+    @override_settings(JOB_RETENTION_DAYS=7)
+    def test_purge_done_jobs(self) :
+        """
+        Выполненные задачи старше срока хранения удаляются пакетами;
+        свежие, ожидающие и неудачные остаются.
+        """
+        old = datetime(2000, 1, 1, tzinfo=dt_timezone.utc)
+        Job.objects.bulk_create(Job(name='x', status=Job.DONE, finished_at=old) for _ in range(5))
+        Job.objects.create(name='x', status=Job.FAILED, finished_at=old)
+        Job.objects.create(name='x', status=Job.DONE, finished_at=datetime.now(dt_timezone.utc))
+        Job.objects.create(name='x')
+        self.assertEqual(jobs.purge(batch_size=2), 5)
+        self.assertEqual(Job.objects.count(), 3)
+
+        Job.objects.create(name='x', status=Job.DONE, finished_at=old)
+        out = io.StringIO()
+        call_command('run_workers', '--purge', stdout=out)
+        self.assertIn('Удалено выполненных задач: 1', out.getvalue())
+
+
+class JobWorkerPoolTests(TransactionTestCase) :
+    """
+    Несколько воркеров выполняют каждую задачу ровно один раз.
+    """
+
+    def test_thread_pool(self) :
+        done, lock = [], threading.Lock()
+
+        def record(n) :
+            with lock :
+                done.append(n)
+
+        Job.objects.bulk_create(Job(name='record', payload={'n' : n}) for n in range(40))
+        with mock.patch.dict(jobs.HANDLERS, {'record' : record}) :
+            out = io.StringIO()
+            call_command('run_workers', workers=4, batch_size=3, once=True, stdout=out)
+
+        self.assertEqual(sorted(done), list(range(40)))
+        self.assertIn('Выполнено задач: 40, с ошибкой: 0. В очереди: 0.', out.getvalue())
+        self.assertEqual(Job.objects.filter(status=Job.DONE).count(), 40)
+
+
+class AnalyticsTests(TestCase) :
+    """
+    Тестирование отчетов о продажах (store.analytics) и дневной сводки.
+    """
+
+    def setUp(self) :
+        dishes = Category.objects.create(name="Посуда")
+        clothes = Category.objects.create(name="Одежда")
+        self.kettle = Product.objects.create(name="Чайник", category=dishes, price=900, stock=6)
+        self.cup = Product.objects.create(name="Чашка", category=dishes, price=150, stock=0)
+        self.shirt = Product.objects.create(name="Футболка", category=clothes, price=500, stock=10)
+        self.today = timezone.localdate()
+        self.yesterday = self.today - timedelta(days=1)
+
+        self._order(self.yesterday, (self.kettle, 900, 2), (self.cup, 150, 4))
+        self._order(self.yesterday, (self.kettle, 800, 1))
+        self._order(self.today, (self.shirt, 500, 3))
+        self._order(self.today, (self.shirt, 500, 100), status='cancelled')
+
+    def _order(self, day, *lines, status='pending') :
+        order = Order.objects.create(full_name='Тест', address='Адрес', phone='1', status=status)
+        moment = timezone.make_aware(datetime.combine(day, datetime.min.time().replace(hour=12)))
+        Order.objects.filter(pk=order.pk).update(created_at=moment)
+        for product, price, quantity in lines :
+            OrderItem.objects.create(order=order, product=product, price=price, quantity=quantity)
+        return order
+
+    def test_report(self) :
+        """
+        Выручка - SUM(price * quantity) по позициям, без отмененных заказов.
+        """
+        self.assertEqual(analytics.rollup(), 3)
+        data = analytics.report(self.yesterday, self.today)
+
+        self.assertEqual(data['totals'], {'units' : 10, 'revenue' : Decimal("4700.00")})
+        self.assertEqual(
+            [(row['date'], row['units'], row['revenue']) for row in data['days']],
+            [(self.yesterday, 7, Decimal("3200.00")), (self.today, 3, Decimal("1500.00"))]
+        )
+        self.assertEqual(
+            [(row['name'], row['units'], row['revenue']) for row in data['categories']],
+            [("Посуда", 7, Decimal("3200.00")), ("Одежда", 3, Decimal("1500.00"))]
+        )
+        products = {row['name'] : row for row in data['products']}
+        self.assertEqual(list(products), ["Чайник", "Футболка", "Чашка"])
+        # Продано 3 при остатке 6: средний запас (9 + 6) / 2 = 7.5
+        self.assertAlmostEqual(products["Чайник"]['turnover'], 3 / 7.5)
+        self.assertAlmostEqual(products["Чашка"]['turnover'], 2.0)
+
+    def test_incremental_rollup(self) :
+        """
+        Повторная сводка пересчитывает только последний свернутый день;
+        прошлые дни - по запросу (since).
+        """
+        analytics.rollup()
+        old = self._order(self.yesterday, (self.cup, 150, 1))
+        self._order(self.today, (self.kettle, 900, 1))
+
+        self.assertEqual(analytics.rollup(), 2)
+        self.assertEqual(analytics.totals(self.yesterday, self.yesterday)['units'], 7)
+        self.assertEqual(analytics.totals(self.today, self.today)['units'], 4)
+
+        analytics.rollup(since=self.yesterday)
+        self.assertEqual(analytics.totals(self.yesterday, self.yesterday)['units'], 8)
+
+        Order.objects.filter(pk=old.pk).update(status='cancelled')
+        # Несколько пакетов INSERT
+        with mock.patch.object(analytics, 'ROLLUP_BATCH_SIZE', 3) :
+            self.assertEqual(analytics.rollup(full=True), 4)
+        self.assertEqual(analytics.totals(self.yesterday, self.today)['units'], 11)
+        self.assertEqual(DailySales.objects.count(), 4)
+
+    def test_command_and_export(self) :
+        with tempfile.TemporaryDirectory() as tmp :
+            path = os.path.join(tmp, 'sales.csv')
+            out = io.StringIO()
+            call_command('analytics', '--start', self.yesterday.isoformat(), '--export', path, stdout=out)
+            with open(path, encoding='utf-8') as f :
+                lines = f.read().splitlines()
+
+        self.assertIn('Продано: 10 шт., выручка: 4700.00', out.getvalue())
+        self.assertIn('Выгружено строк: 3', out.getvalue())
+        self.assertEqual(lines[0], 'date,product_id,product__name,category__name,units,revenue')
+        self.assertEqual(len(lines), 4)
+
+    def test_staff_view(self) :
+        url = reverse('store:sales_analytics')
+        user = User.objects.create_user(username='buyer', password='password123')
+        self.client.force_login(user)
+        self.assertEqual(self.client.get(url).status_code, 302)
+
+        user.is_staff = True
+        user.save()
+        # Страница только читает сводку - до ее пополнения продаж нет
+        response = self.client.get(url, {'start' : self.today.isoformat()})
+        self.assertIsNone(response.context['totals']['revenue'])
+        self.assertFalse(DailySales.objects.exists())
+
+        call_command('analytics', '--rollup', stdout=io.StringIO())
+        response = self.client.get(url, {'start' : self.today.isoformat()})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['totals']['revenue'], Decimal("1500.00"))
+        self.assertContains(response, "Футболка")
+        self.assertNotContains(response, "Чайник")
+
+    def test_staff_view_end_only(self) :
+        """
+        Без начала периода отчет - за 30 дней до указанного конца.
+        """
+        user = User.objects.create_user(username='staff', password='password123', is_staff=True)
+        self.client.force_login(user)
+        call_command('analytics', '--rollup', stdout=io.StringIO())
+        response = self.client.get(reverse('store:sales_analytics'), {'end' : self.yesterday.isoformat()})
+        self.assertEqual(response.context['start'], self.yesterday - timedelta(days=29))
+        self.assertEqual(response.context['end'], self.yesterday)
+        self.assertEqual(response.context['totals']['units'], 7)
+
+
+class AdminListTests(TestCase) :
+    """
+    Тестирование списков админки на больших таблицах.
+    """
+
+    def setUp(self) :
+        self.admin = User.objects.create_superuser(username='admin', password='password123')
+        self.client.force_login(self.admin)
+        category = Category.objects.create(name="Категория")
+        for i, price in enumerate((100, 600, 900, 2000, 20000)) :
+            Product.objects.create(name=f"Товар {i}", category=category, price=price, stock=1)
+
+    def _orders(self, count) :
+        users = User.objects.bulk_create(User(username=f'buyer{i}-{count}') for i in range(count))
+        Order.objects.bulk_create(
+            Order(user=user, full_name='Тест', address='Адрес', phone='1') for user in users
+        )
+
+    def test_changelist_queries_do_not_grow(self) :
+        """
+        Пользователь заказа читается JOIN-ом: число запросов
+        не зависит от числа строк на странице.
+        """
+        url = reverse('admin:store_order_changelist')
+        self.client.get(url)  # тема admin_interface попадает в кэш
+        self._orders(2)
+        with CaptureQueriesContext(connection) as few :
+            self.client.get(url)
+        self._orders(20)
+        with CaptureQueriesContext(connection) as many :
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(few), len(many))
+
+    def test_price_range_filter(self) :
+        url = reverse('admin:store_product_changelist')
+        response = self.client.get(url, {'price_range' : '500-1000'})
+        self.assertEqual(
+            sorted(product.name for product in response.context['cl'].result_list), ["Товар 1", "Товар 2"]
+        )
+        response = self.client.get(url, {'price_range' : '10000-'})
+        self.assertEqual([product.name for product in response.context['cl'].result_list], ["Товар 4"])
+        self.assertContains(response, 'до 500')
+
+    def test_estimated_count(self) :
+        """
+        Выше порога число записей - оценка PostgreSQL, ниже - точный COUNT(*).
+        """
+        with connection.cursor() as cursor :
+            cursor.execute('ANALYZE store_product')
+        products = Product.objects.order_by('name')
+        self.assertEqual(estimate_count(products), 5)
+        self.assertGreaterEqual(estimate_count(products.filter(price__gte=1000)), 1)
+
+        with override_settings(ADMIN_ESTIMATED_COUNT_THRESHOLD=1) :
+            Product.objects.filter(price__gte=1000).delete()
+            # Оценка не знает об удалении до следующего ANALYZE
+            self.assertEqual(EstimatedCountPaginator(products, 2).count, 5)
+        self.assertEqual(EstimatedCountPaginator(products, 2).count, 3)
+
+
+class BulkTests(TestCase) :
+    """
+    Тестирование массовых изменений товаров (store/bulk.py).
+    """
+
+    def setUp(self) :
+        self.clothes = Category.objects.create(name="Одежда")
+        self.shoes = Category.objects.create(name="Обувь")
+        self.shirt = Product.objects.create(name="Рубашка", category=self.clothes, price=Decimal('1000.00'), stock=5)
+        self.coat = Product.objects.create(name="Пальто", category=self.clothes, price=Decimal('3333.33'), stock=2)
+        self.boots = Product.objects.create(name="Ботинки", category=self.shoes, price=Decimal('500.00'), stock=7)
+        self.user = User.objects.create_user(username='buyer', password='password123')
+        cart = Cart.objects.create(user=self.user)
+        carts.add_item(cart, self.shirt, 2)
+
+    def _csv(self, text) :
+        return io.StringIO(text)
+
+    def test_reprice_dry_run_changes_nothing(self) :
+        result = bulk.reprice(Product.objects.filter(category=self.clothes), 10, dry_run=True)
+        self.assertEqual(result.count, 2)
+        self.assertEqual(
+            [(change.name, change.old, change.new) for change in result.preview],
+            [("Пальто", Decimal('3333.33'), Decimal('3666.66')), ("Рубашка", Decimal('1000.00'), Decimal('1100.00'))],
+        )
+        self.shirt.refresh_from_db()
+        self.assertEqual(self.shirt.price, Decimal('1000.00'))
+
+    def test_reprice_updates_prices_facets_and_carts(self) :
+        updated_at = self.shirt.updated_at
+        product_cache.get_product(self.shirt.pk)
+        with self.captureOnCommitCallbacks(execute=True) :
+            result = bulk.reprice(Product.objects.filter(category=self.clothes), Decimal('-10'))
+        self.assertEqual(result.count, 2)
+        self.shirt.refresh_from_db()
+        self.coat.refresh_from_db()
+        self.boots.refresh_from_db()
+        self.assertEqual(self.shirt.price, Decimal('900.00'))
+        self.assertEqual(self.coat.price, Decimal('3000.00'))
+        self.assertEqual(self.boots.price, Decimal('500.00'))
+        self.assertGreater(self.shirt.updated_at, updated_at)
+        self.assertEqual(product_cache.get_product(self.shirt.pk).price, Decimal('900.00'))
+
+        facet = CategoryFacet.objects.get(category=self.clothes)
+        self.assertEqual((facet.min_price, facet.max_price), (Decimal('900.00'), Decimal('3000.00')))
+        self.assertEqual(Cart.objects.get(user=self.user).total, Decimal('1800.00'))
+
+    def test_reprice_rejects_full_discount(self) :
+        with self.assertRaises(bulk.BulkError) :
+            bulk.reprice(Product.objects.all(), -100)
+
+    def test_stock_from_csv(self) :
+        key, values = bulk.read_stock_csv(self._csv("name,stock\nРубашка,10\nБотинки,7\nШляпа,3\n"))
+        result = bulk.update_stock(key, values)
+        # Ботинки не изменились, шляпы нет в каталоге
+        self.assertEqual(result.count, 1)
+        self.assertEqual(result.unknown, ["Шляпа"])
+        self.shirt.refresh_from_db()
+        self.assertEqual(self.shirt.stock, 10)
+
+        key, values = bulk.read_stock_csv(self._csv(f"id,stock\n{self.coat.pk},3\n{self.boots.pk},-10\n"))
+        bulk.update_stock(key, values, increment=True)
+        self.coat.refresh_from_db()
+        self.boots.refresh_from_db()
+        self.assertEqual((self.coat.stock, self.boots.stock), (5, 0))
+        self.assertEqual(CategoryFacet.objects.get(category=self.shoes).in_stock_count, 0)
+
+    def test_stock_csv_errors(self) :
+        with self.assertRaises(bulk.BulkError) :
+            bulk.read_stock_csv(self._csv("sku,stock\n1,2\n"))
+        with self.assertRaises(bulk.BulkError) :
+            bulk.read_stock_csv(self._csv("name,stock\nРубашка,много\n"))
+        with self.assertRaises(bulk.BulkError) :
+            bulk.update_stock('name', {"Рубашка" : -1})
+
+    def test_move_to_category(self) :
+        result = bulk.move_to_category(Product.objects.filter(pk__in=[self.coat.pk, self.boots.pk]), self.shoes)
+        # Ботинки уже в категории "Обувь"
+        self.assertEqual(result.count, 1)
+        self.coat.refresh_from_db()
+        self.assertEqual(self.coat.category, self.shoes)
+        self.assertEqual(CategoryFacet.objects.get(category=self.shoes).product_count, 2)
+        self.assertEqual(CategoryFacet.objects.get(category=self.clothes).product_count, 1)
+
+    def test_command(self) :
+        out = io.StringIO()
+        call_command('bulk_products', 'reprice', '--percent', '20', '--category', 'Обувь', '--dry-run', stdout=out)
+        self.assertIn('Ботинки: 500.00 -> 600.00', out.getvalue())
+        self.boots.refresh_from_db()
+        self.assertEqual(self.boots.price, Decimal('500.00'))
+
+        call_command('bulk_products', 'move', '--to', 'Распродажа', '--ids', str(self.shirt.pk), stdout=io.StringIO())
+        self.shirt.refresh_from_db()
+        self.assertEqual(self.shirt.category.name, "Распродажа")
+
+        with self.assertRaises(CommandError) :
+            call_command('bulk_products', 'reprice', '--percent', '5', '--category', 'Нет такой')
+
+    def test_admin_action_preview_and_apply(self) :
+        admin = User.objects.create_superuser(username='admin', password='password123')
+        self.client.force_login(admin)
+        url = reverse('admin:store_product_changelist')
+        data = {
+            'action' : 'reprice_products',
+            'index' : 0,
+            '_selected_action' : [self.shirt.pk, self.boots.pk],
+        }
+        response = self.client.post(url, data)
+        self.assertTemplateUsed(response, 'admin/store/product/bulk_action.html')
+
+        response = self.client.post(url, {**data, 'percent' : '50', 'bulk_step' : 'preview'})
+        self.assertEqual(response.context['result'].count, 2)
+        self.assertContains(response, '1500,00')
+        self.shirt.refresh_from_db()
+        self.assertEqual(self.shirt.price, Decimal('1000.00'))
+
+        response = self.client.post(url, {**data, 'percent' : '50', 'bulk_step' : 'apply'})
+        self.assertRedirects(response, url)
+        self.shirt.refresh_from_db()
+        self.assertEqual(self.shirt.price, Decimal('1500.00'))
+
+    def test_admin_stock_upload(self) :
+        admin = User.objects.create_superuser(username='admin', password='password123')
+        self.client.force_login(admin)
+        url = reverse('admin:store_product_stock_upload')
+        self.assertContains(self.client.get(reverse('admin:store_product_changelist')), url)
+
+        def upload(step) :
+            csv_file = SimpleUploadedFile('stock.csv', "name,stock\nПальто,9\n".encode('utf-8'))
+            return self.client.post(url, {'csv_file' : csv_file, 'bulk_step' : step})
+
+        response = upload('preview')
+        self.assertEqual(response.context['result'].count, 1)
+        self.coat.refresh_from_db()
+        self.assertEqual(self.coat.stock, 2)
+
+        self.assertRedirects(upload('apply'), reverse('admin:store_product_changelist'))
+        self.coat.refresh_from_db()
+        self.assertEqual(self.coat.stock, 9)
+
+
+# Общий кэш - Redis в памяти процесса (fakeredis), перед ним L1
+FAKE_REDIS_CACHES = {
+    'shared' : {
+        'BACKEND' : 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION' : 'redis://localhost:6379/15',
+        'OPTIONS' : {'connection_class' : fakeredis.FakeConnection},
+    },
+    'default' : {
+        'BACKEND' : 'store.caching.TieredCache',
+        'LOCATION' : 'shared',
+        'OPTIONS' : {'MAX_ENTRIES' : 3, 'L1_TIMEOUT' : 5},
+    },
+}
+
+
+@override_settings(CACHES=FAKE_REDIS_CACHES, SESSION_ENGINE='django.contrib.sessions.backends.cached_db')
+class TieredCacheTests(TestCase) :
+    """
+    Тестирование двухуровневого кэша и версии каталога (store/caching.py).
+    """
+
+    def setUp(self) :
+        self.cache = caches['default']
+        self.shared = caches['shared']
+        self.cache.clear()
+
+    def test_l1_bounded_staleness(self) :
+        """
+        Изменение из другого процесса (прямо в L2) видно через L1_TIMEOUT секунд.
+        """
+        self.cache.set('key', 'old')
+        self.shared.set('key', 'new')
+        self.assertEqual(self.cache.get('key'), 'old')
+        with mock.patch('store.caching.time.monotonic', return_value=time.monotonic() + 6) :
+            self.assertEqual(self.cache.get('key'), 'new')
+
+    def test_writes_and_counters_reach_l2(self) :
+        self.cache.set('key', 'value')
+        self.assertEqual(self.shared.get('key'), 'value')
+        self.cache.delete('key')
+        self.assertIsNone(self.shared.get('key'))
+        self.assertIsNone(self.cache.get('key'))
+
+        self.cache.set('counter', 1)
+        self.shared.incr('counter')
+        # incr не читает L1 и сбрасывает его запись
+        self.assertEqual(self.cache.incr('counter'), 3)
+        self.assertEqual(self.cache.get('counter'), 3)
+
+    def test_l1_is_lru(self) :
+        for key in ('a', 'b', 'c') :
+            self.cache.set(key, key)
+        self.cache.get('a')
+        self.cache.set('d', 'd')
+        for key in ('a', 'b', 'c', 'd') :
+            self.shared.set(key, 'changed')
+        # 'b' вытеснен из L1 как самый давний и читается из L2
+        self.assertEqual(
+            self.cache.get_many(['a', 'b', 'c', 'd']),
+            {'a' : 'a', 'b' : 'changed', 'c' : 'c', 'd' : 'd'},
+        )
+
+    def test_catalog_version_resets_product_cards(self) :
+        category = Category.objects.create(name="Посуда")
+        product = Product.objects.create(name="Чайник", category=category, price=900, stock=5)
+        version = caching.catalog_version()
+        product_cache.get_product(product.pk)
+
+        category.name = "Кухня"
+        with self.captureOnCommitCallbacks(execute=True) :
+            category.save()
+        self.assertEqual(caching.catalog_version(), version + 1)
+        self.assertEqual(product_cache.get_product(product.pk).category.name, "Кухня")
+        self.assertEqual(product_cache.stats()['misses'], 2)
+
+        # Версия вытеснена из кэша - новая не совпадает ни с одной прежней
+        self.shared.delete(caching.CATALOG_VERSION_KEY)
+        self.cache.delete(caching.CATALOG_VERSION_KEY)
+        self.assertGreater(caching.catalog_version(), version + 1)
+
+    def test_session_read_from_cache(self) :
+        """
+        Сессия читается из общего кэша, без запроса к django_session.
+        """
+        user = User.objects.create_user(username='buyer', password='password123')
+        self.client.force_login(user)
+        with CaptureQueriesContext(connection) as queries :
+            self.client.get(reverse('store:cart_detail'))
+        self.assertFalse([query for query in queries if 'django_session' in query['sql']])
@@ -0,0 +1,153 @@
+# store/thumbnails.py
+"""
+Уменьшенные копии изображений товаров (миниатюры) для srcset.
+
+Для каждого изображения строятся копии шириной THUMBNAIL_WIDTHS
+в форматах THUMBNAIL_FORMATS (WebP и JPEG для старых браузеров).
+Имя копии содержит хэш содержимого оригинала:
+
+    thumbs/<pk>-<хэш>-<ширина>.<webp|jpg>
+
+Поэтому файл по однажды выданному адресу никогда не меняется
+и кэшируется браузером и nginx навсегда, а новая загрузка изображения
+сама дает новые адреса. Хэш хранится в Product.image_hash.
+
+Копии строятся при загрузке изображения (сигнал, после коммита),
+при первом запросе адреса (представление thumbnail) или
+командой build_thumbnails для уже существующих товаров.
+"""
+
+import hashlib
+import io
+import logging
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+logger = logging.getLogger('store.thumbnails')
+
+# Формат -> (расширение файла, имя формата в Pillow, MIME-тип)
+FORMATS = {
+    'webp' : ('webp', 'WEBP', 'image/webp'),
+    'jpeg' : ('jpg', 'JPEG', 'image/jpeg'),
+}
+EXTENSIONS = {ext : fmt for fmt, (ext, _, _) in FORMATS.items()}
+
+
+def content_hash(image):
+    """
+    Короткий хэш содержимого файла изображения (FieldFile или File).
+    """
+    digest = hashlib.sha256()
+    image.open('rb')
+    try :
+        for chunk in image.chunks() :
+            digest.update(chunk)
+    finally :
+        # Незакоммиченный файл загрузки еще понадобится при сохранении
+        image.seek(0)
+    return digest.hexdigest()[:16]
+
+
+def thumbnail_name(pk, digest, width, fmt):
+    return f'{settings.THUMBNAIL_DIR}/{pk}-{digest}-{width}.{FORMATS[fmt][0]}'
+
+
+def thumbnail_url(pk, digest, width, fmt):
+    return default_storage.url(thumbnail_name(pk, digest, width, fmt))
+
+
+def _render(source, width, fmt):
+    """
+    Копия изображения шириной не больше width в формате fmt (байты).
+    Меньшие изображения не увеличиваются.
+    """
+    image = source.copy()
+    if image.mode not in ('RGB', 'RGBA') :
+        transparent = 'A' in image.getbands() or 'transparency' in image.info
+        image = image.convert('RGBA' if transparent else 'RGB')
+    image.thumbnail((width, width * 10), Image.Resampling.LANCZOS)
+    if fmt == 'jpeg' and image.mode == 'RGBA' :
+        # В JPEG нет прозрачности - кладем изображение на белый фон
+        background = Image.new('RGB', image.size, 'white')
+        background.paste(image, mask=image.getchannel('A'))
+        image = background
+    buffer = io.BytesIO()
+    _, pillow_format, _ = FORMATS[fmt]
+    image.save(buffer, pillow_format, quality=settings.THUMBNAIL_QUALITY, optimize=True)
+    return buffer.getvalue()
+
+
+def _open_source(source_name):
+    with default_storage.open(source_name, 'rb') as fp :
+        image = Image.open(fp)
+        # Фото с телефона хранят поворот в EXIF - применяем его сразу
+        image = ImageOps.exif_transpose(image)
+        image.load()
+    return image
+
+
+def _save(name, content):
+    if default_storage.exists(name) :
+        return
+    saved = default_storage.save(name, ContentFile(content))
+    # Ту же копию одновременно построил другой процесс - хранилище
+    # дало нашей другое имя, она не нужна
+    if saved != name :
+        default_storage.delete(saved)
+
+
+def generate(pk, source_name, digest, width, fmt):
+    """
+    Строит одну копию, если ее еще нет. Возвращает имя файла в хранилище.
+    """
+    name = thumbnail_name(pk, digest, width, fmt)
+    if not default_storage.exists(name) :
+        _save(name, _render(_open_source(source_name), width, fmt))
+    return name
+
+
+def build(pk, source_name, digest=None):
+    """
+    Строит все копии изображения (оригинал открывается один раз).
+    Без digest хэш считается по файлу. Возвращает (хэш, число новых копий).
+    Функция модульного уровня - ее вызывают процессы build_thumbnails.
+    """
+    if digest is None :
+        with default_storage.open(source_name, 'rb') as fp :
+            digest = content_hash(fp)
+    missing = [
+        (width, fmt)
+        for width in settings.THUMBNAIL_WIDTHS
+        for fmt in settings.THUMBNAIL_FORMATS
+        if not default_storage.exists(thumbnail_name(pk, digest, width, fmt))
+    ]
+    if missing :
+        source = _open_source(source_name)
+        for width, fmt in missing :
+            _save(thumbnail_name(pk, digest, width, fmt), _render(source, width, fmt))
+    return digest, len(missing)
+
+
+def build_after_upload(pk, source_name, digest):
+    """
+    Копии для только что загруженного изображения (из on_commit).
+    Ошибка не должна ломать сохранение товара - копии достроятся
+    при первом запросе.
+    """
+    try :
+        build(pk, source_name, digest)
+    except Exception :
+        logger.exception('Не удалось построить миниатюры товара %s (%s)', pk, source_name)
+
+
+def srcset(product, fmt):
+    """
+    Значение атрибута srcset: все ширины изображения товара в формате fmt.
+    """
+    return ', '.join(
+        f'{thumbnail_url(product.pk, product.image_hash, width, fmt)} {width}w'
+        for width in settings.THUMBNAIL_WIDTHS
+    )
@@ -1,4 +1,5 @@
-from django.urls import path
+from django.conf import settings
+from django.urls import path, re_path
 from . import views  # Импортируем 'views' из текущей папки
 
 # 'app_name' позволяет нам использовать 'store:product_list' в шаблонах
@@ -7,10 +8,21 @@ app_name = 'store'
 urlpatterns = [
     # http://127.0.0.1:8000/products/
     path('products/', views.product_list, name='product_list'),
+    path('products/search/', views.product_search, name='product_search'),
     # http://127.0.0.1:8000/products/1/ (где 1 - это 'pk')
     path('products/<int:pk>/', views.product_detail, name='product_detail'),
     path('cart/add/<int:pk>/', views.add_to_cart, name='add_to_cart'),
+    path('cart/remove/<int:pk>/', views.remove_from_cart, name='remove_from_cart'),
     path('cart/', views.cart_detail, name='cart_detail'),
     path('order/create/', views.create_order, name='create_order'),
     path('order/success/', views.order_success, name='order_success'),
+    path('products/cache-stats/', views.product_cache_stats, name='product_cache_stats'),
+    path('products/profiling/', views.profiling_stats, name='profiling_stats'),
+    path('analytics/', views.sales_analytics, name='sales_analytics'),
+    # Миниатюры: /media/thumbs/<pk>-<хэш>-<ширина>.<webp|jpg> (строятся при первом запросе)
+    re_path(
+        rf'^{settings.MEDIA_URL.lstrip("/")}{settings.THUMBNAIL_DIR}/'
+        r'(?P<pk>\d+)-(?P<digest>[0-9a-f]{16})-(?P<width>\d+)\.(?P<ext>webp|jpg)$',
+        views.thumbnail, name='thumbnail'
+    ),
 ]
\ No newline at end of file
@@ -1,46 +1,229 @@
-from django.shortcuts import render, get_object_or_404, redirect
+import datetime
+
+from django.conf import settings
+from django.db.models import Max
+from django.shortcuts import render, redirect
 from django.contrib.auth.decorators import login_required
-from django.db import transaction
+from django.contrib.admin.views.decorators import staff_member_required
+from django.core.files.storage import default_storage
+from django.http import FileResponse, Http404, JsonResponse
+from django.utils import timezone
+from django.utils.http import urlencode
 from django.contrib import messages
-from .models import Product, Cart, CartItem, Order, OrderItem
-from .forms import AddToCartForm, OrderForm
+from .models import Product, Cart
+from .forms import AddToCartForm, AnalyticsForm, CatalogFilterForm, OrderForm, ProductSearchForm
+from .pagination import KeysetPaginator, InvalidCursor
+from .checkout import place_order, CheckoutError
+from .search import search_products
+from . import analytics, anonymous_cart, carts, conditional, facets, holds, product_cache, profiling, thumbnails
+from .routers import replica_reads
+
+
+def _page_size(request):
+    """
+    Размер страницы из параметра ?page_size=, ограниченный настройками.
+    """
+    try :
+        size = int(request.GET.get('page_size', settings.CATALOG_PAGE_SIZE))
+    except ValueError :
+        size = settings.CATALOG_PAGE_SIZE
+    return max(1, min(size, settings.CATALOG_MAX_PAGE_SIZE))
+
+
+async def _load_header(request, context):
+    """
+    Готовит данные шапки для async-представлений.
+    Из асинхронного кода шаблон не может лениво обратиться к БД,
+    поэтому пользователь и итоги корзины загружаются заранее.
+    """
+    request.user = await request.auser()
+    if request.user.is_authenticated and 'cart_summary' not in context :
+        context['cart_summary'] = await carts.asummary(request.user)
+    return context
+
+
+def _filter_query(filters, **changes):
+    """
+    Строка GET-параметров активных фильтров каталога (с заменами 'changes')
+    для ссылок, которые должны эти фильтры сохранить.
+    """
+    params = {**filters, **changes}
+    return urlencode({
+        name : '1' if value is True else value
+        for name, value in params.items()
+        if value not in (None, False, '')
+    })
 
 
-def product_list(request):
+@replica_reads
+async def product_list(request):
     """
-    Представление для отображения списка всех товаров.
+    Представление для отображения списка товаров.
+    Каталог отдается постранично курсорами ?after= / ?before=,
+    поэтому глубина страницы не влияет на время ответа.
+    Фильтры: ?category=id, ?min_price= / ?max_price=, ?in_stock=1.
+    Список категорий с числом товаров и диапазоном цен берется
+    из сводок категорий (store/facets.py) - одна строка на категорию.
+    Версия страницы (ETag) - сводки и MAX(updated_at) товаров по индексу:
+    если у клиента она актуальна, отвечаем 304 без запроса товаров.
+    Асинхронное: под ASGI ожидание БД не занимает рабочий поток.
     """
-    # Получаем все объекты (товары) из базы данных
-    products = Product.objects.all()
+    form = CatalogFilterForm(request.GET)
+    # Неверные значения фильтров просто не применяются
+    form.is_valid()
+    filters = {name : form.cleaned_data.get(name) for name in form.fields}
+
+    context = await _load_header(request, {})
+    category_facets = [facet async for facet in facets.catalog_facets()]
+    # Изменения и удаления товаров видны в сводках, правки - в updated_at
+    products_changed = (await Product.objects.aaggregate(at=Max('updated_at')))['at']
+    shareable = conditional.is_shareable(request)
+    etag = conditional.make_etag(
+        'product_list',
+        products_changed,
+        [
+            (f.pk, f.product_count, f.in_stock_count, f.min_price, f.max_price, f.category.updated_at)
+            for f in category_facets
+        ],
+        conditional.visitor_state(request, context),
+    )
+    changes = [products_changed, *(f.category.updated_at for f in category_facets)]
+    last_modified = max(filter(None, changes), default=None) if shareable else None
+    response = conditional.not_modified(request, etag, last_modified, public=shareable)
+    if response is not None :
+        return response
+
+    # Шаблону нужны только id, название, цена и миниатюра - не тянем описание
+    products = Product.objects.only('id', 'name', 'price', 'image', 'image_hash')
+    in_stock = bool(filters['in_stock'])
+    if in_stock :
+        # Условие совпадает с частичным индексом store_product_in_stock_idx
+        products = products.filter(stock__gt=0)
+    if filters['category'] :
+        products = products.filter(category_id=filters['category'])
+    if filters['min_price'] is not None :
+        products = products.filter(price__gte=filters['min_price'])
+    if filters['max_price'] is not None :
+        products = products.filter(price__lte=filters['max_price'])
+    # name уникально, поэтому сортировки по нему одному достаточно для
+    # курсоров - страницу отдает индекс по name без дополнительной сортировки
+    paginator = KeysetPaginator(
+        products,
+        ordering=('name',),
+        page_size=_page_size(request),
+    )
+    try :
+        page = await paginator.apage(
+            after=request.GET.get('after'),
+            before=request.GET.get('before'),
+        )
+    except InvalidCursor :
+        # Битый курсор - просто показываем первую страницу
+        page = await paginator.apage()
+
+    selected = [facet for facet in category_facets if facet.pk == filters['category']]
+    for facet in category_facets :
+        facet.query = _filter_query(filters, category=facet.pk)
+    # Подсказка диапазона цен - по выбранной категории или по всем
+    prices = [facet for facet in (selected or category_facets) if facet.min_price is not None]
+    price_range = (
+        (min(f.min_price for f in prices), max(f.max_price for f in prices)) if prices else None
+    )
 
     # Передаем товары в шаблон 'store/product_list.html'
+    context.update({
+        'products': page.object_list,
+        'page': page,
+        'form': form,
+        'in_stock': in_stock,
+        'facets': category_facets,
+        'selected_category': selected[0] if selected else None,
+        'price_range': price_range,
+        'filter_query': _filter_query(filters),
+        'all_categories_query': _filter_query(filters, category=None),
+        'in_stock_toggle_query': _filter_query(filters, in_stock=not in_stock),
+    })
+    response = render(request, 'store/product_list.html', context)
+    return conditional.set_headers(response, etag, last_modified, public=shareable)
+
+
+@replica_reads
+def product_search(request):
+    """
+    Полнотекстовый поиск по каталогу: ?q=запрос&category=id.
+    Результаты отсортированы по релевантности; страницы без COUNT(*) -
+    берем на одну запись больше, чтобы узнать, есть ли следующая.
+    """
+    form = ProductSearchForm(request.GET or None)
+    products, page_number, has_next = [], 1, False
+
+    if form.is_valid() :
+        page_size = _page_size(request)
+        page_number = form.cleaned_data['page'] or 1
+        category = form.cleaned_data['category']
+        offset = (page_number - 1) * page_size
+        products = list(
+            search_products(form.cleaned_data['q'], category_id=category.pk if category else None)
+            .only('id', 'name', 'price')[offset:offset + page_size + 1]
+        )
+        has_next = len(products) > page_size
+        products = products[:page_size]
+
     context = {
-        'products': products
+        'form' : form,
+        'products' : products,
+        'page_number' : page_number,
+        'has_next' : has_next,
     }
-    return render(request, 'store/product_list.html', context)
+    return render(request, 'store/product_search.html', context)
 
 
-def product_detail(request, pk):
+@replica_reads
+async def product_detail(request, pk):
     """
     Представление для отображения детальной информации о товаре.
     'pk' (Primary Key) - это уникальный ID товара.
+    Версия карточки (ETag) - время изменения товара и категории, остаток
+    и резерв:
+    если у клиента она актуальна, отвечаем 304 без рендеринга.
+    В общие кэши карточка не попадает - в ней форма с CSRF-токеном.
     """
-    product = get_object_or_404(Product, pk=pk)
+    # Карточка берется из кэша (store/product_cache.py), остаток - свежий
+    product = await product_cache.aget_product(pk)
+    context = await _load_header(request, {})
+
+    etag = conditional.make_etag(
+        'product_detail', product.pk, product.updated_at, product.stock, product.reserved,
+        product.category.updated_at,
+        conditional.visitor_state(request, context, csrf=True),
+    )
+    last_modified = None
+    if conditional.is_shareable(request) :
+        last_modified = max(product.updated_at, product.category.updated_at)
+    response = conditional.not_modified(request, etag, last_modified)
+    if response is not None :
+        return response
+
     add_to_cart_form = AddToCartForm()  # <-- 2. Создаем экземпляр формы
 
-    context = {
+    context.update({
         'product' : product,
         'add_to_cart_form' : add_to_cart_form,  # <-- 3. Добавляем в context
-    }
-    return render(request, 'store/product_detail.html', context)
+    })
+    response = render(request, 'store/product_detail.html', context)
+    return conditional.set_headers(response, etag, last_modified)
 
 
-@login_required
 def add_to_cart(request, pk) :
     """
     Добавление товара в корзину.
+    Корзина анонимного посетителя хранится в cookie и в БД не пишется,
+    при входе она переносится в Cart (store/anonymous_cart.py).
     """
-    product = get_object_or_404(Product, pk=pk)
+    # Остаток в карточке из кэша свежий (или устаревший не более,
+    # чем на PRODUCT_STOCK_MAX_AGE) - для вошедшего пользователя
+    # окончательно его проверяет резервирование (store/holds.py)
+    product = product_cache.get_product(pk)
 
     if request.method == 'POST' :
         form = AddToCartForm(request.POST)
@@ -48,71 +231,91 @@ def add_to_cart(request, pk) :
             quantity = form.cleaned_data['quantity']
 
             # --- ПРОВЕРКА ОСТАТКОВ (Требование №4) ---
-            if quantity > product.stock :
-                messages.error(request, f"На складе недостаточно товара (осталось: {product.stock})")
-                return redirect('store:product_detail', pk=pk)
-
-            # Получаем или создаем корзину для пользователя
-            cart, created = Cart.objects.get_or_create(user=request.user)
-
-            # Получаем или создаем позицию в корзине
-            cart_item, item_created = CartItem.objects.get_or_create(
-                cart=cart,
-                product=product,
-                defaults={'quantity' : 0}
-            )
-
-            # Проверяем, не превысит ли новое кол-во остатки
-            new_quantity = cart_item.quantity + quantity
-            if new_quantity > product.stock :
-                messages.error(request, f"Нельзя добавить больше, чем на складе (осталось: {product.stock})")
+            if quantity > product.available :
+                messages.error(request, f"На складе недостаточно товара (доступно: {product.available})")
                 return redirect('store:product_detail', pk=pk)
 
-            # Обновляем количество и сохраняем
-            cart_item.quantity = new_quantity
-            cart_item.save()
+            response = redirect('store:cart_detail')
+            if request.user.is_authenticated :
+                # Резервируем позицию и сдвигаем итоги корзины
+                cart, created = Cart.objects.get_or_create(user=request.user)
+                try :
+                    carts.add_item(cart, product, quantity)
+                except holds.NotEnoughStock as e :
+                    messages.error(request, f"Нельзя добавить больше, чем доступно (доступно: {e.available})")
+                    return redirect('store:product_detail', pk=pk)
+            else :
+                items = anonymous_cart.load(request)
+                in_cart = items.get(product.pk, 0)
+                # Корзина из cookie не резервирует товар - сверяем со свободным остатком
+                if in_cart + quantity > product.available :
+                    messages.error(request, f"Нельзя добавить больше, чем доступно (доступно: {product.available})")
+                    return redirect('store:product_detail', pk=pk)
+                if product.pk not in items and len(items) >= settings.CART_COOKIE_MAX_ITEMS :
+                    messages.error(request, "В корзине слишком много позиций. Войдите, чтобы продолжить.")
+                    return redirect('store:product_detail', pk=pk)
+                items[product.pk] = in_cart + quantity
+                anonymous_cart.save(response, items)
 
             messages.success(request, f"Товар '{product.name}' добавлен в корзину.")
-            return redirect('store:cart_detail')
+            return response
 
     # Если GET-запрос, просто вернем на страницу товара
     return redirect('store:product_detail', pk=pk)
 
 
-@login_required
-def cart_detail(request) :
+async def cart_detail(request) :
     """
     Отображение содержимого корзины.
+    Позиции, товары и итог - одним запросом (см. store.carts.cart_lines).
     """
-    try :
-        cart = Cart.objects.get(user=request.user)
-        cart_items = cart.items.all()
-        # Считаем общую стоимость
-        total_price = sum(item.total_item_price for item in cart_items)
-    except Cart.DoesNotExist :
-        cart_items = []
-        total_price = 0
+    request.user = await request.auser()
+    if request.user.is_authenticated :
+        cart_items = [item async for item in carts.cart_lines(request.user)]
+        total_price = cart_items[0].cart_total if cart_items else 0
+    else :
+        cart_items = await carts.aanonymous_cart_lines(anonymous_cart.load(request))
+        total_price = sum(item.line_total for item in cart_items)
 
     context = {
         'cart_items' : cart_items,
         'total_price' : total_price,
+        # Значок корзины в шапке - без отдельного запроса
+        'cart_summary' : {
+            'total' : total_price,
+            'item_count' : sum(item.quantity for item in cart_items),
+        },
     }
     return render(request, 'store/cart_detail.html', context)
 
 
+def remove_from_cart(request, pk) :
+    """
+    Удаление товара из корзины.
+    """
+    response = redirect('store:cart_detail')
+    if request.method == 'POST' :
+        if request.user.is_authenticated :
+            cart = Cart.objects.filter(user=request.user).first()
+            removed = cart is not None and carts.remove_item(cart, pk)
+        else :
+            items = anonymous_cart.load(request)
+            removed = items.pop(pk, None) is not None
+            anonymous_cart.save(response, items)
+        if removed :
+            messages.success(request, "Товар удален из корзины.")
+    return response
+
+
 @login_required
-@transaction.atomic  # Гарантирует, что все операции с БД выполнятся, или ни одной
 def create_order(request) :
     """
     Оформление заказа.
+    Сама транзакция (блокировки, списание остатков) живет
+    в store.checkout.place_order и длится только на время POST.
     """
     try :
         cart = Cart.objects.get(user=request.user)
-        cart_items = cart.items.all()
-        if not cart_items :
-            # Если корзина пуста, отправляем обратно
-            messages.error(request, "Ваша корзина пуста.")
-            return redirect('store:cart_detail')
     except Cart.DoesNotExist :
         messages.error(request, "У вас нет корзины.")
         return redirect('store:product_list')
@@ -123,39 +326,25 @@ def create_order(request) :
             # Создаем заказ, но пока не сохраняем в БД (commit=False)
             order = form.save(commit=False)
             order.user = request.user
-            order.save()  # Теперь сохраняем, чтобы получить ID заказа
-
-            # --- ПРОВЕРКА ОСТАТКОВ (Финальная) ---
-            for item in cart_items :
-                product = item.product
-                if item.quantity > product.stock :
-                    # Если товара не хватает, откатываем транзакцию
-                    messages.error(request, f"Товара '{product.name}' не хватает на складе.")
-                    # @transaction.atomic отменит создание 'order'
-                    return redirect('store:cart_detail')
-
-            # Если все в порядке, создаем позиции заказа и списываем остатки
-            for item in cart_items :
-                OrderItem.objects.create(
-                    order=order,
-                    product=item.product,
-                    price=item.product.price,
-                    quantity=item.quantity
-                )
-                # Уменьшаем остатки на складе
-                item.product.stock -= item.quantity
-                item.product.save()
-
-            # Очищаем корзину
-            cart.items.all().delete()
+            try :
+                place_order(order, cart)
+            except CheckoutError as e :
+                # Транзакция уже откачена: ни заказа, ни списаний нет
+                messages.error(request, str(e))
+                return redirect('store:cart_detail')
 
             messages.success(request, "Ваш заказ успешно оформлен!")
-            # Перенаправляем на страницу "Спасибо" (создадим в Шаге 4)
             return redirect('store:order_success')
     else :
         # GET-запрос: просто показываем форму
         form = OrderForm()
 
+    cart_items = cart.items.select_related('product')
+    if not cart_items :
+        # Если корзина пуста, отправляем обратно
+        messages.error(request, "Ваша корзина пуста.")
+        return redirect('store:cart_detail')
+
     context = {
         'form' : form,
         'cart_items' : cart_items,
@@ -163,6 +352,64 @@ def create_order(request) :
     return render(request, 'store/create_order.html', context)
 
 
+def thumbnail(request, pk, digest, width, ext) :
+    """
+    Миниатюра изображения товара (store/thumbnails.py).
+    Готовые файлы отдает nginx, сюда приходят только запросы
+    еще не построенных копий: копия строится и сохраняется.
+    """
+    width, fmt = int(width), thumbnails.EXTENSIONS[ext]
+    if width not in settings.THUMBNAIL_WIDTHS or fmt not in settings.THUMBNAIL_FORMATS :
+        raise Http404('Нет такого размера миниатюры.')
+    # Хэш в адресе должен совпадать с текущим изображением товара
+    product = Product.objects.only('image').filter(pk=pk, image_hash=digest).first()
+    if product is None or not product.image :
+        raise Http404('Изображение не найдено.')
+    try :
+        name = thumbnails.generate(pk, product.image.name, digest, width, fmt)
+    except OSError :
+        # Оригинала нет на диске или это не изображение
+        raise Http404('Изображение не найдено.')
+    response = FileResponse(default_storage.open(name, 'rb'), content_type=thumbnails.FORMATS[fmt][2])
+    # Содержимое по этому адресу не меняется никогда
+    response['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return response
+
+
+@staff_member_required
+def product_cache_stats(request) :
+    """
+    Счетчики кэша карточек товаров (для персонала).
+    """
+    return JsonResponse(product_cache.stats())
+
+
+@staff_member_required
+def profiling_stats(request) :
+    """
+    Гистограмма времени ответа по представлениям (для персонала).
+    """
+    return JsonResponse(profiling.stats())
+
+
+@staff_member_required
+def sales_analytics(request) :
+    """
+    Отчет о продажах для персонала (store/analytics.py), по умолчанию -
+    за последние 30 дней. Отчет читается из дневной сводки, а не из
+    истории заказов; сводку пополняет по расписанию manage.py analytics
+    --rollup, сама страница в БД не пишет.
+    """
+    form = AnalyticsForm(request.GET or None)
+    cleaned = form.cleaned_data if form.is_valid() else {}
+    end = cleaned.get('end') or timezone.localdate()
+    start = cleaned.get('start') or end - datetime.timedelta(days=29)
+    context = analytics.report(start, end)
+    context['form'] = form
+    context['rolled_up_to'] = analytics.last_day()
+    return render(request, 'store/analytics.html', context)
+
+
 def order_success(request) :
     """
     Страница "Спасибо за заказ".
@@ -1,3 +1,68 @@
-from django.test import TestCase
+from decimal import Decimal
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from store.models import Category, Product, Order, OrderItem
+
+User = get_user_model()
+
+
+class ProfileViewTests(TestCase) :
+    """
+    Тестирование истории заказов в личном кабинете.
+    """
+
+    def setUp(self) :
+        self.user = User.objects.create_user(username='buyer', password='password123')
+        category = Category.objects.create(name="Категория")
+        self.products = [
+            Product.objects.create(name=f"Товар {i}", category=category, price=10, stock=100)
+            for i in range(3)
+        ]
+        self.url = reverse('users:profile')
+        self.client.force_login(self.user)
+
+    def _create_orders(self, count) :
+        for _ in range(count) :
+            order = Order.objects.create(user=self.user, full_name='Тест', address='Адрес', phone='1')
+            OrderItem.objects.bulk_create(
+                OrderItem(order=order, product=product, price=Decimal('2.50'), quantity=i + 1)
+                for i, product in enumerate(self.products)
+            )
+
+    def test_totals(self) :
+        """
+        Сумма и количество товаров посчитаны по позициям заказа.
+        """
+        self._create_orders(1)
+        Order.objects.create(user=self.user, full_name='Пустой', address='Адрес', phone='1')
+
+        orders = self.client.get(self.url).context['orders']
+        self.assertEqual([(o.total, o.item_count) for o in orders], [(0, 0), (Decimal('15.00'), 6)])
+
+    @override_settings(ORDER_HISTORY_PAGE_SIZE=50)
+    def test_query_count_does_not_depend_on_orders(self) :
+        """
+        Сессия, пользователь, COUNT, заказы, позиции с товарами,
+        значок корзины - при 3 и при 30 заказах на странице.
+        """
+        for count in (3, 27) :
+            self._create_orders(count)
+            with self.assertNumQueries(6) :
+                response = self.client.get(self.url)
+            self.assertContains(response, "Товар 2 (3 шт.)")
+
+    @override_settings(ORDER_HISTORY_PAGE_SIZE=10)
+    def test_pagination(self) :
+        """
+        История разбита на страницы, новые заказы - первыми.
+        """
+        self._create_orders(25)
+        newest = Order.objects.order_by('-created_at', '-pk').first()
+
+        first = self.client.get(self.url).context['page']
+        self.assertEqual(first.paginator.num_pages, 3)
+        self.assertEqual(first.object_list[0], newest)
+        self.assertEqual(len(self.client.get(self.url, {'page' : 3}).context['orders']), 5)
@@ -11,10 +11,8 @@ urlpatterns = [
     # Наша кастомная view для профиля
     path('profile/', views.profile, name='profile'),
 
-    # Встроенная view для входа
-    path('login/', auth_views.LoginView.as_view(
-        template_name='users/login.html'
-    ), name='login'),
+    # Встроенная view для входа (с переносом корзины из cookie)
+    path('login/', views.LoginView.as_view(), name='login'),
 
     # Встроенная view для выхода
     path('logout/', auth_views.LogoutView.as_view(
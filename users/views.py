@@ -1,8 +1,15 @@
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.db.models import DecimalField, F, Prefetch, Sum, Value
+from django.db.models.functions import Coalesce
 from django.shortcuts import render, redirect
 from django.contrib.auth import login
+from django.contrib.auth import views as auth_views
 from django.contrib.auth.decorators import login_required
 from .forms import CustomUserCreationForm
-from store.models import Order # Импортируем Заказы для истории
+from store import anonymous_cart
+from store.routers import replica_reads
+from store.models import Order, OrderItem # Импортируем Заказы для истории
 
 
 def register(request):
@@ -14,23 +21,58 @@ def register(request):
         if form.is_valid():
             user = form.save()  # Сохраняем пользователя
             login(request, user)  # Автоматически входим в систему
-            return redirect('users:profile')  # Перенаправляем в личный кабинет
+            # Переносим корзину, собранную до регистрации
+            return anonymous_cart.merge_on_login(request, redirect('users:profile'))
     else:
         form = CustomUserCreationForm()
 
     return render(request, 'users/register.html', {'form': form})
 
 
+class LoginView(auth_views.LoginView):
+    """
+    Стандартный вход + перенос корзины анонимного посетителя
+    в корзину пользователя.
+    """
+    template_name = 'users/login.html'
+
+    def form_valid(self, form):
+        response = super().form_valid(form)
+        return anonymous_cart.merge_on_login(self.request, response)
+
+
 @login_required
+@replica_reads
 def profile(request):
     """
     Представление для личного кабинета пользователя.
     Показывает историю заказов (Требование №5).
     """
-    # Получаем все заказы ТЕКУЩЕГО пользователя
-    orders = Order.objects.filter(user=request.user).order_by('-created_at')
+    # Заказы ТЕКУЩЕГО пользователя с посчитанными в БД суммой и
+    # количеством товаров. Позиции и товары подгружаются двумя
+    # запросами на страницу, сколько бы заказов на ней ни было.
+    orders = (
+        Order.objects.filter(user=request.user)
+        .annotate(
+            total=Coalesce(
+                Sum(F('items__price') * F('items__quantity')),
+                Value(0),
+                output_field=DecimalField(max_digits=12, decimal_places=2),
+            ),
+            item_count=Coalesce(Sum('items__quantity'), Value(0)),
+        )
+        .prefetch_related(
+            Prefetch('items', queryset=OrderItem.objects.select_related('product').only(
+                'order_id', 'quantity', 'product__name'
+            ))
+        )
+        .order_by('-created_at', '-pk')
+    )
+    paginator = Paginator(orders, settings.ORDER_HISTORY_PAGE_SIZE)
+    page = paginator.get_page(request.GET.get('page'))
 
     context = {
-        'orders': orders
+        'orders': page.object_list,
+        'page': page,
     }
     return render(request, 'users/profile.html', context)
\ No newline at end of file